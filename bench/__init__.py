@@ -0,0 +1 @@
+# benchmarks, run from project root:  python -m bench.<module>
@@ -0,0 +1,114 @@
+# adv_select.py
+"""
+Advanced selection over synthetic DB: file IDs of tags / authors
+collected in Python and pasted into SQL as in previous versions against
+one SQL statement compiled by generate_adv_sql.
+Run from project root:  python -m bench.adv_select [number of files]
+"""
+import datetime
+import random
+import sqlite3
+import sys
+import time
+
+from src.core import create_db as db
+import src.core.utilities as ut
+
+FILES = 1000000
+DIRS = FILES // 50
+EXTS = 50
+AUTHORS = FILES // 5
+TAGS = 500
+PAGE = 500
+
+CASES = (
+    ('tags any', {'tag': ('1,2,3,4,5', False)}),
+    ('tags all', {'tag': ('1,2', True)}),
+    ('tag + author', {'tag': ('1,2,3', False),
+                      'author': ','.join(str(i) for i in range(1, AUTHORS, 50))}),
+    ('dir + ext', {'dir': 2, 'ext': '1,2,3'}),
+    ('all', {'dir': 1, 'ext': '1,2,3,4,5,6,7,8,9,10', 'tag': ('1,2,3,4,5', False),
+             'author': ','.join(str(i) for i in range(1, AUTHORS, 10)),
+             'date': (True, 5, True)}),
+)
+
+
+def fill_db(conn: sqlite3.Connection, files: int):
+    rnd = random.Random(1)
+    # each dir has 20 sub-dirs
+    conn.executemany('insert into Dirs (DirID, Path, ParentID) values (?, ?, ?);',
+                     ((i, f'/d{i}', (i - 1) // 20) for i in range(1, DIRS)))
+    conn.executemany('insert into Extensions (ExtID, Extension) values (?, ?);',
+                     ((i, f'e{i}') for i in range(1, EXTS)))
+    conn.executemany('insert into Files (FileID, DirID, FileName, ExtID, FileDate) '
+                     'values (?, ?, ?, ?, ?);',
+                     ((i, rnd.randrange(1, DIRS), f'file{i}.pdf', rnd.randrange(1, EXTS),
+                       f'{rnd.randrange(2000, 2020)}-01-01') for i in range(1, files)))
+    conn.executemany('insert or ignore into FileAuthor values (?, ?);',
+                     ((i, rnd.randrange(1, AUTHORS)) for i in range(1, files)))
+    conn.executemany('insert or ignore into FileTag values (?, ?);',
+                     ((rnd.randrange(1, files), rnd.randrange(1, TAGS))
+                      for _ in range(2 * files)))
+    conn.commit()
+
+
+def legacy(conn: sqlite3.Connection, param: dict) -> list:
+    """
+    SelOpt.get_result and generate_adv_sql of previous versions,
+    with intersection of tag and author files really applied
+    """
+    tmp = []
+    if param.get('dir'):
+        ids = ','.join(str(row[0]) for row in ut.dir_ids_select(param['dir'], 0))
+        tmp.append(f'DirID in ({ids})')
+    if param.get('ext'):
+        tmp.append(f'ExtID in ({param["ext"]})')
+    s = None
+    if param.get('tag'):
+        tags, all_tags = param['tag']
+        if all_tags:
+            sql = (f'select FileID from FileTag where TagID in ({tags}) '
+                   f'group by FileID having count(*) = {len(tags.split(","))};')
+        else:
+            sql = f'select FileID from FileTag where TagID in ({tags}) order by FileID;'
+        s = set(conn.execute(sql).fetchall())
+    if param.get('author'):
+        res = set(conn.execute('select FileID from FileAuthor where AuthorID in '
+                               f'({param["author"]});').fetchall())
+        s = res if s is None else s.intersection(res)
+    if s is not None:
+        tmp.append(f'FileID in ({",".join(str(id_[0]) for id_ in s)})')
+    if param.get('date'):
+        tt = datetime.date.today()
+        tmp.append(f"FileDate > '{tt.replace(year=tt.year - param['date'][1])}'")
+    sql = ' where '.join((ut.Selects['ADV_FILES'], ' and '.join(tmp)))
+    return conn.execute(sql).fetchall()
+
+
+def main(files: int = FILES):
+    conn = sqlite3.connect(':memory:')
+    db.create_all_objects(conn)
+    start = time.perf_counter()
+    fill_db(conn, files)
+    print(f'{files} files: DB filled in {time.perf_counter() - start:.1f} s')
+    ut.DB_setting['Conn'] = conn
+
+    print(f'{"case":14} {"rows":>7} {"legacy s":>9} {"compiled s":>11} {"first page s":>13}')
+    for name, param in CASES:
+        start = time.perf_counter()
+        old = legacy(conn, param)
+        old_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        curs = ut.advanced_selection(param)
+        curs.fetchmany(PAGE)
+        first = time.perf_counter() - start
+        new = curs.fetchall()
+        new_time = time.perf_counter() - start
+        rows = len(old)
+        assert rows == min(PAGE, rows) + len(new)
+        print(f'{name:14} {rows:7} {old_time:9.3f} {new_time:11.3f} {first:13.4f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else FILES)
@@ -0,0 +1,107 @@
+# db_index.py
+"""
+Query plans and timings of hot lookups before / after index migration.
+Run from project root:  python -m bench.db_index [number of files]
+"""
+import random
+import sqlite3
+import sys
+import time
+
+from src.core import create_db as db
+
+QUERIES = (
+    ('FIND_EXACT_PATH', 'select DirID from Dirs where Path = ?;',
+     lambda r: (f'/root/dir{r.randrange(DIRS)}',)),
+    ('FIND_FILE', 'select * from Files where DirID = ? and FileName = ?;',
+     lambda r: (r.randrange(1, DIRS), f'file{r.randrange(FILES)}.pdf')),
+    ('FILES_IN_DIR', 'select FileName from Files where DirID = ?;',
+     lambda r: (r.randrange(1, DIRS),)),
+    ('FIND_EXT', 'select ExtID from Extensions where Extension = ?;',
+     lambda r: (f'e{r.randrange(EXTS)}',)),
+    ('AUTHOR_ID', 'select AuthorID from Authors where Author = ?;',
+     lambda r: (f'author{r.randrange(AUTHORS)}',)),
+    ('TAG_ID', 'select TagID from Tags where Tag = ?;',
+     lambda r: (f'tag{r.randrange(TAGS)}',)),
+    ('FILES_BY_TAG', 'select FileID from FileTag where TagID = ?;',
+     lambda r: (r.randrange(1, TAGS),)),
+    ('FILES_BY_AUTHOR', 'select FileID from FileAuthor where AuthorID = ?;',
+     lambda r: (r.randrange(1, AUTHORS),)),
+    ('VIRT_FILES', 'select FileID from VirtFiles where DirID = ?;',
+     lambda r: (r.randrange(1, DIRS),)),
+    ('FILES_BY_EXT', 'select count(*) from Files where ExtID = ?;',
+     lambda r: (r.randrange(1, EXTS),)),
+)
+
+FILES = 100000
+DIRS = FILES // 50
+EXTS = 50
+AUTHORS = FILES // 5
+TAGS = 500
+REPEAT = 200
+
+
+def fill_db(conn: sqlite3.Connection, files: int):
+    rnd = random.Random(1)
+    conn.executemany('insert into Dirs (DirID, Path, ParentID) values (?, ?, 0);',
+                     ((i, f'/root/dir{i}') for i in range(1, DIRS)))
+    conn.executemany('insert into Extensions (ExtID, Extension) values (?, ?);',
+                     ((i, f'e{i}') for i in range(1, EXTS)))
+    conn.executemany('insert into Files (FileID, DirID, FileName, ExtID) '
+                     'values (?, ?, ?, ?);',
+                     ((i, rnd.randrange(1, DIRS), f'file{i}.pdf',
+                       rnd.randrange(1, EXTS)) for i in range(1, files)))
+    conn.executemany('insert into Authors (AuthorID, Author) values (?, ?);',
+                     ((i, f'author{i}') for i in range(1, AUTHORS)))
+    conn.executemany('insert into Tags (TagID, Tag) values (?, ?);',
+                     ((i, f'tag{i}') for i in range(1, TAGS)))
+    conn.executemany('insert or ignore into FileAuthor values (?, ?);',
+                     ((i, rnd.randrange(1, AUTHORS)) for i in range(1, files)))
+    conn.executemany('insert or ignore into FileTag values (?, ?);',
+                     ((rnd.randrange(1, files), rnd.randrange(1, TAGS))
+                      for _ in range(files)))
+    conn.executemany('insert into VirtFiles values (?, ?);',
+                     ((rnd.randrange(1, DIRS), rnd.randrange(1, files))
+                      for _ in range(files // 10)))
+    conn.commit()
+
+
+def run_queries(conn: sqlite3.Connection) -> dict:
+    """
+    :return: {query name: (query plan, ms per query)}
+    """
+    res = {}
+    for name, sql, args in QUERIES:
+        rnd = random.Random(2)
+        plan = '; '.join(row[-1] for row in conn.execute(
+            'explain query plan ' + sql, args(rnd)))
+        params = [args(rnd) for _ in range(REPEAT)]
+        start = time.perf_counter()
+        for param in params:
+            conn.execute(sql, param).fetchall()
+        res[name] = (plan, (time.perf_counter() - start) * 1000 / REPEAT)
+    return res
+
+
+def main(files: int = FILES):
+    conn = sqlite3.connect(':memory:')
+    for obj in db.OBJ_DEFS:         # schema version 0 - without migrations
+        conn.execute(obj)
+    fill_db(conn, files)
+    before = run_queries(conn)
+
+    start = time.perf_counter()
+    version = db.migrate_db(conn)
+    print(f'migration to version {version}: '
+          f'{time.perf_counter() - start:.2f} s, {files} files')
+    after = run_queries(conn)
+
+    for name, (plan, ms) in before.items():
+        plan_after, ms_after = after[name]
+        print(f'{name:16} {ms:9.3f} ms -> {ms_after:7.3f} ms  x{ms / ms_after:.0f}')
+        print(f'{"":16} {plan}')
+        print(f'{"":16} {plan_after}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else FILES)
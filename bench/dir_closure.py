@@ -0,0 +1,79 @@
+# dir_closure.py
+"""
+Sub-dirs of dir: recursive CTE of previous versions against DirClosure
+table, on wide (many children in each dir) and deep (long chains) trees.
+Also cost of keeping DirClosure by triggers while dirs are inserted.
+Run from project root:  python -m bench.dir_closure [number of dirs]
+"""
+import random
+import sqlite3
+import sys
+import time
+
+from src.core import create_db as db
+
+DIRS = 100000
+REPEAT = 200
+
+CTE_IDS = ('WITH x(DirID, level) AS (SELECT DirID, 0 as level FROM Dirs WHERE DirID = ? '
+           'UNION ALL SELECT t.DirID, x.level + 1 as lvl FROM x INNER JOIN Dirs AS t '
+           'ON t.ParentID = x.DirID) SELECT DirID FROM x order by DirID;')
+CLOSURE_IDS = 'select Descendant from DirClosure where Ancestor = ? order by Descendant;'
+
+CTE_FILES = ('select count(*) from Files where DirID in (WITH RECURSIVE x(DirID) AS '
+             '(SELECT ? UNION SELECT t.DirID FROM x INNER JOIN Dirs AS t '
+             'ON t.ParentID = x.DirID) SELECT DirID FROM x);')
+CLOSURE_FILES = ('select count(*) from Files where DirID in '
+                 '(select Descendant from DirClosure where Ancestor = ?);')
+
+
+def wide(size: int) -> list:
+    # 20 children in each dir
+    return [(i, (i - 1) // 20) for i in range(1, size)]
+
+
+def deep(size: int) -> list:
+    # chains of 200 dirs under root
+    return [(i, 0 if i % 200 == 1 else i - 1) for i in range(1, size)]
+
+
+def make_db(dirs: list) -> (sqlite3.Connection, float):
+    conn = sqlite3.connect(':memory:')
+    db.create_all_objects(conn)
+    start = time.perf_counter()
+    conn.executemany('insert into Dirs (DirID, ParentID, Path) values (?, ?, ?);',
+                     ((i, p, f'd{i}') for i, p in dirs))
+    conn.commit()
+    fill = time.perf_counter() - start
+    rnd = random.Random(1)
+    conn.executemany('insert into Files (DirID, FileName) values (?, ?);',
+                     ((rnd.randrange(1, len(dirs)), f'f{i}') for i in range(len(dirs) * 5)))
+    conn.commit()
+    return conn, fill
+
+
+def timed(conn, sql, roots) -> float:
+    start = time.perf_counter()
+    for root in roots:
+        conn.execute(sql, (root,)).fetchall()
+    return (time.perf_counter() - start) * 1000 / len(roots)
+
+
+def main(size: int = DIRS):
+    print(f'{"tree":6} {"query":6} {"CTE ms":>9} {"closure ms":>11}')
+    for name, make in (('wide', wide), ('deep', deep)):
+        dirs = make(size)
+        conn, fill = make_db(dirs)
+        rows = conn.execute('select count(*) from DirClosure;').fetchone()[0]
+        rnd = random.Random(2)
+        roots = [rnd.randrange(1, size // 10) for _ in range(REPEAT)]
+        for query, cte, closure in (('ids', CTE_IDS, CLOSURE_IDS),
+                                    ('files', CTE_FILES, CLOSURE_FILES)):
+            print(f'{name:6} {query:6} {timed(conn, cte, roots):9.3f} '
+                  f'{timed(conn, closure, roots):11.3f}')
+        print(f'{"":6} {size} dirs inserted with triggers in {fill:.2f} s, '
+              f'{rows} rows in DirClosure')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DIRS)
@@ -0,0 +1,108 @@
+# dir_tree.py
+"""
+Loading of directory tree into EditTreeModel: recursive CTE + deepcopy
+of previous versions against one pass builder.
+Run from project root:  python -m bench.dir_tree [number of dirs ...]
+"""
+import copy
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from PyQt5.QtWidgets import QApplication
+
+from src.core import create_db as db
+from src.core import edit_tree_model as etm
+import src.core.utilities as ut
+
+SIZES = (10000, 100000, 1000000)
+LEGACY_LIMIT = 10000        # legacy loading is too slow for bigger trees
+VIRT_DIRS = 100
+
+
+def fill_db(conn: sqlite3.Connection, size: int):
+    rnd = random.Random(1)
+    paths = {0: ''}
+    rows = []
+    for dir_id in range(1, size + 1):
+        # mostly deep narrow branches, as in real file system
+        parent_id = rnd.randrange(max(0, dir_id - 20), dir_id)
+        paths[dir_id] = f'{paths[parent_id]}/d{dir_id}'[-200:]
+        rows.append((dir_id, paths[dir_id], parent_id, 0))
+    conn.executemany('insert into Dirs (DirID, Path, ParentID, FolderType) '
+                     'values (?, ?, ?, ?);', rows)
+    virt = [(size + i, f'virt{i}', 0, 1) for i in range(1, 6)]
+    conn.executemany('insert into Dirs (DirID, Path, ParentID, FolderType) '
+                     'values (?, ?, ?, ?);', virt)
+    conn.executemany('insert into VirtDirs (ParentID, DirID) values (?, ?);',
+                     ((size + rnd.randrange(1, 6), rnd.randrange(size // 2, size))
+                      for _ in range(VIRT_DIRS)))
+    conn.commit()
+
+
+def legacy_tree(model: etm.EditTreeModel):
+    """
+    Tree loading of previous versions:
+    gov_files.get_dirs, insert_virt_dirs and set_model_data with deepcopy
+    """
+    dirs = [(os.path.split(rr[0])[1], *rr[1: len(rr) - 1], rr[0])
+            for rr in ut.dir_tree_select(dir_id=0, level=0)]
+
+    id_list = [x[1] for x in dirs]
+    for vd in ut.select_other('VIRT_DIRS', ()):
+        if vd[-1] == 1:
+            vd = (*vd[:-1], 2)
+        idx = id_list.index(vd[2])
+        dirs.insert(idx, (os.path.split(vd[0])[1], *vd[1:], vd[0]))
+        id_list.insert(idx, vd[1])
+
+    id_list = []
+    items_dict = {0: model.rootItem}
+    for row in dirs:
+        row = ((row[0],),) + tuple(row[1:])
+        items_dict[row[1]] = etm.EditTreeItem(data_=row[0], user_data=(row[1:]))
+        id_list.append((row[1:]))
+    for id_ in id_list:
+        if id_[1] in items_dict:
+            items_dict[id_[1]].appendChild(copy.deepcopy(items_dict[id_[0]]))
+
+
+def one_pass_tree(model: etm.EditTreeModel):
+    model.set_model_data(ut.select_other('DIRS'), ut.select_other('VIRT_LINKS'))
+
+
+def count_items(item) -> int:
+    count, stack = 0, [item]
+    while stack:
+        item = stack.pop()
+        count += len(item.children)
+        stack.extend(item.children)
+    return count
+
+
+def main(sizes):
+    app = QApplication.instance() or QApplication([])
+    sys.setrecursionlimit(100000)      # deepcopy of deep trees
+    for size in sizes:
+        conn = sqlite3.connect(':memory:')
+        db.create_all_objects(conn)
+        fill_db(conn, size)
+        ut.DB_setting['Conn'] = conn
+
+        loaders = [('one pass', one_pass_tree)]
+        if size <= LEGACY_LIMIT:
+            loaders.append(('legacy', legacy_tree))
+        for name, loader in loaders:
+            model = etm.EditTreeModel()
+            start = time.perf_counter()
+            loader(model)
+            spent = time.perf_counter() - start
+            print(f'{size:8} dirs  {name:8} {spent:8.2f} s  '
+                  f'{count_items(model.rootItem)} items')
+        conn.close()
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or SIZES)
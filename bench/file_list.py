@@ -0,0 +1,85 @@
+# file_list.py
+"""
+Filling of file list model: append_row for each file with proxy model
+attached, as in previous versions of show_files, against one set_rows,
+and time to first page of rows fetched from cursor by set_source.
+Run from project root:  python -m bench.file_list [number of files ...]
+"""
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+
+from PyQt5.QtCore import QCoreApplication
+
+from src.core.table_model import TableModel, ProxyModel2
+
+SIZES = (10000, 50000, 200000)
+LEGACY_LIMIT = 50000
+FileData = namedtuple("FileData", "file_id dir_id comment_id ext_id source")
+
+
+def make_files(size: int) -> list:
+    # FileName, FileDate, Pages, Size + FileID, DirID, CommentID, ExtID
+    return [(f'file{i}.pdf', '2019-01-01', i % 500, i * 10, i, i // 100, i, 1)
+            for i in range(size)]
+
+
+def new_model():
+    model = TableModel()
+    proxy = ProxyModel2()
+    proxy.setSourceModel(model)
+    model.setHeaderData(0, None, ('File', 'Date', 'Pages', 'Size'))
+    return proxy, model
+
+
+def legacy(files):
+    proxy, model = new_model()
+    for ff in files:
+        model.append_row(tuple(ff[:4]), FileData(*ff[-4:], 0))
+    return proxy
+
+
+def bulk(files):
+    proxy, model = new_model()
+    rows, user_data = [], []
+    for ff in files:
+        rows.append(ff[:4])
+        user_data.append(FileData(*ff[-4:], 0))
+    model.set_rows(rows, user_data)
+    return proxy
+
+
+def first_page(conn):
+    proxy, model = new_model()
+    model.set_source(conn.execute('select * from Files order by Name;'),
+                     lambda ff: (ff[:4], FileData(*ff[-4:], 0)))
+    return proxy
+
+
+def main(sizes):
+    app = QCoreApplication(sys.argv)
+    print(f'{"files":>8} {"append_row s":>13} {"set_rows s":>11} {"set_source s":>13}')
+    for size in sizes:
+        files = make_files(size)
+        conn = sqlite3.connect(':memory:')
+        conn.execute('create table Files (Name, Date, Pages, Size, '
+                     'FileID, DirID, CommentID, ExtID);')
+        conn.execute('create index Files_Name on Files(Name);')
+        conn.executemany('insert into Files values (?, ?, ?, ?, ?, ?, ?, ?);', files)
+        if size <= LEGACY_LIMIT:
+            start = time.perf_counter()
+            legacy(files)
+            old = f'{time.perf_counter() - start:13.3f}'
+        else:
+            old = f'{"-":>13}'
+        start = time.perf_counter()
+        bulk(files)
+        new = time.perf_counter() - start
+        start = time.perf_counter()
+        first_page(conn)
+        print(f'{size:8} {old} {new:11.3f} {time.perf_counter() - start:13.4f}')
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or SIZES)
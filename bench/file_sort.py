@@ -0,0 +1,67 @@
+# file_sort.py
+"""
+Sorting of file list by Size: QSortFilterProxyModel with lessThan of
+previous versions (str cells, int() in each comparison) against sort
+of source model by cached permutation.
+Run from project root:  python -m bench.file_sort [number of files ...]
+"""
+import random
+import sys
+import time
+
+from PyQt5.QtCore import QCoreApplication, QSortFilterProxyModel, Qt
+
+from src.core.table_model import TableModel, ProxyModel2
+
+SIZES = (10000, 100000, 500000)
+LEGACY_LIMIT = 100000
+HEADER = ('File', 'Date', 'Pages', 'Size')
+
+
+class LegacyProxy(QSortFilterProxyModel):
+    def lessThan(self, left, right):
+        s_model = self.sourceModel()
+        left_data = s_model.data(left)
+        right_data = s_model.data(right)
+
+        if s_model.headerData(left.column(), Qt.Horizontal) in ('Pages', 'Size'):
+            left_data = int(left_data) or 0
+            right_data = int(right_data) or 0
+
+        return left_data < right_data
+
+
+def make_model(proxy, size: int):
+    rnd = random.Random(1)
+    model = TableModel()
+    model.setHeaderData(0, Qt.Horizontal, HEADER)
+    model.set_rows([(f'file{i}.pdf', '2019-01-01', rnd.randrange(1000),
+                     rnd.randrange(10**9)) for i in range(size)])
+    proxy.setSourceModel(model)
+    return proxy
+
+
+def timed(proxy, order) -> float:
+    start = time.perf_counter()
+    proxy.sort(3, order)
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    app = QCoreApplication(sys.argv)
+    print(f'{"files":>8} {"lessThan s":>11} {"sort s":>7} '
+          f'{"reverse s":>10} {"same s":>7}')
+    for size in sizes:
+        if size <= LEGACY_LIMIT:
+            old = f'{timed(make_model(LegacyProxy(), size), Qt.AscendingOrder):11.3f}'
+        else:
+            old = f'{"-":>11}'
+        proxy = make_model(ProxyModel2(), size)
+        first = timed(proxy, Qt.AscendingOrder)
+        reverse = timed(proxy, Qt.DescendingOrder)
+        same = timed(proxy, Qt.DescendingOrder)
+        print(f'{size:8} {old} {first:7.3f} {reverse:10.3f} {same:7.3f}')
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or SIZES)
@@ -0,0 +1,103 @@
+# fts_search.py
+"""
+Full-text index "FileSearch" over synthetic DB: quick search by words
+and prefixes, ranked if not too many files found; tag scan as in previous
+versions (FILE_INFO and re.search for each tag) against MATCH queries
+of scan_tags. Also cost of triggers while files are inserted and of
+index update.
+Run from project root:  python -m bench.fts_search [number of files]
+"""
+import random
+import re
+import sqlite3
+import sys
+import time
+
+from src.core import create_db as db
+import src.core.utilities as ut
+
+FILES = 1000000
+EXTS = 20
+WORDS = 20000
+TAGS = 10
+PAGE = 500
+
+QUERIES = ('w1', 'w12', 'w1234', 'w12 w3', 'w19999', 'python')
+
+# FILE_INFO of previous versions: files not tagged by tag yet
+FILE_INFO = ('select A.FileName || " " || COALESCE(B.BookTitle, "") '
+             '|| " " || COALESCE(B.Comment, ""), A.FileID from '
+             'Files A left join Comments B on B.CommentID = A.CommentID '
+             f'where A.ExtID in ({ut.IN_LIST}) and NOT EXISTS (select * from '
+             'FileTag where FileID = A.FileID and TagID = ?);')
+
+
+def fill_db(conn: sqlite3.Connection, files: int) -> float:
+    rnd = random.Random(1)
+    # words of Zipf-like frequency: w1 is the most frequent
+    words = [f'w{int(WORDS ** rnd.random())}' for _ in range(files * 4)]
+    start = time.perf_counter()
+    conn.executemany('insert into Comments (CommentID, BookTitle, Comment) values (?, ?, ?);',
+                     ((i, ' '.join(words[4 * i:4 * i + 2]), words[4 * i + 3])
+                      for i in range(1, files, 2)))
+    conn.executemany('insert into Files (FileID, DirID, FileName, ExtID, CommentID) '
+                     'values (?, ?, ?, ?, ?);',
+                     ((i, 1, f'{words[4 * i + 2]} {i}.pdf', rnd.randrange(1, EXTS),
+                       i if i % 2 else None) for i in range(1, files)))
+    conn.commit()
+    return time.perf_counter() - start
+
+
+def legacy_scan(conn: sqlite3.Connection, tags, ext_ids) -> dict:
+    found = {}
+    for tag, tag_id in tags:
+        files = conn.execute(FILE_INFO,
+                             (ut.in_list(ext_ids), tag_id)).fetchall()
+        found[tag_id] = sum(1 for file in files
+                            if re.search(r'\b' + tag + r'\b', file[0], re.IGNORECASE))
+    return found
+
+
+def main(files: int = FILES):
+    plain = sqlite3.connect(':memory:')
+    for obj in db.OBJ_DEFS:
+        plain.execute(obj)
+    fill_plain = fill_db(plain, files)
+    plain.close()
+
+    conn = sqlite3.connect(':memory:')
+    db.create_all_objects(conn)
+    fill = fill_db(conn, files)
+    print(f'{files} files inserted in {fill_plain:.1f} s without index, '
+          f'in {fill:.1f} s with triggers')
+    ut.DB_setting['Conn'] = conn
+    start = time.perf_counter()
+    ut.sync_search()
+    print(f'index of {files} files built from SearchQueue in '
+          f'{time.perf_counter() - start:.1f} s')
+
+    print(f'{"query":12} {"rows":>7} {"first page ms":>14} {"all rows ms":>12}')
+    for text in QUERIES:
+        start = time.perf_counter()
+        curs = ut.quick_search(text)
+        rows = len(curs.fetchmany(PAGE))
+        first = time.perf_counter() - start
+        rows += len(curs.fetchall())
+        total = time.perf_counter() - start
+        print(f'{text:12} {rows:7} {first * 1000:14.1f} {total * 1000:12.1f}')
+
+    tags = [(f'w{i}', i) for i in range(100, 100 + TAGS)]
+    ext_ids = list(range(1, EXTS // 2))
+    start = time.perf_counter()
+    old = legacy_scan(conn, tags, ext_ids)
+    old_time = time.perf_counter() - start
+    start = time.perf_counter()
+    new, _ = ut.scan_tags(tags, ext_ids)
+    new_time = time.perf_counter() - start
+    assert old == new
+    print(f'tag scan, {TAGS} tags, {sum(new.values())} files tagged: '
+          f'legacy {old_time:.2f} s, MATCH {new_time:.3f} s')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else FILES)
@@ -0,0 +1,93 @@
+# tag_matcher.py
+"""
+Tag scan without full-text index: re.search for each tag over the files
+not tagged yet, one insert_other (commit) per match, as in previous
+versions, against TagMatcher - one pass over files for all tags
+and bulk insert in one transaction.
+Run from project root:  python -m bench.tag_matcher [number of files]
+"""
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.core import create_db as db
+import src.core.utilities as ut
+from src.core.tag_matcher import TagMatcher
+
+FILES = 200000
+WORDS = 20000
+EXTS = 10
+TAGS = (10, 100)
+
+# FILE_INFO of previous versions: files not tagged by tag yet
+FILE_INFO = ('select A.FileName || " " || COALESCE(B.BookTitle, "") '
+             '|| " " || COALESCE(B.Comment, ""), A.FileID from '
+             'Files A left join Comments B on B.CommentID = A.CommentID '
+             f'where A.ExtID in ({ut.IN_LIST}) and NOT EXISTS (select * from '
+             'FileTag where FileID = A.FileID and TagID = ?);')
+
+
+def fill_db(conn, files: int):
+    rnd = random.Random(1)
+    # words of Zipf-like frequency: w1 is the most frequent
+    words = [f'w{int(WORDS ** rnd.random())}' for _ in range(files * 4)]
+    conn.executemany('insert into Extensions (ExtID, Extension) values (?, ?);',
+                     ((i, f'e{i}') for i in range(1, EXTS)))
+    conn.executemany('insert into Comments (CommentID, BookTitle, Comment) values (?, ?, ?);',
+                     ((i, ' '.join(words[4 * i:4 * i + 2]), words[4 * i + 3])
+                      for i in range(1, files, 2)))
+    conn.executemany('insert into Files (FileID, DirID, FileName, ExtID, CommentID) '
+                     'values (?, 0, ?, ?, ?);',
+                     ((i, f'{words[4 * i + 2]} {i}.pdf', rnd.randrange(1, EXTS),
+                       i if i % 2 else None) for i in range(1, files)))
+    conn.execute('drop table FileSearch;')
+    conn.commit()
+
+
+def legacy_scan(tags, ext_ids) -> dict:
+    found = {}
+    for tag, tag_id in tags:
+        files = ut.get_connection().execute(
+            FILE_INFO, (ut.in_list(ext_ids), tag_id)).fetchall()
+        found[tag_id] = 0
+        for file in files:
+            if re.search(r'\b' + tag + r'\b', file[0], re.IGNORECASE):
+                ut.insert_other('TAG_FILE', (tag_id, file[1]))
+                found[tag_id] += 1
+    return found
+
+
+def main(files: int = FILES):
+    ext_ids = list(range(1, EXTS // 2))
+    print(f'{"tags":>5} {"tagged":>7} {"legacy s":>9} {"matcher s":>10} {"rows/s":>9}')
+    for count in TAGS:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = ut.create_connection(str(Path(tmp) / 'bench.db'))
+            db.create_all_objects(conn)
+            fill_db(conn, files)
+            tags = [(f'w{i}', i) for i in range(100, 100 + count)]
+
+            start = time.perf_counter()
+            old = legacy_scan(tags, ext_ids)
+            old_time = time.perf_counter() - start
+            conn.execute('delete from FileTag;')
+            conn.commit()
+
+            start = time.perf_counter()
+            matcher = TagMatcher(tags)
+            pairs = matcher.scan(ut.select_other('FILE_INFO', (ut.in_list(ext_ids),)))
+            with ut.unit_of_work():
+                ut.insert_many('TAG_FILE_IGNORE', pairs)
+            new_time = time.perf_counter() - start
+            assert old == matcher.found
+            print(f'{count:5} {len(pairs):7} {old_time:9.2f} {new_time:10.2f} '
+                  f'{matcher.get_speed():9.0f}')
+            ut.DB_setting['Pool'].close()
+            ut.DB_setting['Conn'] = ut.DB_setting['Pool'] = None
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else FILES)
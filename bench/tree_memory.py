@@ -0,0 +1,95 @@
+# tree_memory.py
+"""
+Memory of dir tree built by EditTreeModel: items of previous versions
+(attributes in __dict__, own DirData and display tuple) against __slots__
+items, and copy of folder on drop: deepcopy of subtree against clone.
+Run from project root:  python -m bench.tree_memory [number of dirs ...]
+"""
+import copy
+import gc
+import sys
+import time
+import tracemalloc
+
+from src.core import edit_tree_model as etm
+
+SIZES = (10000, 100000, 500000)
+
+
+class LegacyItem(object):
+    """
+    replica of EditTreeItem of previous versions
+    """
+    def __init__(self, data_, user_data=None, parent=None):
+        self.parent_ = parent
+        self.userData = etm.DirData(*user_data) if user_data else None
+        self.itemData = data_
+        self.children = []
+        self.row_ = 0
+        self.fetched = True
+        self.has_children = None
+
+
+def make_dirs(size: int) -> list:
+    # 10 children in each dir
+    return [(i, i // 10, f'/d{i // 10}/d{i}', 0) for i in range(1, size + 1)]
+
+
+def legacy_tree(dirs):
+    root = LegacyItem(('',), (0, 0, 0, 'Root'))
+    items = {0: root}       # as ALL_ITEMS, one item per dir
+    for dir_id, parent_id, path, folder_type in dirs:
+        parent = items[parent_id][0] if parent_id else root
+        item = LegacyItem((path.rsplit('/', 1)[1],),
+                          (dir_id, parent_id, folder_type, path), parent)
+        item.row_ = len(parent.children)
+        parent.children.append(item)
+        items[dir_id] = [item]
+    return root, items
+
+
+def slots_tree(dirs):
+    model = etm.EditTreeModel()
+    model.set_model_data(dirs)
+    return model
+
+
+def traced(func, *args):
+    """
+    :return: result of func and size of memory kept by it, MB
+    """
+    gc.collect()
+    tracemalloc.start()
+    res = func(*args)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return res, current / 2**20
+
+
+def main(sizes):
+    print(f'{"dirs":>8} {"legacy MB":>10} {"slots MB":>9} '
+          f'{"deepcopy s":>11} {"clone s":>9}')
+    for size in sizes:
+        dirs = make_dirs(size)
+        legacy, legacy_mb = traced(legacy_tree, dirs)
+        del legacy
+        model, slots_mb = traced(slots_tree, dirs)
+
+        # copy of folder with whole tree below it
+        item = model.rootItem.children[0]
+        start = time.perf_counter()
+        copy.deepcopy(item)
+        deep = time.perf_counter() - start
+        start = time.perf_counter()
+        item.clone()
+        clone = time.perf_counter() - start
+
+        print(f'{size:8} {legacy_mb:10.1f} {slots_mb:9.1f} '
+              f'{deep:11.3f} {clone:9.6f}')
+        del model, item
+        etm.ALL_ITEMS.clear()
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(100000)
+    main([int(x) for x in sys.argv[1:]] or SIZES)
@@ -0,0 +1,50 @@
+# tree_row.py
+"""
+Cost of EditTreeModel.parent() as fan-out of dir grows:
+row kept in item against search in list of siblings of previous versions.
+Run from project root:  python -m bench.tree_row [fan-out ...]
+"""
+import sys
+import time
+
+from src.core import edit_tree_model as etm
+
+FAN_OUT = (1000, 5000, 20000, 50000)
+
+
+def make_model(fan_out: int) -> etm.EditTreeModel:
+    """
+    root -> fan_out dirs, each of them has one child
+    """
+    model = etm.EditTreeModel()
+    dirs = [(i, 0, f'/d{i}', 0) for i in range(1, fan_out + 1)]
+    dirs += [(fan_out + i, i, f'/d{i}/c', 0) for i in range(1, fan_out + 1)]
+    model.set_model_data(dirs)
+    return model
+
+
+def main(sizes):
+    print(f'{"fan-out":>8} {"parent() us":>12} {"list.index us":>14}')
+    for fan_out in sizes:
+        model = make_model(fan_out)
+        # index of the only child of each dir - parent() has to find
+        # row of dir among its siblings
+        indexes = [model.index(0, 0, model.index(row, 0)) for row in range(fan_out)]
+
+        start = time.perf_counter()
+        for idx in indexes:
+            model.parent(idx)
+        per_call = (time.perf_counter() - start) / fan_out * 1e6
+
+        items = model.rootItem.children
+        sample = items[::max(1, fan_out // 1000)]
+        start = time.perf_counter()
+        for item in sample:
+            items.index(item)         # row() of previous versions
+        legacy = (time.perf_counter() - start) / len(sample) * 1e6
+
+        print(f'{fan_out:8} {per_call:12.2f} {legacy:14.2f}')
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or FAN_OUT)
@@ -88,11 +88,221 @@ CREATE TABLE IF NOT EXISTS VirtFiles (
 DirID INTEGER not null,
 FileID INTEGER not null,
 FOREIGN KEY(DirID) REFERENCES Dirs(DirID) ON DELETE CASCADE
+);''',
+
+    '''
+CREATE TABLE IF NOT EXISTS DirSnapshot (
+Path TEXT NOT NULL PRIMARY KEY,
+MTime INTEGER,
+Entries INTEGER,
+Ext TEXT
+);''',
+
+    '''
+CREATE TABLE IF NOT EXISTS InfoCache (
+Size INTEGER NOT NULL,
+MTime INTEGER NOT NULL,
+Hash TEXT NOT NULL,
+Info TEXT,
+Used INTEGER,
+primary key(Size, MTime, Hash)
 );''',
 
     'CREATE INDEX IF NOT EXISTS Dirs_ParentID ON Dirs(ParentID);',
 )
 
+# indexes for lookups by value; not unique - DB created by
+# previous versions may contain duplicates
+INDEX_DEFS = (
+    'CREATE INDEX IF NOT EXISTS Dirs_Path ON Dirs(Path);',
+    'CREATE INDEX IF NOT EXISTS Files_DirID_FileName ON Files(DirID, FileName);',
+    'CREATE INDEX IF NOT EXISTS Files_ExtID ON Files(ExtID);',
+    'CREATE INDEX IF NOT EXISTS Extensions_Extension ON Extensions(Extension, ExtID);',
+    'CREATE INDEX IF NOT EXISTS Authors_Author ON Authors(Author, AuthorID);',
+    'CREATE INDEX IF NOT EXISTS Tags_Tag ON Tags(Tag, TagID);',
+    'CREATE INDEX IF NOT EXISTS FileTag_TagID ON FileTag(TagID, FileID);',
+    'CREATE INDEX IF NOT EXISTS FileAuthor_AuthorID ON FileAuthor(AuthorID, FileID);',
+    'CREATE INDEX IF NOT EXISTS VirtFiles_DirID ON VirtFiles(DirID, FileID);',
+)
+
+# all pairs (ancestor, descendant) of Dirs linked by ParentID, including
+# pairs (dir, dir) with Depth = 0; maintained by triggers on Dirs
+CLOSURE_DEFS = (
+    '''
+CREATE TABLE IF NOT EXISTS DirClosure (
+Ancestor INTEGER NOT NULL,
+Descendant INTEGER NOT NULL,
+Depth INTEGER NOT NULL,
+primary key(Ancestor, Descendant)
+) WITHOUT ROWID;''',
+
+    'CREATE INDEX IF NOT EXISTS DirClosure_Descendant ON DirClosure(Descendant, Depth);',
+
+    # ancestors of new dir x its descendants - children may be inserted before
+    '''
+CREATE TRIGGER IF NOT EXISTS Dirs_Closure_Insert AFTER INSERT ON Dirs
+BEGIN
+insert or ignore into DirClosure (Ancestor, Descendant, Depth)
+select a.Ancestor, d.Descendant, a.Depth + d.Depth from
+(select NEW.DirID as Ancestor, 0 as Depth union all
+ select Ancestor, Depth + 1 from DirClosure where Descendant = NEW.ParentID) as a,
+(select NEW.DirID as Descendant, 0 as Depth union all
+ select c.Descendant, c.Depth + 1 from Dirs as s join DirClosure as c
+ on c.Ancestor = s.DirID where s.ParentID = NEW.DirID and s.DirID != NEW.DirID) as d;
+END;''',
+
+    # subtree of dir is moved: links to old ancestors are replaced by new ones
+    '''
+CREATE TRIGGER IF NOT EXISTS Dirs_Closure_Move AFTER UPDATE OF ParentID ON Dirs
+WHEN OLD.ParentID is not NEW.ParentID
+BEGIN
+delete from DirClosure
+where Descendant in (select Descendant from DirClosure where Ancestor = NEW.DirID)
+and Ancestor not in (select Descendant from DirClosure where Ancestor = NEW.DirID);
+insert or ignore into DirClosure (Ancestor, Descendant, Depth)
+select a.Ancestor, d.Descendant, a.Depth + d.Depth + 1
+from DirClosure as a, DirClosure as d
+where a.Descendant = NEW.ParentID and d.Ancestor = NEW.DirID;
+END;''',
+
+    # sub-dirs of deleted dir, if any, lose links to its ancestors
+    '''
+CREATE TRIGGER IF NOT EXISTS Dirs_Closure_Delete AFTER DELETE ON Dirs
+BEGIN
+delete from DirClosure
+where Descendant in (select Descendant from DirClosure where Ancestor = OLD.DirID)
+and Ancestor in (select Ancestor from DirClosure where Descendant = OLD.DirID);
+END;''',
+
+    # existing dirs
+    '''
+insert or ignore into DirClosure (Ancestor, Descendant, Depth)
+WITH RECURSIVE x(Ancestor, Descendant, Depth) AS (
+SELECT DirID, DirID, 0 FROM Dirs
+UNION ALL SELECT x.Ancestor, t.DirID, x.Depth + 1 FROM x INNER JOIN Dirs AS t
+ON t.ParentID = x.Descendant and t.DirID != t.ParentID and x.Depth < 1000)
+SELECT * FROM x;''',
+)
+
+# full-text index of files: rowid = FileID; tags and authors of file are
+# kept as space separated words. Triggers put IDs of changed files into
+# SearchQueue, the index is updated from it by SYNC_SEARCH in one statement:
+# FTS5 writes made by triggers row by row are many times slower
+SEARCH_DEFS = (
+    '''
+CREATE VIRTUAL TABLE IF NOT EXISTS FileSearch USING fts5(
+FileName, BookTitle, Comment, Tags, Authors,
+tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);''',
+
+    # matches in file name and title are ranked higher
+    "insert into FileSearch (FileSearch, rank) values ('rank', 'bm25(10.0, 5.0, 1.0, 2.0, 2.0)');",
+
+    '''
+CREATE TABLE IF NOT EXISTS SearchQueue (
+FileID INTEGER NOT NULL PRIMARY KEY
+);''',
+
+    'CREATE INDEX IF NOT EXISTS Files_CommentID ON Files(CommentID);',
+
+    '''
+CREATE TRIGGER IF NOT EXISTS Files_Search_Insert AFTER INSERT ON Files
+BEGIN
+insert or ignore into SearchQueue values (NEW.FileID);
+END;''',
+
+    '''
+CREATE TRIGGER IF NOT EXISTS Files_Search_Update AFTER UPDATE OF FileName, CommentID ON Files
+BEGIN
+insert or ignore into SearchQueue values (NEW.FileID);
+END;''',
+
+    '''
+CREATE TRIGGER IF NOT EXISTS Files_Search_Delete AFTER DELETE ON Files
+BEGIN
+insert or ignore into SearchQueue values (OLD.FileID);
+END;''',
+
+    '''
+CREATE TRIGGER IF NOT EXISTS Comments_Search_Update AFTER UPDATE OF Comment, BookTitle ON Comments
+BEGIN
+insert or ignore into SearchQueue select FileID from Files where CommentID = NEW.CommentID;
+END;''',
+
+    '''
+CREATE TRIGGER IF NOT EXISTS Comments_Search_Delete AFTER DELETE ON Comments
+BEGIN
+insert or ignore into SearchQueue select FileID from Files where CommentID = OLD.CommentID;
+END;''',
+
+    '''
+CREATE TRIGGER IF NOT EXISTS FileTag_Search_Insert AFTER INSERT ON FileTag
+BEGIN
+insert or ignore into SearchQueue values (NEW.FileID);
+END;''',
+
+    '''
+CREATE TRIGGER IF NOT EXISTS FileTag_Search_Delete AFTER DELETE ON FileTag
+BEGIN
+insert or ignore into SearchQueue values (OLD.FileID);
+END;''',
+
+    '''
+CREATE TRIGGER IF NOT EXISTS Tags_Search_Update AFTER UPDATE OF Tag ON Tags
+BEGIN
+insert or ignore into SearchQueue select FileID from FileTag where TagID = NEW.TagID;
+END;''',
+
+    '''
+CREATE TRIGGER IF NOT EXISTS FileAuthor_Search_Insert AFTER INSERT ON FileAuthor
+BEGIN
+insert or ignore into SearchQueue values (NEW.FileID);
+END;''',
+
+    '''
+CREATE TRIGGER IF NOT EXISTS FileAuthor_Search_Delete AFTER DELETE ON FileAuthor
+BEGIN
+insert or ignore into SearchQueue values (OLD.FileID);
+END;''',
+
+    '''
+CREATE TRIGGER IF NOT EXISTS Authors_Search_Update AFTER UPDATE OF Author ON Authors
+BEGIN
+insert or ignore into SearchQueue select FileID from FileAuthor where AuthorID = NEW.AuthorID;
+END;''',
+
+    # existing files
+    'insert into SearchQueue select FileID from Files;',
+)
+
+# apply SearchQueue to FileSearch
+SYNC_SEARCH = (
+    'delete from FileSearch where rowid in (select FileID from SearchQueue);',
+
+    '''
+insert into FileSearch (rowid, FileName, BookTitle, Comment, Tags, Authors)
+select f.FileID, f.FileName, c.BookTitle, c.Comment,
+(select group_concat(Tag, ' ') from Tags where TagID in
+ (select TagID from FileTag where FileID = f.FileID)),
+(select group_concat(Author, ' ') from Authors where AuthorID in
+ (select AuthorID from FileAuthor where FileID = f.FileID))
+from SearchQueue as q join Files as f on f.FileID = q.FileID
+left join Comments as c on c.CommentID = f.CommentID;''',
+
+    'delete from SearchQueue;',
+)
+
+# schema version -> SQL to upgrade DB from previous version,
+# version is kept in 'PRAGMA user_version'
+MIGRATIONS = {
+    1: INDEX_DEFS,
+    2: ('CREATE INDEX IF NOT EXISTS VirtDirs_ParentID ON VirtDirs(ParentID, DirID);',),
+    3: CLOSURE_DEFS,
+    4: SEARCH_DEFS,
+}
+
+SCHEMA_VERSION = max(MIGRATIONS)
+
 
 def create_all_objects(connection):
     cursor = connection.cursor()
@@ -104,9 +314,49 @@ def create_all_objects(connection):
             print(err)
             return
 
+    migrate_db(connection)
     initiate_db(connection)
 
 
+def update_db(connection):
+    """
+    Create DB objects missing in DB created by previous versions
+    """
+    cursor = connection.cursor()
+    for obj in OBJ_DEFS:
+        try:
+            cursor.execute(obj)
+        except sqlite3.Error as err:
+            print("create_db.update_db")
+            print(err)
+            return
+    connection.commit()
+    migrate_db(connection)
+
+
+def migrate_db(connection) -> int:
+    """
+    Upgrade DB schema step by step up to SCHEMA_VERSION,
+    each step in its own transaction
+    :return: schema version of DB
+    """
+    version = connection.execute('PRAGMA user_version;').fetchone()[0]
+    for ver in range(version + 1, SCHEMA_VERSION + 1):
+        try:
+            connection.execute('BEGIN;')
+            for sql in MIGRATIONS[ver]:
+                connection.execute(sql)
+            connection.execute(f'PRAGMA user_version = {ver};')
+            connection.commit()
+        except sqlite3.Error as err:
+            connection.rollback()
+            print("create_db.migrate_db", ver)
+            print(err)
+            break
+        version = ver
+    return version
+
+
 def initiate_db(connection):
     cursor = connection.cursor()
     try:
@@ -1,7 +1,8 @@
 # edit_tree_model.py
 
-import copy
 from collections import namedtuple, defaultdict
+import gc
+import os
 
 from PyQt5.QtCore import (QAbstractItemModel, QModelIndex, Qt, QMimeData, QByteArray,
                           QDataStream, QIODevice, QPersistentModelIndex)
@@ -16,36 +17,129 @@ import src.core.utilities as ut
 DirData = namedtuple('DirData', 'dir_id parent_id is_virtual path')
 # dir_id: int, parent_id: int, is_virtual: int, path: str
 
-ALL_ITEMS = defaultdict(list)
 
+class DirItems(object):
+    """
+    dir_id -> all items of dir in tree: the dir itself and its copies.
+    Most dirs have no copies, so the only item is kept without list
+    """
 
-class EditTreeItem(object):
+    def __init__(self):
+        self._items = {}
+
+    def add(self, item):
+        items = self._items.get(item.dir_id)
+        if items is None:
+            self._items[item.dir_id] = item
+        elif isinstance(items, list):
+            items.append(item)
+        else:
+            self._items[item.dir_id] = [items, item]
+
+    def discard(self, item):
+        items = self._items.get(item.dir_id)
+        if items is item:
+            del self._items[item.dir_id]
+        elif isinstance(items, list) and item in items:
+            items.remove(item)
+            if len(items) == 1:
+                self._items[item.dir_id] = items[0]
+
+    def __getitem__(self, dir_id) -> list:
+        items = self._items.get(dir_id)
+        if items is None:
+            return []
+        return list(items) if isinstance(items, list) else [items]
+
+    get = __getitem__
+
+    def pop(self, dir_id) -> list:
+        items = self[dir_id]
+        self._items.pop(dir_id, None)
+        return items
+
+    def values(self):
+        return (self[dir_id] for dir_id in self._items)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+ALL_ITEMS = DirItems()
 
-    def __init__(self, data_, user_data=None, parent=None):
+
+class EditTreeItem(object):
+    """
+    Node of dir tree. Path is shared by all copies of the same dir,
+    display name is taken from path if data_ is not given;
+    DirData is created on request.
+    """
+    __slots__ = ('parent_', 'children', 'row_', 'fetched', 'has_children',
+                 'data_', 'dir_id', 'parent_id', 'is_virtual_', 'path')
+
+    def __init__(self, data_=None, user_data=None, parent=None):
         self.parent_ = parent
+        self.userData = user_data
+        self.data_ = data_
+        self.children = ()          # list is created for the first child
+        self.row_ = 0               # position in parent_.children
+        self.fetched = True         # False - children are not loaded yet
+        self.has_children = None    # cached for not fetched item
+
+    @property
+    def itemData(self):
+        if self.data_ is None:
+            return (os.path.split(self.path)[1],)
+        return self.data_
+
+    @itemData.setter
+    def itemData(self, data_):
+        self.data_ = data_
+
+    @property
+    def userData(self):
+        if self.dir_id is None:
+            return None
+        return DirData(self.dir_id, self.parent_id, self.is_virtual_, self.path)
+
+    @userData.setter
+    def userData(self, user_data):
         if user_data:
-            self.userData = DirData(*user_data)
+            self.dir_id, self.parent_id, self.is_virtual_, self.path = user_data
         else:
-            self.userData = None
-        self.itemData = data_
-        self.children = []
+            self.dir_id = self.parent_id = self.is_virtual_ = self.path = None
+
+    def clone(self):
+        """
+        Copy of item that shares its data, children of copy
+        are loaded from DB when they are requested
+        """
+        item = EditTreeItem(self.data_, None, self.parent_)
+        item.dir_id, item.parent_id = self.dir_id, self.parent_id
+        item.is_virtual_, item.path = self.is_virtual_, self.path
+        item.fetched = False
+        return item
 
     def childNumber(self):
         if self.parent_ is not None:
-            return self.parent_.children.index(self)
+            return self.row_
         return 0
 
     def removeChildren(self, position, count):
         if position < 0 or position + count > len(self.children):
             return False
 
-        for _ in range(count):
-            self.children.pop(position)
+        del self.children[position:position + count]
+        for row, child in enumerate(self.children[position:], position):
+            child.row_ = row
 
         return True
 
     def is_virtual(self):
-        return self.userData.is_virtual > 0
+        return self.is_virtual_ > 0
 
     def child(self, row):
         return self.children[row]
@@ -74,17 +168,37 @@ class EditTreeItem(object):
         return None
 
     def appendChild(self, item):
+        item.parent_id = self.dir_id
+        for node in item.subtree():
+            ALL_ITEMS.add(node)
+        self.add_child(item)
+
+    def add_child(self, item):
+        """
+        append item, without update of its DirData and ALL_ITEMS
+        """
+        if not self.children:
+            self.children = []
         item.parent_ = self
-        item.userData = item.userData._replace(parent_id=self.userData.dir_id)
-        ALL_ITEMS[item.userData.dir_id].append(item)
+        item.row_ = len(self.children)
         self.children.append(item)
 
     def parent(self):
         return self.parent_
 
+    def subtree(self):
+        """
+        item and all its loaded descendants
+        """
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            yield item
+            stack.extend(item.children)
+
     def row(self):
         if self.parent_:
-            return self.parent_.children.index(self)
+            return self.row_
 
         return 0
 
@@ -93,6 +207,10 @@ class EditTreeItem(object):
 
 
 class EditTreeModel(QAbstractItemModel):
+    """
+    Tree of dirs. In lazy mode only top level dirs are loaded at start,
+    children of dir are loaded from DB when it is expanded (fetchMore)
+    """
 
     alt_font = QFont("Times", 10)
 
@@ -101,12 +219,16 @@ class EditTreeModel(QAbstractItemModel):
         EditTreeModel.alt_font = QFont(font)
         EditTreeModel.alt_font.setItalic(True)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, lazy=False):
         super(EditTreeModel, self).__init__(None)
 
         self.rootItem = EditTreeItem(data_=('',), user_data=(0, 0, 0, "Root"))
         self.caller = parent
+        self.lazy = lazy
         ALL_ITEMS.clear()
+        if lazy:
+            self.rootItem.fetched = False
+            self.fetchMore(QModelIndex())
 
     @staticmethod
     def is_virtual(index):
@@ -190,18 +312,18 @@ class EditTreeModel(QAbstractItemModel):
                                        (new_parent_data[0],
                                         *new_parent_data[2:4],
                                         new_parent_data[1]))
+        grand = QPersistentModelIndex(self.parent(curr_idx))
+        items = [QModelIndex(idx).internalPointer() for idx in idx_list]
         for idx in idx_list:
-            item = copy.deepcopy(QModelIndex(idx).internalPointer())
-            item.userData = item.userData._replace(
-                parent_id=new_parent_data[2])
-            ut.update_other(
-                'DIR_PARENT', (new_parent_data[0], item.userData.dir_id))
-            new_parent_item.appendChild(item)
+            self.remove_row(QModelIndex(idx))
 
-        curr_idx.internalPointer().parent().appendChild(new_parent_item)
+        for item in items:
+            ut.update_other('DIR_PARENT', (new_parent_data[0], item.dir_id))
+            item.parent_id = new_parent_item.dir_id
+            # subtree is registered in ALL_ITEMS once, by append_child
+            new_parent_item.add_child(item)
 
-        for idx in idx_list:
-            self.remove_row(QModelIndex(idx))
+        self.append_child(new_parent_item, QModelIndex(grand))
 
     def removeRows(self, row, count, parent=QModelIndex()):
         """
@@ -212,11 +334,17 @@ class EditTreeModel(QAbstractItemModel):
         :return: bool
         """
         parentItem = self.getItem(parent)
+        removed = parentItem.children[row:row + count]
 
-        # self.beginRemoveRows(parent, row, row + count - 1)
+        self.beginRemoveRows(parent, row, row + count - 1)
         success = parentItem.removeChildren(row, count)
         self.endRemoveRows()
 
+        if success:
+            for item in removed:
+                for node in item.subtree():
+                    ALL_ITEMS.discard(node)
+
         return success
 
     def remove_row(self, index):
@@ -228,7 +356,7 @@ class EditTreeModel(QAbstractItemModel):
         :param  index
         :return None
         """
-        dir_id = index.internalPointer().userData.dir_id
+        dir_id = index.internalPointer().dir_id
         items = ALL_ITEMS[dir_id]
         idx_list = []
         for item in items:
@@ -236,7 +364,9 @@ class EditTreeModel(QAbstractItemModel):
             idx_list.append(QPersistentModelIndex(idx))
 
         for idx in idx_list:
-            res = self.remove_row(QModelIndex(idx))
+            # copy may be already removed with its parent
+            if idx.isValid():
+                self.remove_row(QModelIndex(idx))
 
         ALL_ITEMS.pop(dir_id)
 
@@ -245,6 +375,55 @@ class EditTreeModel(QAbstractItemModel):
 
         return parentItem.childCount()
 
+    def hasChildren(self, parent=QModelIndex()):
+        item = self.getItem(parent)
+        if item.fetched:
+            return item.childCount() > 0
+        if item.has_children is None:
+            item.has_children = bool(ut.select_other(
+                'HAS_CHILDREN', {'dir_id': item.dir_id}).fetchone()[0])
+        return item.has_children
+
+    def canFetchMore(self, parent):
+        return not self.getItem(parent).fetched
+
+    def fetchMore(self, parent):
+        """
+        Load children of parent from DB, their children are not loaded
+        """
+        item = self.getItem(parent)
+        if item.fetched:
+            return
+        item.fetched = True
+        children = self._load_children(item)
+        if children:
+            self.beginInsertRows(parent, 0, len(children) - 1)
+            for child in children:
+                item.add_child(child)
+                ALL_ITEMS.add(child)
+            self.endInsertRows()
+
+    def _load_children(self, parent: EditTreeItem) -> list:
+        """
+        :return: not fetched items - real children of parent dir
+                 followed by dirs linked to it in VirtDirs
+        """
+        parent_id = parent.dir_id
+        children = []
+        for dir_id, path, folder_type in ut.select_other('DIR_CHILDREN', (parent_id,)):
+            children.append(EditTreeItem(None, (dir_id, parent_id, folder_type, path),
+                                         parent))
+        for dir_id, path, folder_type in ut.select_other('VIRT_CHILDREN', (parent_id,)):
+            if self._is_ancestor(parent, dir_id):
+                continue
+            if folder_type == 1:
+                folder_type = 2
+            children.append(EditTreeItem(None, (dir_id, parent_id, folder_type, path),
+                                         parent))
+        for child in children:
+            child.fetched = False
+        return children
+
     def setHeaderData(self, p_int, orientation, value, role=None):
         if isinstance(value, str):
             value = value.split(';')
@@ -252,8 +431,12 @@ class EditTreeModel(QAbstractItemModel):
 
     def append_child(self, item: EditTreeItem, parent):
         parentItem: EditTreeItem = self.getItem(parent)
-        item.userData = item.userData._replace(
-            parent_id=parentItem.userData.dir_id)
+        if not parentItem.fetched:
+            # children are loaded from DB, item may be already saved there
+            self.fetchMore(parent)
+            dir_id = item.dir_id
+            if any(child.dir_id == dir_id for child in parentItem.children):
+                return True
         position = parentItem.childCount()
 
         self.beginInsertRows(parent, position, position)
@@ -265,33 +448,68 @@ class EditTreeModel(QAbstractItemModel):
         item = self.getItem(index)
         name = name.strip()
         item.itemData = (name,)
-        item.userData = item.userData._replace(path=name)
+        item.path = name
 
-    def set_model_data(self, rows):
+    def set_model_data(self, dirs, virt_dirs=()):
         """
-        Fill tree structure
-        :param rows: iterable, each item contains at least 3 elements
-             item[0]  - string/"tuple of strings" to be shown == Qt.DisplayRole,
-             item[1:] - user_data:
-                  item[1]  - Id of item, unique,
-                  item[2]  - Id of parent item, 0 for root,
-                        ...
-             and sorted by item(2) - parent ID - in descendant order
+        Fill tree structure in one pass. Dir linked in VirtDirs is shown
+        as copy of its item, subtree of copy is loaded on expand
+        :param dirs: iterable of (DirID, ParentID, Path, FolderType),
+             children are shown in order of dirs
+        :param virt_dirs: iterable of (ParentID, DirID) - dir with its subtree
+             is shown also in parent, after real children of parent
         :return: None
         """
-        id_list = []
-        items_dict = {0: self.rootItem}
-        for row in rows:
-            if not isinstance(row[0], tuple):
-                row = ((row[0],),) + tuple(row[1:])
-            items_dict[row[1]] = EditTreeItem(
-                data_=row[0], user_data=(row[1:]))
-            id_list.append((row[1:]))
-
-        for id_ in id_list:
-            if id_[1] in items_dict:
-                items_dict[id_[1]].appendChild(
-                    copy.deepcopy(items_dict[id_[0]]))
+        # millions of new objects, no garbage - cyclic GC only slows down
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._build_tree(dirs, virt_dirs)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _build_tree(self, dirs, virt_dirs):
+        rows = {}
+        children = defaultdict(list)    # parent_id -> [(dir_id, is_link)]
+        for dir_id, parent_id, path, folder_type in dirs:
+            rows[dir_id] = (path, folder_type)
+            children[parent_id].append((dir_id, False))
+        for parent_id, dir_id in virt_dirs:
+            children[parent_id].append((dir_id, True))
+
+        stack = [self.rootItem]
+        while stack:
+            parent = stack.pop()
+            parent_id = parent.dir_id
+            for dir_id, is_link in children.get(parent_id, ()):
+                if dir_id not in rows:
+                    continue
+                path, folder_type = rows[dir_id]
+                if is_link:
+                    if self._is_ancestor(parent, dir_id):
+                        continue
+                    if folder_type == 1:
+                        folder_type = 2
+                item = EditTreeItem(None, (dir_id, parent_id, folder_type, path))
+                parent.add_child(item)
+                ALL_ITEMS.add(item)
+                if dir_id in children:
+                    if is_link:
+                        item.fetched = False
+                        item.has_children = True
+                    else:
+                        stack.append(item)
+
+    def _is_ancestor(self, item: EditTreeItem, dir_id: int) -> bool:
+        """
+        if dir_id is item or one of its parents - to stop cyclic links
+        """
+        while item is not self.rootItem:
+            if item.dir_id == dir_id:
+                return True
+            item = item.parent_
+        return False
 
     def supportedDropActions(self):
         return Qt.CopyAction | Qt.MoveAction
@@ -366,14 +584,15 @@ class EditTreeModel(QAbstractItemModel):
 
         count = stream.readInt()
         folder_type = 0
-        for _ in range(count):
-            file_id = stream.readInt()
-            folder_type = stream.readInt()
-            if action == DROP_COPY_FILE:
-                ut.insert_other('VIRTUAL_FILE', (parent_dir_id, file_id))
-            elif folder_type > 0:        # DROP_MOVE_FILE
-                ut.update_other('VIRTUAL_FILE_MOVE',
-                                (parent_dir_id, folder_type, file_id))
+        with ut.unit_of_work():
+            for _ in range(count):
+                file_id = stream.readInt()
+                folder_type = stream.readInt()
+                if action == DROP_COPY_FILE:
+                    ut.insert_other('VIRTUAL_FILE', (parent_dir_id, file_id))
+                elif folder_type > 0:        # DROP_MOVE_FILE
+                    ut.update_other('VIRTUAL_FILE_MOVE',
+                                    (parent_dir_id, folder_type, file_id))
 
         if action == DROP_MOVE_FILE:          # update file list after moving files
             self.caller.files_virtual_folder(folder_type)
@@ -385,34 +604,33 @@ class EditTreeModel(QAbstractItemModel):
         drop_data = mime_data.data(mime_format)
         stream = QDataStream(drop_data, QIODevice.ReadOnly)
         idx_count = stream.readInt()
-        for _ in range(idx_count):
-            tmp_str = stream.readQString()
-            id_list = (int(i) for i in tmp_str.split(','))
-            index = self._restore_index(id_list)
-            if action == DROP_MOVE_FOLDER:
-                self._move_folder(index, parent)
-            else:
-                self._copy_folder(index, parent)
+        with ut.unit_of_work():
+            for _ in range(idx_count):
+                tmp_str = stream.readQString()
+                id_list = (int(i) for i in tmp_str.split(','))
+                index = self._restore_index(id_list)
+                if action == DROP_MOVE_FOLDER:
+                    self._move_folder(index, parent)
+                else:
+                    self._copy_folder(index, parent)
         return True
 
     def _move_folder(self, index, parent):
-        item = index.internalPointer()
-        self.append_child(copy.deepcopy(item), parent)
-
-        parent_id = self.data(parent, role=Qt.UserRole).dir_id
-        item_id = self.data(index, role=Qt.UserRole).dir_id
-        ut.update_other('DIR_PARENT', (parent_id, item_id))
-
+        item: EditTreeItem = index.internalPointer()
+        if self._is_ancestor(self.getItem(parent), item.dir_id):
+            return      # can't move folder into itself
+        parent = QPersistentModelIndex(parent)
         self.remove_row(index)
+        self.append_child(item, QModelIndex(parent))
+
+        ut.update_other('DIR_PARENT', (item.parent_id, item.dir_id))
 
     def _copy_folder(self, index, parent):
         item: EditTreeItem = index.internalPointer()
-        new_item: EditTreeItem = copy.deepcopy(item)
-        self.append_child(new_item, parent)
+        self.append_child(item.clone(), parent)
 
         parent_id = self.data(parent, role=Qt.UserRole).dir_id
-        item_id = self.data(index, role=Qt.UserRole).dir_id
-        ut.insert_other('VIRTUAL_DIR', (parent_id, item_id))
+        ut.insert_other('VIRTUAL_DIR', (parent_id, item.dir_id))
 
     def _restore_index(self, path):
         parent = QModelIndex()
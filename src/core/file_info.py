@@ -1,23 +1,30 @@
 # file_info.py
 
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 import datetime
+import hashlib
+import json
+import os
 from pathlib import Path
 import re
 import sqlite3
+import time
 
 import PyPDF2
-from PyQt5.QtCore import pyqtSignal, QObject, pyqtSlot, QRunnable
+from PyQt5.QtCore import pyqtSignal, QObject
 
-from src.core.load_db_data import LoadDBData
+from src.core.jobs import Job, JobCancelled, SCAN, EXTRACT
+from src.core.load_db_data import BulkLoadDBData, RescanDBData, BATCH_SIZE
+from src.core.pdf_header import read_pdf_header, PdfHeaderError
 
-AUTHOR_ID = 'select AuthorID from Authors where Author = ?;'
+ALL_AUTHORS = 'select Author, min(AuthorID) from Authors group by Author;'
 
 INSERT_AUTHOR = 'insert into Authors (Author) values (?);'
 
-FILE_AUTHOR_LINKED = 'select * from FileAuthor where FileID=? and AuthorID=?'
-
-CREATE_FILE_AUTHOR_LINK = 'insert into FileAuthor (FileID, AuthorID) values (?, ?);'
+CREATE_FILE_AUTHOR_LINK = ('insert or ignore into FileAuthor (FileID, AuthorID) '
+                           'values (?, ?);')
 
 SELECT_COMMENT = 'select BookTitle from Comments where CommentID=?;'
 
@@ -25,7 +32,13 @@ INSERT_COMMENT = 'insert into Comments (BookTitle, Comment) values (?, ?);'
 
 FILES_TO_UPDATE = ('select f.FileID, f.FileName, d.Path, f.CommentID, '
                    'f.IssueDate, f.Pages from Files f, Dirs d '
-                   'where f.DirID = d.DirID and d.DirID in ({});')
+                   'where f.DirID = d.DirID and d.DirID in '
+                   '(select value from json_each(?));')
+
+FILES_BY_ID = ('select f.FileID, f.FileName, d.Path, f.CommentID, '
+               'f.IssueDate, f.Pages from Files f, Dirs d '
+               'where f.DirID = d.DirID and f.FileID in '
+               '(select value from json_each(?));')
 
 UPDATE_FILE = ('update Files set '
                'CommentID = :comm_id ,'
@@ -35,6 +48,30 @@ UPDATE_FILE = ('update Files set '
                'IssueDate = :issue_date '
                'where FileID = :file_id;')
 
+INFO_BATCH_SIZE = 500
+
+FAST_READER, PYPDF2_READER = 'fast', 'PyPDF2'
+
+CACHE_LIMIT = 200000      # max number of rows in InfoCache
+
+HASH_SIZE = 4096          # size of file head used in cache key
+
+CACHE_HAS = 'select count(*) from InfoCache where Size = ? and MTime = ?;'
+
+CACHE_GET = 'select Info from InfoCache where Size = ? and MTime = ? and Hash = ?;'
+
+CACHE_PUT = ('insert or replace into InfoCache (Size, MTime, Hash, Info, Used) '
+             'values (?, ?, ?, ?, ?);')
+
+CACHE_USED = 'update InfoCache set Used = ? where Size = ? and MTime = ? and Hash = ?;'
+
+CACHE_EVICT = ('delete from InfoCache where rowid in (select rowid from InfoCache '
+               'order by Used desc limit -1 offset ?);')
+
+CHUNK_SIZE = 16
+
+NO_PDF_INFO = [0, '', '', '']   # pages, author, creation_date, title - pdf not read
+
 
 def pdf_creation_date(ww):
     if ww:
@@ -47,6 +84,87 @@ def pdf_creation_date(ww):
     return '0001-01-01'
 
 
+def pdf_text(fi, key: str):
+    tt = fi.getText(key)
+    return None if tt is None else str(tt)
+
+
+def extract_info(full_file_name) -> (list, tuple):
+    """
+    Collect info about file, runs in worker process
+    :param full_file_name:
+    :return: (info, timings)
+        info - [size, date] for any file,
+               [size, date, pages, author, creation_date, title] for pdf file
+        timings - tuple of (reader, seconds) used to read pdf file
+    """
+    path_file = Path(full_file_name)
+    if path_file.is_file():
+        st = path_file.stat()
+        info = [st.st_size,
+                datetime.datetime.fromtimestamp(st.st_mtime).date().isoformat()]
+        if path_file.suffix == '.pdf':
+            pdf_info, timings = extract_pdf_info(full_file_name)
+            return info + pdf_info, timings
+        return info, ()
+    return ['', ''], ()
+
+
+def extract_info_key(full_file_name) -> (list, tuple, tuple):
+    """
+    extract_info and InfoCache key of file, runs in worker process
+    :return: (info, timings, key)
+    """
+    return (*extract_info(full_file_name), InfoCache.key(full_file_name))
+
+
+def extract_pdf_info(file_) -> (list, tuple):
+    """
+    Try fast header reader first, PyPDF2 if it fails
+    :return: ([pages, author, creation_date, title], timings)
+    """
+    start = time.perf_counter()
+    try:
+        pages, info = read_pdf_header(file_)
+    except (OSError, PdfHeaderError):
+        pass
+    else:
+        return [pages] + pdf_info_list(info), (
+            (FAST_READER, time.perf_counter() - start),)
+
+    fast_time = time.perf_counter() - start
+    start = time.perf_counter()
+    res = pypdf2_info(file_)
+    return res, ((FAST_READER, fast_time),
+                 (PYPDF2_READER, time.perf_counter() - start))
+
+
+def pypdf2_info(file_) -> list:
+    with (open(file_, "rb")) as pdf_file:
+        try:
+            fr = PyPDF2.PdfFileReader(pdf_file, strict=False)
+            pages = fr.getNumPages()
+            fi = fr.documentInfo     # == getDocumentInfo()
+        except (ValueError, PyPDF2.utils.PdfReadError, PyPDF2.utils.PdfStreamError) as e:
+            print(f"exception {e}")
+            return list(NO_PDF_INFO)
+        if fi is None:
+            return [pages] + pdf_info_list(None)
+        return [pages] + pdf_info_list({key: pdf_text(fi, key) for key in fi.keys()})
+
+
+def pdf_info_list(fi: dict) -> list:
+    """
+    :param fi: document info - {key: text or None}
+    """
+    if fi is not None:
+        if "/CreationDate" in fi.keys():
+            cr_date = pdf_creation_date(fi.get('/CreationDate'))
+            return [fi.get('/Author'), cr_date, fi.get('/Title')]
+        return []
+    return ['', '', '']
+
+
 def ext_translate(ext: str):
     """
     String of file extensions separated by comma
@@ -58,9 +176,88 @@ def ext_translate(ext: str):
     return '*' if '*' in ext_ else ext_
 
 
+class InfoCache:
+    """
+    Persistent cache of pdf file info, the key is content identity:
+    (size, mtime, hash of file head), so copied / moved files are found too.
+    Least recently used rows beyond the limit are evicted.
+    :param conn: connection to DB with InfoCache table
+    :param limit: max number of rows
+    """
+
+    def __init__(self, conn: sqlite3.Connection, limit: int = CACHE_LIMIT):
+        self.conn = conn
+        self.limit = limit
+        self.hits = 0
+        self.misses = 0
+        self.used = []
+        self.now = int(time.time())
+
+    @staticmethod
+    def key(full_file_name) -> tuple:
+        """
+        :return: (size, mtime_ns, hash) for pdf file, None for others
+        """
+        if Path(full_file_name).suffix != '.pdf':
+            return None
+        try:
+            with open(full_file_name, 'rb') as fl:
+                st = os.fstat(fl.fileno())
+                head = fl.read(HASH_SIZE)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns, hashlib.blake2b(
+            head, digest_size=16).hexdigest()
+
+    def lookup(self, full_file_name) -> list:
+        """
+        Head of file is hashed only if cache has info of file
+        with the same size and mtime
+        :return: cached info of file, None if not found
+        """
+        if Path(full_file_name).suffix != '.pdf':
+            return None
+        try:
+            st = os.stat(full_file_name)
+        except OSError:
+            return None
+        if not self.conn.execute(CACHE_HAS, (st.st_size, st.st_mtime_ns)).fetchone()[0]:
+            self.misses += 1
+            return None
+        return self.get(self.key(full_file_name))
+
+    def get(self, key: tuple) -> list:
+        if key is None:
+            return None
+        res = self.conn.execute(CACHE_GET, key).fetchone()
+        if res:
+            self.hits += 1
+            self.used.append((self.now, *key))
+            return json.loads(res[0])
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple, info: list):
+        if key is not None:
+            self.conn.execute(CACHE_PUT, (*key, json.dumps(info), self.now))
+
+    def flush(self):
+        """
+        Save time of usage, evict least recently used rows
+        """
+        self.conn.executemany(CACHE_USED, self.used)
+        self.used.clear()
+        self.conn.execute(CACHE_EVICT, (self.limit,))
+        self.conn.commit()
+
+    def get_stats(self) -> (int, int):
+        return self.hits, self.misses
+
+
 class LFSignal(QObject):
     # LF - LoadFiles
     finished = pyqtSignal(object)
+    rescanned = pyqtSignal(object)
 
 
 class FISignal(QObject):
@@ -68,78 +265,136 @@ class FISignal(QObject):
     finished = pyqtSignal()
 
 
-class LoadFiles(QRunnable):
+class LoadFiles(Job):
     """
     Load files with of extensions from list 'ext_' located under Path 'path_'
-    Run in thread
+    Run in thread by JobScheduler
     :param path_: dir location of collected files (and all subdirs)
     :param ext_: list of extensions
     :param db_name: full name of DB file where to save
+    :param batch_size: number of files saved in one transaction
+    :param rescan: if True only directories changed since previous rescan
+                   are checked, ScanDiff is sent by signal.rescanned
+    :param lock: held while job uses conn - if conn is shared by jobs
     """
 
-    def __init__(self, path_: str, ext_: str, conn: sqlite3.Connection):
-        super(LoadFiles, self).__init__()
+    def __init__(self, path_: str, ext_: str, conn: sqlite3.Connection,
+                 batch_size: int = BATCH_SIZE, rescan: bool = False,
+                 lock=None):
+        super(LoadFiles, self).__init__(SCAN)
         self.conn = conn
+        self.lock = lock or nullcontext()
         self.path_ = path_
         self.ext_ = ext_translate(ext_)
+        self.batch_size = batch_size
+        self.rescan = rescan
         self.signal = LFSignal()   # send set of str(ID) of updated dirs
+        self.load_stats = (0, 0)   # rows written, commits
+
+    def work(self):
+        """
+        Load files using BulkLoadDBData class
+        """
+        with self.lock:
+            if self.rescan:
+                files = RescanDBData(self.conn)
+            else:
+                files = BulkLoadDBData(self.conn, self.batch_size)
+            files.progress = self.step
+            try:
+                if self.rescan:
+                    diff = files.rescan(self.path_, self.ext_)
+                else:
+                    files.load_data(self.path_, self.ext_)
+            except JobCancelled:
+                files.flush()     # files found before are saved
+                raise
+            finally:
+                self.load_stats = files.get_load_stats()
+        if self.rescan:
+            self.signal.rescanned.emit(diff)
+        else:
+            self.signal.finished.emit(files.get_updated_dirs())
 
-    @pyqtSlot()
-    def run(self):
+    def covers(self, job) -> bool:
         """
-        Load files using LoadDBData class
+        scan of the same or parent dir for the same extensions
         """
-        files = LoadDBData(self.conn)
-        files.load_data(self.path_, self.ext_)
-        self.signal.finished.emit(files.get_updated_dirs())
+        if not (isinstance(job, LoadFiles) and job.rescan == self.rescan
+                and job.ext_ == self.ext_):
+            return False
+        root, path_ = Path(self.path_), Path(job.path_)
+        return root == path_ or root in path_.parents
 
 
-class FileInfo(QRunnable):
+class FileInfo(Job):
     """
     Collect data about all files in the updated by LoadFiles dirs
-    Run in thread
+    Run in thread by JobScheduler
     :param updated_dirs: IDs of updated dirs
     :param db_name: full name of DB file
+    :param file_ids: if not None - only these files are updated
+    :param workers: number of processes to extract file info,
+                    None - number of CPUs, 1 - extract in this thread
+    :param batch_size: number of files saved in one transaction
+    :param cache: if True InfoCache is used
+    :param lock: held while job uses conn - if conn is shared by jobs
     """
 
-    @pyqtSlot()
-    def run(self):
-        self.update_files()
+    def work(self):
+        with self.lock:
+            self.update_files()
         self.signal.finished.emit()
 
-    def __init__(self, updated_dirs: set, conn: sqlite3.Connection):
-        super(FileInfo, self).__init__()
+    def __init__(self, updated_dirs: set, conn: sqlite3.Connection,
+                 file_ids: set = None, workers: int = None,
+                 batch_size: int = INFO_BATCH_SIZE, cache: bool = True,
+                 lock=None):
+        super(FileInfo, self).__init__(EXTRACT)
+        self.lock = lock or nullcontext()
         self.upd_dirs = updated_dirs
+        self.file_ids = file_ids
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
         self.conn = conn
         self.cursor = self.conn.cursor()
+        self.cache = InfoCache(conn) if cache else None
         self.file_info = []
+        self.author_ids = None   # Author -> AuthorID, loaded on first use
+        self.file_authors = []   # (FileID, AuthorID) links not saved yet
+        # reader -> [number of pdf files, seconds]
+        self.reader_stats = {FAST_READER: [0, 0.0], PYPDF2_READER: [0, 0.0]}
         self.signal = FISignal()
 
     def insert_authors(self, file_id: int, authors):
         """
-        Save authors name of pdf file
+        Save authors name of pdf file,
+        links are saved in batch by flush_authors
         """
         for author in authors:
             author = author.strip()
             author_id = self.insert_author(file_id, author)
-            self.link_file_author(file_id, author_id)
+            self.file_authors.append((file_id, author_id))
 
     def insert_author(self, file_id: int, author: str):
         """
-        Save author name of pdf file
+        Save author name of pdf file, without commit
         """
-        auth_id = self.cursor.execute(AUTHOR_ID, (author,)).fetchone()
+        if self.author_ids is None:
+            self.author_ids = dict(self.cursor.execute(ALL_AUTHORS))
+        auth_id = self.author_ids.get(author)
         if auth_id:
-            return auth_id[0]
+            return auth_id
         self.cursor.execute(INSERT_AUTHOR, (author,))
-        self.conn.commit()
+        self.author_ids[author] = self.cursor.lastrowid
         return self.cursor.lastrowid
 
-    def link_file_author(self, file_id, author_id):
-        if self.cursor.execute(FILE_AUTHOR_LINKED, (file_id, author_id)).fetchone():
-            return
-        self.cursor.execute(CREATE_FILE_AUTHOR_LINK, (file_id, author_id))
-        self.conn.commit()
+    def flush_authors(self):
+        """
+        Save collected file-author links, without commit
+        """
+        self.cursor.executemany(CREATE_FILE_AUTHOR_LINK, self.file_authors)
+        self.file_authors.clear()
 
     def insert_comment(self, _file):
         if len(self.file_info) > 2:
@@ -151,7 +406,6 @@ class FileInfo(QRunnable):
                 print(f"IndexError: {len(self.file_info)}, must be >= 6")
             else:
                 self.cursor.execute(INSERT_COMMENT, (book_title, ''))
-                self.conn.commit()
                 comm_id = self.cursor.lastrowid
         else:
             comm_id = _file.comment_id
@@ -165,45 +419,27 @@ class FileInfo(QRunnable):
         :param full_file_name:
         :return: None
         """
-        self.file_info.clear()
-        path_file = Path(full_file_name)
-        if path_file.is_file():
-            st = path_file.stat()
-            self.file_info += [st.st_size,
-                               datetime.datetime.fromtimestamp(st.st_mtime).date().isoformat()]
-            if path_file.suffix == '.pdf':
-                self.get_pdf_info(full_file_name)
-        else:
-            self.file_info += ['', '']
+        self.file_info, timings = extract_info(full_file_name)
+        self.add_timings(timings)
 
-    def get_pdf_info(self, file_):
-        with (open(file_, "rb")) as pdf_file:
-            try:
-                fr = PyPDF2.PdfFileReader(pdf_file, strict=False)
-                self.file_info.append(fr.getNumPages())
-                fi = fr.documentInfo     # == getDocumentInfo()
-            except (ValueError, PyPDF2.utils.PdfReadError, PyPDF2.utils.PdfStreamError) as e:
-                print(f"exception {e}")
-                self.file_info += [0, '', '', '']
-            else:
-                self.add_pdf_info(fi)
-
-    def add_pdf_info(self, fi: dict):
-        if fi is not None:
-            if "/CreationDate" in fi.keys():
-                cr_date = pdf_creation_date(fi.getText('/CreationDate'))
-                self.file_info += [fi.getText('/Author'),
-                    cr_date, fi.getText('/Title')]
-        else:
-            self.file_info += ['', '', '']
+    def add_timings(self, timings):
+        """
+        :param timings: tuple of (reader, seconds), the last reader is used
+        """
+        for reader, seconds in timings:
+            self.reader_stats[reader][1] += seconds
+        if timings:
+            self.reader_stats[timings[-1][0]][0] += 1
 
-    def update_file(self, file_):
+    def get_reader_stats(self) -> dict:
+        return self.reader_stats
+
+    def save_file_info(self, file_):
         """
-        Update file info in tables Files, Authors and Comments
+        Save self.file_info of file_ without commit
         :param file_: namedtuple: file_id, full_name, comment_id, issue_date, pages
         :return: None
         """
-        self.get_file_info(file_.full_name)
         if file_.comment_id is None:
             comm_id, pages, issue_date = self.insert_comment(file_)
         else:
@@ -217,7 +453,6 @@ class FileInfo(QRunnable):
                                           'size': self.file_info[0],
                                           'issue_date': issue_date,
                                           'file_id': file_.file_id})
-        self.conn.commit()
         if len(self.file_info) > 3 and self.file_info[3]:
             authors = re.split(r',|;|&|\band\b', self.file_info[3])
             self.insert_authors(file_.file_id, authors)
@@ -227,13 +462,96 @@ class FileInfo(QRunnable):
                                   'file_id full_name comment_id issue_date pages')
         # file_id: int, full_name: str, comment_id: int issue_date: date, pages: int
 
-        # list of dir_id
-        dir_ids = ','.join(self.upd_dirs)
-        file_list = self.cursor.execute(
-            FILES_TO_UPDATE.format(dir_ids)).fetchall()
+        if self.file_ids is None:
+            # list of dir_id
+            dir_ids = json.dumps([int(id_) for id_ in self.upd_dirs])
+            file_list = self.cursor.execute(
+                FILES_TO_UPDATE, (dir_ids,)).fetchall()
+        else:
+            file_ids = json.dumps([int(id_) for id_ in self.file_ids])
+            file_list = self.cursor.execute(
+                FILES_BY_ID, (file_ids,)).fetchall()
         # not iterate all rows in cursor - so used fetchall(), why ???
+        files = []
         for file_descr in file_list:
             file_name = Path(file_descr[2]).joinpath(file_descr[1])
-            file_ = db_file_info._make(
-                (file_descr[0], file_name) + file_descr[-3:])
-            self.update_file(file_)
+            files.append(db_file_info._make(
+                (file_descr[0], file_name) + file_descr[-3:]))
+
+        if self.cache:
+            # keys of files not found in cache are calculated by workers
+            cached = [self.cache.lookup(file_.full_name) for file_ in files]
+            extract = extract_info_key
+        else:
+            cached = [None] * len(files)
+            extract = extract_info
+
+        names = [str(file_.full_name) for file_, info in zip(files, cached)
+                 if info is None]
+        self.total = len(files)
+        try:
+            if self.workers > 1 and len(names) > 1:
+                pool = ProcessPoolExecutor(self.workers)
+                try:
+                    self.save_files(files, self.merge_cached(
+                        cached, pool.map(extract, names, chunksize=CHUNK_SIZE)))
+                finally:
+                    # files not extracted yet are dropped if job is cancelled
+                    pool.shutdown(cancel_futures=True)
+            else:
+                self.save_files(files, self.merge_cached(
+                    cached, map(extract, names)))
+        finally:
+            if self.cache:
+                self.cache.flush()
+
+    def merge_cached(self, cached: list, extracted):
+        """
+        Merge info found in cache with extracted one, save extracted in cache
+        unless pdf file is not read - it is tried again next time
+        :param cached: info from cache or None for all files
+        :param extracted: iterable of (info, timings) for files not in cache,
+                          (info, timings, key) if cache is used
+        :return: generator of (info, timings) for all files
+        """
+        extracted = iter(extracted)
+        for info in cached:
+            if info is not None:
+                yield info, ()
+            else:
+                info, timings, *key = next(extracted)
+                if self.cache and info[2:] != NO_PDF_INFO:
+                    self.cache.put(key[0], info)
+                yield info, timings
+
+    def save_files(self, files: list, infos):
+        """
+        Save info of files: info of a batch of files is collected first,
+        then saved in one short transaction
+        :param files: list of db_file_info
+        :param infos: iterable of file info in the same order as files
+        """
+        batch = []
+        try:
+            for file_, info in zip(files, infos):
+                batch.append((file_, info))
+                if len(batch) == self.batch_size:
+                    self.save_batch(batch)
+                self.step()
+        finally:
+            # info of extracted files is kept if job is cancelled
+            self.save_batch(batch)
+
+    def save_batch(self, batch: list):
+        """
+        Save info of files in batch and commit, batch is cleared
+        :param batch: list of (db_file_info, (info, timings))
+        """
+        items = batch[:]
+        batch.clear()
+        for file_, (info, timings) in items:
+            self.file_info = info
+            self.add_timings(timings)
+            self.save_file_info(file_)
+        self.flush_authors()
+        self.conn.commit()
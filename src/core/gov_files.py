@@ -1,14 +1,12 @@
 # gov_files.py
 
 import os
-import re
-import sqlite3
 import webbrowser
 from collections import namedtuple
 
 from PyQt5.QtCore import (Qt, QModelIndex, QItemSelectionModel,
                           QSettings, QDate, QDateTime, QItemSelection, QVariant,
-                          QThreadPool, QPersistentModelIndex,
+                          QPersistentModelIndex,
                           )
 from PyQt5.QtWidgets import (QInputDialog, QLineEdit, QFileDialog,
                              QLabel, QFontDialog, QApplication, QAbstractItemView,
@@ -20,6 +18,7 @@ from .table_model import TableModel, ProxyModel2
 from .tree_model import TreeModel
 from .edit_tree_model import EditTreeModel, EditTreeItem
 from .file_info import FileInfo, LoadFiles
+from src.core.jobs import JobScheduler, TagScanJob, CleanupJob, SCAN, DONE, CANCELLED
 from .helper import Fields, open_file_or_folder
 from .load_db_data import LoadDBData
 from .input_date import DateInputDialog
@@ -33,21 +32,7 @@ FileData = namedtuple("FileData", "file_id dir_id comment_id ext_id source")
 # file_id: int, dir_id: int, comment_id: int, ext_id: int,
 # source: int - one of the FOLDER, VIRTUAL, ADVANCE constants
 FOLDER, VIRTUAL, ADVANCE = (1, 2, 4)
-
-
-def insert_virt_dirs(dir_tree: list):
-    virt_dirs = ut.select_other("VIRT_DIRS", ())
-    id_list = [x[1] for x in dir_tree]
-
-    for vd in virt_dirs:
-        if vd[-1] == 1:
-            vd = (*vd[:-1], 2)
-        try:
-            idx = id_list.index(vd[2])
-            dir_tree.insert(idx, (os.path.split(vd[0])[1], *vd[1:], vd[0]))
-            id_list.insert(idx, vd[1])
-        except ValueError:
-            print('gov_files.insert_virt_dirs: ValueError')
+LAZY_TREE_DIRS = 20000    # bigger dir tree is loaded on expanding of dirs
 
 
 def persistent_row_indexes(view_: QAbstractItemView) -> list:
@@ -116,19 +101,6 @@ def full_tree_path(index: QModelIndex) -> list:
     return path
 
 
-def get_dirs():
-    """
-    Returns directory tree
-    :return: list of tuples (Dir name, DirID, ParentID, FolderType, Full path of dir)
-    """
-    dirs = []
-    dir_tree = ut.dir_tree_select(dir_id=0, level=0)
-
-    for rr in dir_tree:
-        dirs.append((os.path.split(rr[0])[1], *rr[1: len(rr) - 1], rr[0]))
-    return dirs
-
-
 def _exist_in_virt_dirs(dir_id: int, parent_id: int):
     return ut.select_other("EXIST_IN_VIRT_DIRS", (dir_id, parent_id)).fetchone()
 
@@ -146,12 +118,13 @@ def collect_all_ext(ids):
 
 
 def _delete_from_db(file_ids):
-    ut.delete_other("VIRT_ALL", (file_ids[0],))
-    ut.delete_other("AUTHOR_FILE_BY_FILE", (file_ids[0],))
-    ut.delete_other("TAG_FILE_BY_FILE", (file_ids[0],))
-    ut.delete_other("FILE", (file_ids[0],))
-    # when file for this comment not exist in DB
-    ut.delete_other2("COMMENT", (file_ids[2], file_ids[2]))
+    with ut.unit_of_work():
+        ut.delete_other("VIRT_ALL", (file_ids[0],))
+        ut.delete_other("AUTHOR_FILE_BY_FILE", (file_ids[0],))
+        ut.delete_other("TAG_FILE_BY_FILE", (file_ids[0],))
+        ut.delete_other("FILE", (file_ids[0],))
+        # when file for this comment not exist in DB
+        ut.delete_other("COMMENT", {"comment_id": file_ids[2]})
 
 
 class FilesCrt:
@@ -164,7 +137,7 @@ class FilesCrt:
         self.ui.statusbar.addPermanentWidget(self.status_label)
 
         self.fields: Fields = Fields._make(((), (), ()))
-        self.thread_pool = QThreadPool()
+        self.jobs = JobScheduler()
         self.file_list_source = FOLDER
         self._opt = SelOpt(self)
         self._restore_font()
@@ -247,8 +220,9 @@ class FilesCrt:
             ut.delete_other("FROM_VIRT_DIRS", (parent_id, dir_id))
             self.ui.dirTree.model().remove_row(cur_idx)
         else:
-            ut.delete_other("VIRT_FROM_DIRS", (dir_id,))
-            ut.delete_other("VIRT_DIR_ID", (dir_id,))
+            with ut.unit_of_work():
+                ut.delete_other("VIRT_FROM_DIRS", (dir_id,))
+                ut.delete_other("VIRT_DIR_ID", (dir_id,))
             self.ui.dirTree.model().remove_all_copies(cur_idx)
 
     def _rename_folder(self):
@@ -307,17 +281,18 @@ class FilesCrt:
 
         try:
             shutil.copy2(file_.name_with_path, to_path)
-            file_id = ut.select_other2(
-                "FILE_IN_DIR", (dir_id, file_.name)).fetchone()
-            if file_id:
-                new_file_id = file_id[0]
-            else:
-                new_file_id = ut.insert_other2(
-                    "COPY_FILE", (dir_id, file_.user_data[0])
-                )
+            with ut.unit_of_work():
+                file_id = ut.select_other(
+                    "FILE_IN_DIR", (dir_id, file_.name)).fetchone()
+                if file_id:
+                    new_file_id = file_id[0]
+                else:
+                    new_file_id = ut.insert_other(
+                        "COPY_FILE", (dir_id, file_.user_data[0])
+                    )
 
-            ut.insert_other2("COPY_TAGS", (new_file_id, file_.user_data[0]))
-            ut.insert_other2("COPY_AUTHORS", (new_file_id, file_.user_data[0]))
+                ut.insert_other("COPY_TAGS", (new_file_id, file_.user_data[0]))
+                ut.insert_other("COPY_AUTHORS", (new_file_id, file_.user_data[0]))
         except IOError:
             self.app_window.show_message(
                 'Can\'t copy file "{}" into folder "{}"'.format(
@@ -330,7 +305,7 @@ class FilesCrt:
         :@param to_path:  target directory
         :@return: (DirId: int, isNewDirID: bool) ID of target directory
         """
-        ld = LoadDBData(ut.DB_setting["Conn"])
+        ld = LoadDBData(ut.get_connection())
         return ld.insert_dir(to_path)
 
     def _copy_files(self):
@@ -348,8 +323,7 @@ class FilesCrt:
     def copy_files_to(self, to_path: str) -> bool:
         dir_id, is_new_dir_id = self._get_dir_id(to_path)
         if dir_id > 0:
-            selected_files = self._selected_files()
-            for file in selected_files:
+            for file in self._selected_files():
                 self._copy_file_to(dir_id, to_path, file)
         return is_new_dir_id
 
@@ -361,10 +335,14 @@ class FilesCrt:
         except FileNotFoundError:
             self.app_window.show_message(
                 'File "{}" not found'.format(file_[1]))
+        except OSError:
+            self.app_window.show_message(
+                'Can\'t remove file "{}"'.format(file_[1]), 5000)
 
     def _remove_files(self):
-        selected_files = self._selected_files()
-        for file in selected_files:
+        # one unit of work per file: files already removed from disk
+        # are removed from DB even if next one fails
+        for file in self._selected_files():
             self._remove_file(file)
 
     def _move_files(self):
@@ -378,8 +356,7 @@ class FilesCrt:
     def move_files_to(self, to_path):
         dir_id, is_new_id = self._get_dir_id(to_path)
         if dir_id > 0:
-            selected_files = self._selected_files()
-            for file in selected_files:
+            for file in self._selected_files():
                 self._move_file_to(dir_id, to_path, file)
         return is_new_id
 
@@ -450,6 +427,7 @@ class FilesCrt:
         """
         data_methods = {
             "Author Remove unused": self._author_remove_unused,
+            "Cancel jobs": self._cancel_jobs,
             "change_font": self._ask_for_change_font,
             "Dirs Create virtual folder as child": self._create_virtual_child,
             "Dirs Create virtual folder": self._create_virtual,
@@ -475,6 +453,7 @@ class FilesCrt:
             "File Open": self._open_file,
             "File Rename file": self._rename_file,
             "File_doubleClicked": self._double_click_file,
+            "Quick search": self._quick_search,
             "Resize columns": self._resize_columns,
             "Select files": self._list_selected_files,
             "Selection options": self._selection_options,
@@ -505,31 +484,47 @@ class FilesCrt:
         ext_idx = selected_db_indexes(self.ui.extList)
         all_id = collect_all_ext(ext_idx)
 
-        sel_tag = self.get_selected_tags()
-        for tag in sel_tag:
-            files = ut.select_other2(
-                "FILE_INFO", (",".join([str(i) for i in all_id]), tag[1])
-            ).fetchall()
-            for file in files:
-                if re.search(tag[0], file[0], re.IGNORECASE):
-                    try:
-                        ut.insert_other("TAG_FILE", (tag[1], file[1]))
-                    except sqlite3.IntegrityError:
-                        print('FilesCtr._scan_for_tags: sqlite3.IntegrityError')
+        job = TagScanJob(self.get_selected_tags(), all_id)
+        job.job_signal.done.connect(self._scan_for_tags_finish)
+        self._run_job(job)
+
+    def _scan_for_tags_finish(self, job: TagScanJob):
+        if job.state == DONE:
+            self.app_window.show_message("Files found: {}".format(
+                ", ".join(f"{tag} {job.found[tag_id]}" for tag, tag_id in job.tags)),
+                5000)
 
     def get_selected_tags(self):
+        """
+        :return: list of (tag, TagID) selected in tagsList
+        """
         idxs = self.ui.tagsList.selectedIndexes()
         t_ids = []
         tag_s = []
-        rb = r"\b"
         if idxs:
             model = self.ui.tagsList.model()
             for i in idxs:
                 t_ids.append(model.data(i, Qt.UserRole))
-                tag_s.append(rb + model.data(i, Qt.DisplayRole) + rb)
+                tag_s.append(model.data(i, Qt.DisplayRole))
             return list(zip(tag_s, t_ids))
         return []
 
+    def _quick_search(self):
+        """
+        Show files found by words typed in search box
+        """
+        if ut.has_search() and ut.select_other("SEARCH_QUEUE").fetchone()[0]:
+            # files indexed already are found now, the rest after update
+            self._run_job(CleanupJob())
+        curs = ut.quick_search(self.ui.searchEdit.text())
+        if not curs:
+            return
+        self.show_files(curs, -1)
+        self.file_list_source = ADVANCE
+        if self.ui.filesList.model().rowCount() == 0:
+            self.app_window.show_message(
+                "Nothing found. Change your choice.", 5000)
+
     def _ask_for_change_font(self):
         self.app_font, ok_ = QFontDialog.getFont(
             self.ui.dirTree.font(), self.ui.dirTree
@@ -591,17 +586,50 @@ class FilesCrt:
 
                 self._populate_ext_list()
 
-    def _dir_update(self, updated_dirs) -> None:
+    def _dir_update(self, updated_dirs, file_ids=None) -> None:
         self._populate_directory_tree()
         self._populate_ext_list()
 
-        files_ = FileInfo(
-            updated_dirs, ut.create_connection(ut.DB_setting["Path"]))
+        conn, lock = ut.DB_setting["Pool"].writer()
+        files_ = FileInfo(updated_dirs, conn, file_ids, lock=lock)
         files_.signal.finished.connect(self._dir_update_finish)
-        self.thread_pool.start(files_)
+        self._run_job(files_)
+
+    def _rescan_update(self, diff) -> None:
+        """
+        Update info only for files added / modified since previous rescan
+        :@param diff: ScanDiff - sets of added, removed, modified file IDs
+        """
+        self.app_window.show_message(
+            "Rescan: {} added, {} removed, {} modified files".format(
+                len(diff.added), len(diff.removed), len(diff.modified)), 5000)
+        changed = diff.added | diff.modified
+        if changed:
+            self._dir_update(set(), changed)
 
     def _dir_update_finish(self):
         self.app_window.show_message("Updating of files is finished.", 5000)
+        # full-text index is updated with loaded files in background
+        self._run_job(CleanupJob())
+
+    def _run_job(self, job):
+        job.job_signal.progress.connect(self._job_progress)
+        job.job_signal.done.connect(self._job_done)
+        self.jobs.submit(job)
+
+    def _job_progress(self, job):
+        self.app_window.show_message(job.message())
+
+    def _job_done(self, job):
+        if job.state != DONE:
+            self.app_window.show_message(f"{job.kind}: {job.state}", 5000)
+        if job.kind == SCAN and job.state == CANCELLED:
+            # files found before cancel are saved
+            self._populate_directory_tree()
+            self._populate_ext_list()
+
+    def _cancel_jobs(self):
+        self.jobs.cancel_all()
 
     def _populate_virtual(self, dir_id) -> None:
         """
@@ -618,10 +646,8 @@ class FilesCrt:
             self.status_label.setText("No files in folder")
 
     def files_virtual_folder(self, dir_id):
-        files = ut.select_other("FILES_VIRT", (dir_id,)).fetchall()
-
-        if files:
-            self.show_files(files, dir_id)
+        if ut.select_other("FILES_VIRT_COUNT", (dir_id,)).fetchone()[0]:
+            self.show_files(ut.select_other("FILES_VIRT", (dir_id,)), dir_id)
             return True
         return False
 
@@ -781,24 +807,26 @@ class FilesCrt:
             self._populate_comment_field(u_data, edit=True)
 
     def _del_item_links(self, items2del, file_id, sqls):
-        for item in items2del:
-            ut.delete_other(sqls[0], (item, file_id))
-            res = ut.select_other(sqls[1], (item,)).fetchone()
-            if not res:
-                ut.delete_other(sqls[2], (item,))
+        with ut.unit_of_work():
+            for item in items2del:
+                ut.delete_other(sqls[0], (item, file_id))
+                res = ut.select_other(sqls[1], (item,)).fetchone()
+                if not res:
+                    ut.delete_other(sqls[2], (item,))
 
     def _add_item_links(self, items2add, file_id, sqls):
-        add_ids = ut.select_other2(
-            sqls[0], ('","'.join(items2add),)).fetchall()
+        add_ids = ut.select_other(
+            sqls[0], (ut.in_list(items2add),)).fetchall()
         sel_items = [item[0] for item in add_ids]
         not_in_ids = [item for item in items2add if not item in sel_items]
 
-        for item in not_in_ids:
-            item_id = ut.insert_other(sqls[1], (item,))
-            ut.insert_other(sqls[2], (item_id, file_id))
+        with ut.unit_of_work():
+            for item in not_in_ids:
+                item_id = ut.insert_other(sqls[1], (item,))
+                ut.insert_other(sqls[2], (item_id, file_id))
 
-        for item in add_ids:
-            ut.insert_other(sqls[2], (item[1], file_id))
+            for item in add_ids:
+                ut.insert_other(sqls[2], (item[1], file_id))
 
     def _edit_authors(self):
         """
@@ -858,8 +886,9 @@ class FilesCrt:
             user_data[:3] + (comment if comment else ("", "")))
         if not comment:
             comment = ("", "")
-            comment_id = ut.insert_other("COMMENT", comment)
-            ut.update_other("FILE_COMMENT", (comment_id, res.file_id))
+            with ut.unit_of_work():
+                comment_id = ut.insert_other("COMMENT", comment)
+                ut.update_other("FILE_COMMENT", (comment_id, res.file_id))
             user_data = user_data._replace(comment_id=comment_id)
             self.ui.filesList.model().update(curr_idx, user_data, Qt.UserRole)
             res = res._replace(
@@ -897,6 +926,8 @@ class FilesCrt:
         else:  # ADVANCE
             self._list_selected_files()
 
+        # saved row may be not fetched yet
+        self.ui.filesList.model().sourceModel().fetch_rows(int(row) + 1)
         if self.ui.filesList.model().rowCount() == 0:
             idx = QModelIndex()
         else:
@@ -1062,11 +1093,8 @@ class FilesCrt:
             files = ut.select_other("FILES_CURR_DIR", (dir_idx[0],))
             self.show_files(files, 0)
 
-            self.status_label.setText(
-                "{} ({})".format(
-                    dir_idx[-1], self.ui.filesList.model().rowCount(QModelIndex())
-                )
-            )
+            count = ut.select_other("FILES_CURR_DIR_COUNT", (dir_idx[0],)).fetchone()[0]
+            self.status_label.setText("{} ({})".format(dir_idx[-1], count))
         else:
             self.status_label.setText("No data")
 
@@ -1080,18 +1108,19 @@ class FilesCrt:
 
     def show_files(self, files, source):
         """
-        populate file's model
-        :@param files
+        populate file's model, files are fetched when view needs them
+        :@param files - cursor or list of files
         :@param source -  0 - if file from real folder,
                          -1 - if custom list of files
                          >0 - it is dir_id of virtual folder
         """
         idx = getattr(self.fields, "indexes")
         model = self._set_file_model()
-        s_model = model.sourceModel()
-        for ff in files:
-            ff1 = [ff[i] for i in idx]
-            s_model.append_row(tuple(ff1), FileData(*ff[-4:], source))
+
+        def file_row(ff):
+            return [ff[i] for i in idx], FileData(*ff[-4:], source)
+
+        model.sourceModel().set_source(files, file_row)
 
         self.ui.filesList.selectionModel().currentRowChanged.connect(
             self._cur_file_changed
@@ -1193,13 +1222,12 @@ class FilesCrt:
         When open another DB the current dir is the first dir
         and current file is first file in this dir.
         """
-        dirs = get_dirs()
-        insert_virt_dirs(dirs)
-
-        model = EditTreeModel(parent=self)
+        lazy = ut.select_other("DIR_COUNT").fetchone()[0] > LAZY_TREE_DIRS
+        model = EditTreeModel(parent=self, lazy=lazy)
         model.set_alt_font(self.app_font)
 
-        model.set_model_data(dirs)
+        if not lazy:
+            model.set_model_data(ut.select_other("DIRS"), ut.select_other("VIRT_LINKS"))
 
         model.setHeaderData(0, Qt.Horizontal, ("Directories",))
         self.ui.dirTree.setModel(model)
@@ -1242,6 +1270,8 @@ class FilesCrt:
                 if parent.isValid():
                     if not self.ui.dirTree.isExpanded(parent):
                         self.ui.dirTree.setExpanded(parent, True)
+                if model.canFetchMore(parent):
+                    model.fetchMore(parent)
                 idx = model.index(int(id_), 0, parent)
                 self.ui.dirTree.setCurrentIndex(idx)
                 parent = idx
@@ -1276,7 +1306,7 @@ class FilesCrt:
             ext_,
         )
         if ok_pressed:
-            self._load_files(dir_.path, ext_item.strip())
+            self._load_files(dir_.path, ext_item.strip(), rescan=True)
 
     def on_scan_files(self) -> None:
         """
@@ -1287,11 +1317,12 @@ class FilesCrt:
         path_, ext_ = self._scan_file_system()
         self._load_files(path_, ext_)
 
-    def _load_files(self, path_: str, ext_):
-        load_ = LoadFiles(
-            path_, ext_, ut.create_connection(ut.DB_setting["Path"]))
+    def _load_files(self, path_: str, ext_, rescan=False):
+        conn, lock = ut.DB_setting["Pool"].writer()
+        load_ = LoadFiles(path_, ext_, conn, rescan=rescan, lock=lock)
         load_.signal.finished.connect(self._dir_update)
-        self.thread_pool.start(load_)
+        load_.signal.rescanned.connect(self._rescan_update)
+        self._run_job(load_)
 
     def _scan_file_system(self) -> (str, str):
         """
@@ -0,0 +1,254 @@
+# jobs.py
+
+import threading
+import time
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+import src.core.utilities as ut
+
+# kinds of jobs
+SCAN, EXTRACT, TAG_SCAN, CLEANUP = ('scan', 'extract', 'tag scan', 'cleanup')
+
+# queued job with higher priority is started first
+PRIORITY = {TAG_SCAN: 3, SCAN: 2, EXTRACT: 1, CLEANUP: 0}
+
+# states of job
+PENDING, RUNNING, DONE, CANCELLED, FAILED, COALESCED = (
+    'pending', 'running', 'done', 'cancelled', 'failed', 'coalesced')
+
+PROGRESS_INTERVAL = 0.5     # min seconds between progress signals of job
+JOB_THREADS = 1             # jobs write into DB, so they run one by one
+
+
+class JobCancelled(Exception):
+    """
+    Raised by Job.step if job is cancelled
+    """
+
+
+class JobSignal(QObject):
+    progress = pyqtSignal(object)   # job
+    done = pyqtSignal(object)       # job, its state is one of final states
+
+
+class Job(QRunnable):
+    """
+    Background job run by JobScheduler.
+    Subclass implements work() and calls step() for processed items:
+    step counts them, sends progress and stops cancelled job
+    """
+
+    def __init__(self, kind: str, priority: int = None):
+        """
+        :param kind: one of SCAN, EXTRACT, TAG_SCAN, CLEANUP
+        :param priority: None - PRIORITY of kind
+        """
+        super(Job, self).__init__()
+        self.setAutoDelete(False)   # job is used after it is finished
+        self.kind = kind
+        self.priority = PRIORITY[kind] if priority is None else priority
+        self.state = PENDING
+        self.count = 0          # items processed
+        self.total = 0          # items to process, 0 - unknown
+        self.started = None
+        self.seconds = 0.0
+        self.error = None
+        self.job_signal = JobSignal()
+        self._cancel = threading.Event()
+        self._reported = 0.0
+
+    def work(self):
+        raise NotImplementedError
+
+    def covers(self, job) -> bool:
+        """
+        :return: True if this job does all work of job
+        """
+        return False
+
+    def run(self):
+        if self._cancel.is_set():
+            self.state = CANCELLED
+        else:
+            self.state = RUNNING
+            self.started = time.perf_counter()
+            try:
+                self.work()
+            except JobCancelled:
+                self.state = CANCELLED
+            except Exception as err:
+                self.state = FAILED
+                self.error = err
+                print('jobs.Job.run', self.kind)
+                print(err)
+            else:
+                self.state = DONE
+            self.seconds = time.perf_counter() - self.started
+        self.job_signal.done.emit(self)
+
+    def cancel(self):
+        """
+        Job is stopped by next call of step
+        """
+        self._cancel.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def step(self, count: int = 1):
+        """
+        Count processed items, progress is sent not often
+        than once in PROGRESS_INTERVAL
+        :raise JobCancelled: if job is cancelled
+        """
+        self.count += count
+        if self._cancel.is_set():
+            raise JobCancelled
+        now = time.perf_counter()
+        if now - self._reported >= PROGRESS_INTERVAL:
+            self._reported = now
+            self.job_signal.progress.emit(self)
+
+    def rate(self) -> float:
+        """
+        :return: items processed per second
+        """
+        if self.started is None:
+            return 0.0
+        elapsed = (self.seconds if self.state != RUNNING
+                   else time.perf_counter() - self.started)
+        return self.count / elapsed if elapsed else 0.0
+
+    def eta(self):
+        """
+        :return: seconds to finish, None if unknown
+        """
+        rate = self.rate()
+        if not (self.total and rate):
+            return None
+        return max(self.total - self.count, 0) / rate
+
+    def message(self) -> str:
+        """
+        :return: progress of job as text for status bar
+        """
+        text = f'{self.kind}: {self.count}'
+        if self.total:
+            text += f' of {self.total}'
+        text += f' files, {self.rate():.0f} files/s'
+        eta = self.eta()
+        if eta is not None:
+            text += f', {eta:.0f} s left'
+        return text
+
+
+class TagScanJob(Job):
+    """
+    Assign tags to files which have tag in file name, title or comment
+    :param tags: list of (tag, TagID)
+    :param ext_ids: IDs of extensions of files to scan
+    """
+
+    def __init__(self, tags: list, ext_ids):
+        super(TagScanJob, self).__init__(TAG_SCAN)
+        self.tags = tags
+        self.ext_ids = ext_ids
+        self.found = {}     # TagID -> number of files
+        self.speed = 0.0    # rows matched per second
+
+    def work(self):
+        self.found, self.speed = ut.scan_tags(self.tags, self.ext_ids, self.step)
+
+
+class CleanupJob(Job):
+    """
+    Run Delete statements without parameters, e.g. 'EMPTY_DIRS',
+    and update full-text index with changed files
+    :param deletes: names of statements in utilities.Delete
+    """
+
+    def __init__(self, deletes=()):
+        super(CleanupJob, self).__init__(CLEANUP)
+        self.deletes = tuple(deletes)
+
+    def work(self):
+        for sql in self.deletes:
+            self.step(0)
+            with ut.unit_of_work(writer=True):
+                ut.delete_other(sql, ())
+        if ut.has_search():
+            self.step(ut.sync_search())
+
+    def covers(self, job) -> bool:
+        return isinstance(job, CleanupJob) and set(job.deletes) <= set(self.deletes)
+
+
+class JobScheduler(QObject):
+    """
+    Run jobs in thread pool, queued jobs are started by priority.
+    A job covered by pending job, e.g. scan of sub-dir of
+    dir to scan, is not run; pending jobs covered by new job are
+    taken from queue. Such jobs are finished with state COALESCED
+    """
+    started = pyqtSignal(object)    # job submitted to run
+
+    def __init__(self, parent=None, threads: int = JOB_THREADS):
+        super(JobScheduler, self).__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(threads)
+        self.jobs = []      # pending and running jobs
+
+    def submit(self, job: Job) -> Job:
+        """
+        :return: job which will do the work: job itself or
+                 submitted before one which covers it
+        """
+        for old in self.jobs:
+            # running job may have passed the part of work the new one needs;
+            # taken from queue, old job surely has not started yet
+            if old.state == PENDING and old.covers(job) and self.pool.tryTake(old):
+                self.pool.start(old, old.priority)
+                self._coalesce(job)
+                return old
+
+        for old in self.jobs[:]:
+            if old.state == PENDING and job.covers(old) and self.pool.tryTake(old):
+                self.jobs.remove(old)
+                self._coalesce(old)
+
+        job.job_signal.done.connect(self._finished)
+        self.jobs.append(job)
+        self.pool.start(job, job.priority)
+        self.started.emit(job)
+        return job
+
+    @staticmethod
+    def _coalesce(job: Job):
+        job.state = COALESCED
+        job.job_signal.done.emit(job)
+
+    def _finished(self, job: Job):
+        if job in self.jobs:
+            self.jobs.remove(job)
+
+    def cancel(self, job: Job):
+        """
+        Pending job is taken from queue, running one is stopped by itself
+        """
+        job.cancel()
+        if job in self.jobs and self.pool.tryTake(job):
+            self.jobs.remove(job)
+            job.state = CANCELLED
+            job.job_signal.done.emit(job)
+
+    def cancel_all(self):
+        for job in self.jobs[:]:
+            self.cancel(job)
+
+    def wait(self, msecs: int = -1) -> bool:
+        """
+        Wait until all jobs are finished
+        :return: False if timed out
+        """
+        return self.pool.waitForDone(msecs)
@@ -1,15 +1,21 @@
 # load_db_data.py
 
-from typing import Set
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import os
 import pathlib
+import queue
+import threading
+from typing import Set
 
 
-FIND_PART_PATH = 'select ParentID from Dirs where Path like :newPath;'
-
 FIND_EXACT_PATH = 'select DirID from Dirs where Path = :newPath;'
 
-CHANGE_PARENT_ID = ('update Dirs set ParentID = :newId where ParentID = :currId'
-                    ' and Path like :newPath and DirID != :newId;'
+# children of new dir are among children of its parent
+CHANGE_PARENT_ID = ('update Dirs set ParentID = :newId where ParentID = '
+                    '(select ParentID from Dirs where DirID = :newId)'
+                    ' and substr(Path, 1, length(:newPath)) = :newPath;'
                     )
 
 FIND_FILE = 'select * from Files where DirID = :dir_id and FileName = :file;'
@@ -22,24 +28,125 @@ FIND_EXT = 'select ExtID from Extensions where Extension = ?;'
 
 INSERT_EXT = 'insert into Extensions (Extension, GroupID) values (:ext, 0);'
 
+ALL_EXT = 'select Extension, ExtID from Extensions;'
+
+ALL_DIRS = 'select Path, DirID from Dirs where Path is not null order by DirID;'
+
+FILES_IN_DIR = 'select FileName from Files where DirID = ?;'
+
+INSERT_FILES = ('insert into Files (DirID, FileName, ExtID, Size, FileDate) '
+                'values (?, ?, ?, ?, ?);')
+
+SNAPSHOTS = ('select Path, MTime, Entries, Ext from DirSnapshot '
+             'where Path = :path or substr(Path, 1, length(:sub)) = :sub;')
+
+SAVE_SNAPSHOT = ('insert or replace into DirSnapshot (Path, MTime, Entries, Ext) '
+                 'values (?, ?, ?, ?);')
+
+DELETE_SNAPSHOT = 'delete from DirSnapshot where Path = ?;'
+
+DIR_FILES = 'select FileID, FileName, Size, FileDate from Files where DirID = ?;'
+
+BATCH_SIZE = 10000
+
+WALK_WORKERS = 4
+
+WALK_QUEUE_SIZE = 1000
+
+FileEntry = namedtuple('FileEntry', 'dir name size mtime')
+# dir: str, name: str, size: int, mtime: float
 
-def yield_files(root: str, ext: str):
+ScanDiff = namedtuple('ScanDiff', 'added removed modified')
+# added, removed, modified: Set[int] - FileIDs
+
+
+def file_ext(name: str) -> str:
+    return os.path.splitext(name)[1].strip('.')
+
+
+def ext_match(name: str, ext) -> bool:
+    """
+    :param name: file name
+    :param ext: '*' or tuple of extensions without dot, see ext_translate
+    """
+    return '*' in ext or file_ext(name) in ext
+
+
+def scan_files(root: str, ext, workers: int = WALK_WORKERS,
+               queue_size: int = WALK_QUEUE_SIZE):
+    """
+    generator of files under root directory,
+    subdirectories are scanned in parallel by thread pool
+    :param root: root directory
+    :param ext: '*' or tuple of extensions without dot, see ext_translate
+    :param workers: number of threads
+    :param queue_size: max number of found but not consumed files
+    :return: generator of FileEntry
+    """
+    entries = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    lock = threading.Lock()
+    pending = [1]      # number of submitted but not scanned dirs
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                entries.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def scan_dir(pool, path_):
+        try:
+            with os.scandir(path_) as it:
+                for entry in it:
+                    if stop.is_set():
+                        return
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            with lock:
+                                pending[0] += 1
+                            pool.submit(scan_dir, pool, entry.path)
+                        elif entry.is_file() and ext_match(entry.name, ext):
+                            st = entry.stat()
+                            put(FileEntry(path_, entry.name,
+                                          st.st_size, st.st_mtime))
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        finally:
+            with lock:
+                pending[0] -= 1
+                done = pending[0] == 0
+            if done:
+                put(None)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pool.submit(scan_dir, pool, os.fspath(root))
+        try:
+            while True:
+                item = entries.get()
+                if item is None:
+                    break
+                yield item
+        finally:
+            stop.set()
+
+
+def yield_files(root: str, ext):
     """
     generator of file list
     :param root: root directory
-    :param ext: list of extensions as comma separated string
-    :return: generator
+    :param ext: '*' or tuple of extensions without dot, see ext_translate
+    :return: generator of pathlib.Path
     """
-    r_path = pathlib.Path(root)
-    for filename in r_path.rglob('*'):
-        if not filename.is_file():
-            continue
-        elif '*' in ext:
-            yield filename
-        elif filename.suffix.strip('.') in ext:
-            yield filename
-        else:
-            continue
+    for entry in scan_files(root, ext):
+        yield pathlib.Path(entry.dir, entry.name)
+
+
+def iso_date(mtime: float) -> str:
+    return datetime.datetime.fromtimestamp(mtime).date().isoformat()
 
 
 class LoadDBData:
@@ -55,16 +162,46 @@ class LoadDBData:
         self.conn = conn
         self.cursor = self.conn.cursor()
         self.updated_dirs: Set[str] = set()
+        self.rows_written = 0
+        self.commits = 0
+        # True - commit is delayed up to the end of batch
+        self.defer_commit = False
+        # str(path) -> DirID, None - Dirs table is queried directly
+        self.dir_index = None
+        # callable(count) - called for files seen, may raise to stop loading
+        self.progress = None
 
     def get_updated_dirs(self) -> Set[str]:
         return self.updated_dirs
 
+    def get_load_stats(self) -> (int, int):
+        """
+        :return: (number of inserted rows, number of commits)
+        """
+        return self.rows_written, self.commits
+
+    def load_dir_index(self):
+        """
+        Load path -> DirID index from Dirs table,
+        used by search_closest_parent instead of SQL queries
+        """
+        self.dir_index = {}
+        for path_, idx in self.cursor.execute(ALL_DIRS):
+            self.dir_index.setdefault(path_, idx)
+
+    def commit(self, force=False):
+        if force or not self.defer_commit:
+            self.conn.commit()
+            self.commits += 1
+
     def load_data(self, path_, ext_):
         """
         Load data in data base
-        :param data: - iterable lines of file names with full path
+        :param path_: root directory
+        :param ext_: extensions, see scan_files
         :return: None
         """
+        self.load_dir_index()
         files = yield_files(path_, ext_)
         for line in files:
             file = pathlib.Path(line)
@@ -73,7 +210,7 @@ class LoadDBData:
             if idx > 0:
                 self.updated_dirs.add(str(idx))
                 self.insert_file(idx, file)
-        self.conn.commit()
+        self.commit(force=True)
 
     def insert_file(self, dir_id: int, full_file_name: pathlib.Path):
         """
@@ -90,6 +227,7 @@ class LoadDBData:
             self.cursor.execute(INSERT_FILE, {'dir_id': dir_id,
                                               'file': file_,
                                               'ext_id': ext_id})
+            self.rows_written += 1
 
     def insert_extension(self, file: pathlib.Path) -> int:
         """
@@ -104,7 +242,8 @@ class LoadDBData:
 
         self.cursor.execute(INSERT_EXT, {'ext': ext})
         idx = self.cursor.lastrowid
-        self.conn.commit()
+        self.rows_written += 1
+        self.commit()
         return idx
 
     def insert_dir(self, new_path: pathlib.PurePath) -> (int, bool):
@@ -119,9 +258,12 @@ class LoadDBData:
 
         self.cursor.execute(INSERT_DIR, {'path': str(new_path), 'id': idx})
         idx = self.cursor.lastrowid
+        self.rows_written += 1
+        if self.dir_index is not None:
+            self.dir_index[str(new_path)] = idx
 
         self.change_parent(idx, new_path)
-        self.conn.commit()
+        self.commit()
         return idx, True
 
     def change_parent(self, new_parent_id: int, path: pathlib.PurePath):
@@ -130,25 +272,8 @@ class LoadDBData:
         :param new_parent_id: id of new dir
         :param path: path of new dir
         """
-        old_parent_id = self.find_old_parent_id(path)
-        if old_parent_id != -1:
-            self.cursor.execute(CHANGE_PARENT_ID, {'currId': old_parent_id,
-                                                   'newId': new_parent_id,
-                                                   'newPath': str(path) + '%'})
-
-    def find_old_parent_id(self, path: pathlib.PurePath) -> int:
-        """
-        Check whether the new dir path is between two others already saved in DB
-        these two dirs form a parent-child pair
-        :param path:
-        :return: current parent Id of first found child, -1 if no children
-        """
-        item = self.cursor.execute(
-            FIND_PART_PATH, {'newPath': str(path) + '%'}).fetchone()
-        if item:
-            return item[0]
-
-        return -1
+        self.cursor.execute(CHANGE_PARENT_ID, {'newId': new_parent_id,
+                                               'newPath': os.path.join(path, '')})
 
     def search_closest_parent(self, new_path: pathlib.PurePath) -> (int, pathlib.PurePath):
         """
@@ -159,6 +284,13 @@ class LoadDBData:
         """
         # WORKAROUND: the dummy path "path / '@'", that is path is a parent for it.
         # So parents includes the path itself
+        if self.dir_index is not None:
+            for path_ in (new_path / '@').parents:
+                parent_id = self.dir_index.get(str(path_))
+                if parent_id is not None:
+                    return parent_id, path_
+            return 0, None
+
         for path_ in (new_path / '@').parents:
             parent_id = self.cursor.execute(
                 FIND_EXACT_PATH, (str(path_),)).fetchone()
@@ -166,3 +298,236 @@ class LoadDBData:
                 return parent_id[0], path_
 
         return 0, None
+
+
+class BulkLoadDBData(LoadDBData):
+    """
+    Bulk variant of LoadDBData:
+    dirs and extensions are resolved in memory, new files are
+    buffered and written with executemany, one transaction per batch.
+    New dirs and extensions are written with the batch too, so no
+    write transaction is open while file system is scanned
+    """
+
+    def __init__(self, conn, batch_size: int = BATCH_SIZE,
+                 workers: int = WALK_WORKERS):
+        """
+        :param conn: - connection to database
+        :param batch_size: - number of files written in one transaction
+        :param workers: - number of threads to scan file system
+        """
+        super(BulkLoadDBData, self).__init__(conn)
+        self.defer_commit = True
+        self.batch_size = batch_size
+        self.workers = workers
+        self.ext_ids = {}      # extension -> ExtID
+        self.dir_files = {}    # dir as str -> set of file names in DB
+        self.buffer = []       # (dir as str, FileName, extension, Size, FileDate)
+
+    def load_data(self, path_, ext_):
+        """
+        Load data in data base
+        :param path_: root directory
+        :param ext_: extensions, see scan_files
+        :return: None
+        """
+        self.load_dir_index()
+        self.ext_ids = dict(self.cursor.execute(ALL_EXT))
+        self.dir_files.clear()
+
+        for entry in scan_files(path_, ext_, self.workers):
+            self.add_file(entry)
+            if self.progress:
+                self.progress(1)
+        self.flush()
+
+    def add_file(self, entry: FileEntry):
+        """
+        Buffer file if it is not in DB yet
+        :param entry: FileEntry - as produced by scan_files
+        """
+        names = self.dir_entry(entry.dir)
+        if entry.name not in names:
+            names.add(entry.name)
+            self.buffer_file(entry.dir, entry.name, entry.size, entry.mtime)
+
+    def buffer_file(self, dir_: str, name: str, size: int, mtime: float):
+        self.buffer.append((dir_, name, file_ext(name), size, iso_date(mtime)))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def dir_entry(self, dir_: str) -> set:
+        """
+        Names of files already saved in dir_,
+        the DB is queried only once per directory
+        """
+        if dir_ not in self.dir_files:
+            idx = self.dir_index.get(str(pathlib.Path(dir_)), 0)
+            names = set()
+            if idx > 0:
+                self.updated_dirs.add(str(idx))
+                names.update(x[0] for x in self.cursor.execute(FILES_IN_DIR, (idx,)))
+            self.dir_files[dir_] = names
+        return self.dir_files[dir_]
+
+    def dir_id(self, dir_: str) -> int:
+        idx, _ = self.insert_dir(pathlib.Path(dir_))
+        self.updated_dirs.add(str(idx))
+        return idx
+
+    def ext_id(self, ext: str) -> int:
+        if ext not in self.ext_ids:
+            self.cursor.execute(INSERT_EXT, {'ext': ext})
+            self.ext_ids[ext] = self.cursor.lastrowid
+            self.rows_written += 1
+        return self.ext_ids[ext]
+
+    def insert_extension(self, file: pathlib.Path) -> int:
+        return self.ext_id(file.suffix.strip('.'))
+
+    def flush(self):
+        """
+        Write buffered files with their new dirs and extensions and commit
+        """
+        if self.buffer:
+            self.write_files([(self.dir_id(dir_), name, self.ext_id(ext), size, date)
+                              for dir_, name, ext, size, date in self.buffer])
+            self.buffer.clear()
+        self.commit(force=True)
+
+    def write_files(self, rows: list):
+        """
+        :param rows: (DirID, FileName, ExtID, Size, FileDate)
+        """
+        self.cursor.executemany(INSERT_FILES, rows)
+        self.rows_written += len(rows)
+
+
+class RescanDBData(BulkLoadDBData):
+    """
+    Incremental rescan: the directory listing is compared with
+    the snapshot (mtime, number of entries, extensions) saved in
+    DirSnapshot table by previous rescan; files of unchanged
+    directories are not checked at all.
+    Note: a file modified in place does not change mtime of its
+    directory, so it is found only if the directory is changed.
+    """
+
+    def __init__(self, conn):
+        super(RescanDBData, self).__init__(conn)
+        self.snapshots = {}      # dir as str -> (MTime, Entries, Ext)
+        self.new_snapshots = []
+        self.diff = ScanDiff(set(), set(), set())
+
+    def get_diff(self) -> ScanDiff:
+        return self.diff
+
+    def rescan(self, path_, ext_) -> ScanDiff:
+        """
+        Rescan directory path_ and all its subdirectories,
+        new files are saved in DB, removed files are only reported
+        :param path_: root directory
+        :param ext_: extensions, see scan_files
+        :return: ScanDiff
+        """
+        self.load_dir_index()
+        self.ext_ids = dict(self.cursor.execute(ALL_EXT))
+        root = os.fspath(path_)
+        self.snapshots = {row[0]: tuple(row[1:]) for row in self.cursor.execute(
+            SNAPSHOTS, {'path': root, 'sub': os.path.join(root, '')})}
+        ext_key = ext_ if isinstance(ext_, str) else ','.join(sorted(ext_))
+
+        visited = set()
+        skipped = []    # not readable now, their snapshots are kept
+        stack = [root]
+        while stack:
+            dir_ = stack.pop()
+            try:
+                mtime = os.stat(dir_).st_mtime_ns
+                with os.scandir(dir_) as it:
+                    entries = list(it)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            except OSError:
+                skipped.append(dir_)
+                continue
+            visited.add(dir_)
+            if self.progress:
+                self.progress(len(entries))
+            snapshot = (mtime, len(entries), ext_key)
+            changed = self.snapshots.get(dir_) != snapshot
+            files = []
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif changed and entry.is_file():
+                        files.append(entry)
+                except OSError:
+                    skipped.append(entry.path)
+            if changed:
+                self.diff_dir(dir_, files, ext_)
+                self.new_snapshots.append((dir_, *snapshot))
+
+        skipped = tuple(os.path.join(dir_, '') for dir_ in skipped)
+        for dir_ in self.snapshots.keys() - visited:
+            if not os.path.join(dir_, '').startswith(skipped):
+                self.removed_dir(dir_)
+
+        self.cursor.executemany(SAVE_SNAPSHOT, self.new_snapshots)
+        self.new_snapshots.clear()
+        self.flush()
+        return self.diff
+
+    def write_files(self, rows: list):
+        """
+        Insert files one by one to report their FileIDs as added
+        """
+        for row in rows:
+            self.cursor.execute(INSERT_FILES, row)
+            self.diff.added.add(self.cursor.lastrowid)
+        self.rows_written += len(rows)
+
+    def diff_dir(self, dir_: str, entries: list, ext_):
+        """
+        Compare files in changed directory with files saved in DB
+        :param dir_: directory
+        :param entries: os.DirEntry of files in directory
+        :param ext_: extensions, see scan_files
+        """
+        idx = self.dir_index.get(str(pathlib.Path(dir_)), 0)
+        db_files = {}
+        if idx > 0:
+            db_files = {row[1]: (row[0], *row[2:])
+                        for row in self.cursor.execute(DIR_FILES, (idx,))}
+
+        for entry in entries:
+            if not ext_match(entry.name, ext_):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if entry.name in db_files:
+                file_id, size, date = db_files[entry.name]
+                if (size, str(date)) != (st.st_size, iso_date(st.st_mtime)):
+                    self.diff.modified.add(file_id)
+                    self.updated_dirs.add(str(idx))
+                continue
+            self.buffer_file(dir_, entry.name, st.st_size, st.st_mtime)
+
+        names = set(entry.name for entry in entries)
+        for name, file_ in db_files.items():
+            if name not in names:
+                self.diff.removed.add(file_[0])
+
+    def removed_dir(self, dir_: str):
+        """
+        Directory with snapshot no longer exists:
+        all its files are reported as removed
+        """
+        idx = self.dir_index.get(str(pathlib.Path(dir_)), 0)
+        if idx > 0:
+            self.diff.removed.update(
+                row[0] for row in self.cursor.execute(DIR_FILES, (idx,)))
+        self.cursor.execute(DELETE_SNAPSHOT, (dir_,))
@@ -59,6 +59,8 @@ class AppWindow(QMainWindow):
             lambda: self.scan_files_signal.emit())
         self.ui.actionFileFilter.triggered.connect(
             lambda: self.change_data_signal.emit("Select files"))
+        self.ui.searchEdit.returnPressed.connect(
+            lambda: self.change_data_signal.emit("Quick search"))
 
         self.ui.commentField.anchorClicked.connect(self.ref_clicked)
         self.ui.filesList.doubleClicked.connect(
@@ -187,6 +189,7 @@ class AppWindow(QMainWindow):
         open_db = menu.addAction("Open DB")
         change_font = menu.addAction("Change Font")
         set_fields = menu.addAction("Set fields")
+        cancel_jobs = menu.addAction("Cancel background jobs")
         self.ui.btnOption.setMenu(menu)
         open_db.triggered.connect(lambda: self.open_dialog.exec_())
         change_font.triggered.connect(
@@ -194,6 +197,8 @@ class AppWindow(QMainWindow):
         )
         set_fields.triggered.connect(
             lambda: self.change_data_signal.emit("Set fields"))
+        cancel_jobs.triggered.connect(
+            lambda: self.change_data_signal.emit("Cancel jobs"))
 
         menu2 = QMenu(self)
         sel_opt = menu2.addAction("Selection options")
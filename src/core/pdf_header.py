@@ -0,0 +1,458 @@
+# pdf_header.py
+
+"""
+Fast reader of page count and document info of PDF file.
+Only the cross-reference sections (starting with the last one),
+the trailer, the document catalog, the root of page tree and
+the document info dictionary are parsed.
+"""
+
+from collections import namedtuple
+import mmap
+import re
+import zlib
+
+
+Ref = namedtuple('Ref', 'num gen')
+# num: int - object number, gen: int - generation number
+
+TAIL_SIZE = 2048          # 'startxref' is searched in the tail of file
+
+WHITESPACE = b' \t\r\n\f\x00'
+DELIMITERS = b'()<>[]{}/%'
+
+STARTXREF = re.compile(rb'startxref\s+(\d+)')
+XREF_SUBSECTION = re.compile(rb'\s*(\d+)\s+(\d+)')
+XREF_ENTRY = re.compile(rb'\s*(\d{10})\s+(\d{5})\s+([nf])')
+OBJ_HEADER = re.compile(rb'\s*(\d+)\s+(\d+)\s+obj')
+NUMBER = re.compile(rb'[+-]?(\d+\.?\d*|\.\d+)')
+REF_TAIL = re.compile(rb'\s+(\d+)\s+R(?=[\s/\[\]<>()%]|$)')
+NAME_ESCAPE = re.compile(rb'#([0-9a-fA-F]{2})')
+
+STRING_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b',
+                  b'f': b'\f', b'(': b'(', b')': b')', b'\\': b'\\'}
+
+# PDFDocEncoding differs from latin-1 in these codes
+PDF_DOC_ENCODING = {
+    0x18: '˘', 0x19: 'ˇ', 0x1a: 'ˆ', 0x1b: '˙',
+    0x1c: '˝', 0x1d: '˛', 0x1e: '˚', 0x1f: '˜',
+    0x80: '•', 0x81: '†', 0x82: '‡', 0x83: '…',
+    0x84: '—', 0x85: '–', 0x86: 'ƒ', 0x87: '⁄',
+    0x88: '‹', 0x89: '›', 0x8a: '−', 0x8b: '‰',
+    0x8c: '„', 0x8d: '“', 0x8e: '”', 0x8f: '‘',
+    0x90: '’', 0x91: '‚', 0x92: '™', 0x93: 'ﬁ',
+    0x94: 'ﬂ', 0x95: 'Ł', 0x96: 'Œ', 0x97: 'Š',
+    0x98: 'Ÿ', 0x99: 'Ž', 0x9a: 'ı', 0x9b: 'ł',
+    0x9c: 'œ', 0x9d: 'š', 0x9e: 'ž', 0xa0: '€',
+}
+
+
+class PdfHeaderError(Exception):
+    """
+    The fast path can't read the file, full parser should be used
+    """
+
+
+class Name(str):
+    """
+    PDF name object, stored with leading '/'
+    """
+
+
+def decode_text(value):
+    """
+    PDF text string -> str, None if value is not a text string
+    """
+    if not isinstance(value, bytes):
+        return None
+    if value.startswith(b'\xfe\xff'):
+        return value[2:].decode('utf-16-be', errors='replace')
+    if value.startswith(b'\xef\xbb\xbf'):
+        return value[3:].decode('utf-8', errors='replace')
+    return ''.join(PDF_DOC_ENCODING.get(b, chr(b)) for b in value)
+
+
+def png_predictor(data: bytes, columns: int) -> bytes:
+    """
+    Undo PNG predictor (used by xref streams), each row starts with filter type
+    """
+    row_size = columns + 1
+    if len(data) % row_size:
+        raise PdfHeaderError('wrong length of predicted data')
+    prev = bytearray(columns)
+    out = bytearray()
+    for i in range(0, len(data), row_size):
+        kind = data[i]
+        row = bytearray(data[i + 1: i + row_size])
+        if kind == 1:
+            for j in range(1, columns):
+                row[j] = (row[j] + row[j - 1]) & 0xff
+        elif kind == 2:
+            for j in range(columns):
+                row[j] = (row[j] + prev[j]) & 0xff
+        elif kind == 3:
+            for j in range(columns):
+                left = row[j - 1] if j else 0
+                row[j] = (row[j] + ((left + prev[j]) >> 1)) & 0xff
+        elif kind == 4:
+            for j in range(columns):
+                a = row[j - 1] if j else 0
+                b = prev[j]
+                c = prev[j - 1] if j else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                pr = a if pa <= pb and pa <= pc else b if pb <= pc else c
+                row[j] = (row[j] + pr) & 0xff
+        elif kind != 0:
+            raise PdfHeaderError(f'unknown PNG predictor {kind}')
+        out += row
+        prev = row
+    return bytes(out)
+
+
+class PdfHeader:
+    """
+    Read page count and document info of PDF file without
+    building full document structure
+    :param data: content of PDF file - bytes or mmap
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.xref = {}          # object number -> (offset, None) or (objstm number, index)
+        self.trailer = {}
+        self.obj_streams = {}   # objstm number -> (objects, data)
+
+    # --- lexical level ---
+
+    def skip_space(self, pos: int) -> int:
+        data = self.data
+        size = len(data)
+        while pos < size:
+            ch = data[pos]
+            if ch in WHITESPACE:
+                pos += 1
+            elif ch == 0x25:        # '%' - comment up to end of line
+                while pos < size and data[pos] not in b'\r\n':
+                    pos += 1
+            else:
+                break
+        return pos
+
+    def parse(self, pos: int):
+        """
+        Parse object starting at pos
+        :return: (object, position after object)
+        """
+        data = self.data
+        pos = self.skip_space(pos)
+        if pos >= len(data):
+            raise PdfHeaderError('unexpected end of data')
+        head = data[pos:pos + 2]
+        if head == b'<<':
+            return self.parse_dict(pos + 2)
+        ch = head[:1]
+        if ch == b'[':
+            return self.parse_array(pos + 1)
+        if ch == b'(':
+            return self.parse_string(pos + 1)
+        if ch == b'<':
+            return self.parse_hex(pos + 1)
+        if ch == b'/':
+            return self.parse_name(pos + 1)
+        for word, value in ((b'true', True), (b'false', False), (b'null', None)):
+            if data[pos:pos + len(word)] == word:
+                return value, pos + len(word)
+        m = NUMBER.match(data, pos)
+        if not m:
+            raise PdfHeaderError(f'unexpected token at {pos}')
+        text = m.group()
+        if b'.' in text:
+            return float(text), m.end()
+        ref = REF_TAIL.match(data, m.end())
+        if ref:
+            return Ref(int(text), int(ref.group(1))), ref.end()
+        return int(text), m.end()
+
+    def parse_dict(self, pos: int):
+        res = {}
+        while True:
+            pos = self.skip_space(pos)
+            if self.data[pos:pos + 2] == b'>>':
+                return res, pos + 2
+            key, pos = self.parse(pos)
+            if not isinstance(key, Name):
+                raise PdfHeaderError(f'dictionary key expected at {pos}')
+            res[key], pos = self.parse(pos)
+
+    def parse_array(self, pos: int):
+        res = []
+        while True:
+            pos = self.skip_space(pos)
+            if self.data[pos:pos + 1] == b']':
+                return res, pos + 1
+            item, pos = self.parse(pos)
+            res.append(item)
+
+    def parse_name(self, pos: int):
+        data = self.data
+        end = pos
+        while end < len(data) and data[end] not in WHITESPACE and \
+                data[end] not in DELIMITERS:
+            end += 1
+        raw = NAME_ESCAPE.sub(lambda m: bytes((int(m.group(1), 16),)),
+                              bytes(data[pos:end]))
+        return Name('/' + raw.decode('latin-1')), end
+
+    def parse_hex(self, pos: int):
+        end = self.data.find(b'>', pos)
+        if end < 0:
+            raise PdfHeaderError('unterminated hex string')
+        digits = bytes(b for b in self.data[pos:end] if b not in WHITESPACE)
+        if len(digits) % 2:
+            digits += b'0'
+        return bytes.fromhex(digits.decode('latin-1')), end + 1
+
+    def parse_string(self, pos: int):
+        data = self.data
+        res = bytearray()
+        depth = 1
+        while pos < len(data):
+            ch = data[pos:pos + 1]
+            pos += 1
+            if ch == b'\\':
+                nxt = data[pos:pos + 1]
+                pos += 1
+                if nxt in STRING_ESCAPES:
+                    res += STRING_ESCAPES[nxt]
+                elif nxt.isdigit():
+                    digits = nxt
+                    while len(digits) < 3 and data[pos:pos + 1].isdigit() and \
+                            data[pos:pos + 1] in b'01234567':
+                        digits += data[pos:pos + 1]
+                        pos += 1
+                    res.append(int(digits, 8) & 0xff)
+                elif nxt == b'\r':
+                    if data[pos:pos + 1] == b'\n':
+                        pos += 1
+                elif nxt != b'\n':
+                    res += nxt
+            elif ch == b'(':
+                depth += 1
+                res += ch
+            elif ch == b')':
+                depth -= 1
+                if depth == 0:
+                    return bytes(res), pos
+                res += ch
+            else:
+                res += ch
+        raise PdfHeaderError('unterminated string')
+
+    # --- objects ---
+
+    def stream_data(self, header: dict, pos: int) -> bytes:
+        """
+        Decoded content of stream, pos - just after stream dictionary
+        """
+        pos = self.skip_space(pos)
+        if self.data[pos:pos + 6] != b'stream':
+            raise PdfHeaderError('stream expected')
+        pos += 6
+        if self.data[pos:pos + 2] == b'\r\n':
+            pos += 2
+        elif self.data[pos:pos + 1] in (b'\r', b'\n'):
+            pos += 1
+        length = header.get('/Length')
+        if not isinstance(length, int):
+            length = self.resolve(length)
+        if not isinstance(length, int):
+            raise PdfHeaderError('wrong stream length')
+        raw = bytes(self.data[pos:pos + length])
+
+        filters = header.get('/Filter')
+        if filters is None:
+            return raw
+        if filters == '/FlateDecode' or filters == ['/FlateDecode']:
+            raw = zlib.decompress(raw)
+        else:
+            raise PdfHeaderError(f'unsupported filter {filters}')
+        params = header.get('/DecodeParms') or {}
+        if isinstance(params, list):
+            params = params[0] or {}
+        predictor = params.get('/Predictor', 1)
+        if predictor >= 10:
+            raw = png_predictor(raw, params.get('/Columns', 1))
+        elif predictor != 1:
+            raise PdfHeaderError(f'unsupported predictor {predictor}')
+        return raw
+
+    def object_at(self, offset: int, num: int):
+        m = OBJ_HEADER.match(self.data, offset)
+        if not m or int(m.group(1)) != num:
+            raise PdfHeaderError(f'object {num} not found at {offset}')
+        return self.parse(m.end())
+
+    def object_in_stream(self, stream_num: int, index: int):
+        if stream_num not in self.obj_streams:
+            entry = self.xref.get(stream_num)
+            if entry is None or entry[1] is not None:
+                raise PdfHeaderError(f'object stream {stream_num} not found')
+            header, pos = self.object_at(entry[0], stream_num)
+            data = self.stream_data(header, pos)
+            parser = PdfHeader(data)
+            offsets = []
+            pos = 0
+            for _ in range(header.get('/N', 0)):
+                num, pos = parser.parse(pos)
+                off, pos = parser.parse(pos)
+                offsets.append(header.get('/First', 0) + off)
+            self.obj_streams[stream_num] = (offsets, parser)
+        offsets, parser = self.obj_streams[stream_num]
+        if index >= len(offsets):
+            raise PdfHeaderError(f'object {index} not in stream {stream_num}')
+        return parser.parse(offsets[index])[0]
+
+    def resolve(self, value):
+        """
+        Follow indirect reference
+        """
+        depth = 0
+        while isinstance(value, Ref):
+            depth += 1
+            if depth > 32:
+                raise PdfHeaderError('reference loop')
+            entry = self.xref.get(value.num)
+            if entry is None:
+                return None
+            if entry[1] is None:
+                value = self.object_at(entry[0], value.num)[0]
+            else:
+                value = self.object_in_stream(*entry)
+        return value
+
+    # --- cross-reference ---
+
+    def read_xref(self):
+        """
+        Read cross-reference sections starting from the last one
+        """
+        tail = max(0, len(self.data) - TAIL_SIZE)
+        matches = list(STARTXREF.finditer(self.data, tail))
+        if not matches:
+            raise PdfHeaderError('startxref not found')
+        offset = int(matches[-1].group(1))
+        seen = set()
+        while offset is not None:
+            if offset in seen or offset >= len(self.data):
+                raise PdfHeaderError('wrong xref offset')
+            seen.add(offset)
+            trailer = self.read_section(offset)
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+            if isinstance(trailer.get('/XRefStm'), int):
+                self.read_section(trailer['/XRefStm'])
+            offset = trailer.get('/Prev')
+
+    def read_section(self, offset: int) -> dict:
+        pos = self.skip_space(offset)
+        if self.data[pos:pos + 4] == b'xref':
+            return self.read_table(pos + 4)
+        return self.read_stream(pos)
+
+    def read_table(self, pos: int) -> dict:
+        data = self.data
+        while True:
+            pos = self.skip_space(pos)
+            if data[pos:pos + 7] == b'trailer':
+                return self.parse(pos + 7)[0]
+            m = XREF_SUBSECTION.match(data, pos)
+            if not m:
+                raise PdfHeaderError('wrong xref subsection')
+            start, count = int(m.group(1)), int(m.group(2))
+            pos = m.end()
+            for num in range(start, start + count):
+                entry = XREF_ENTRY.match(data, pos)
+                if not entry:
+                    raise PdfHeaderError('wrong xref entry')
+                pos = entry.end()
+                if entry.group(3) == b'n' and num not in self.xref:
+                    self.xref[num] = (int(entry.group(1)), None)
+
+    def read_stream(self, pos: int) -> dict:
+        m = OBJ_HEADER.match(self.data, pos)
+        if not m:
+            raise PdfHeaderError('xref stream expected')
+        header, pos = self.parse(m.end())
+        if not isinstance(header, dict) or header.get('/Type') != '/XRef':
+            raise PdfHeaderError('xref stream expected')
+        data = self.stream_data(header, pos)
+        widths = header.get('/W')
+        if not isinstance(widths, list) or len(widths) != 3:
+            raise PdfHeaderError('wrong /W in xref stream')
+        index = header.get('/Index', [0, header.get('/Size', 0)])
+        row = sum(widths)
+        pos = 0
+        for start, count in zip(index[::2], index[1::2]):
+            for num in range(start, start + count):
+                fields = []
+                for w in widths:
+                    fields.append(int.from_bytes(data[pos:pos + w], 'big'))
+                    pos += w
+                if pos > len(data):
+                    raise PdfHeaderError('xref stream is too short')
+                kind = fields[0] if widths[0] else 1
+                if num in self.xref:
+                    continue
+                if kind == 1:
+                    self.xref[num] = (fields[1], None)
+                elif kind == 2:
+                    self.xref[num] = (fields[1], fields[2])
+        return header
+
+    # --- document ---
+
+    def read(self) -> (int, dict):
+        """
+        :return: (number of pages, document info) where document info is
+                 a dict {name: str or None} or None if there is no info
+        """
+        self.read_xref()
+        if '/Encrypt' in self.trailer:
+            raise PdfHeaderError('encrypted document')
+        root = self.resolve(self.trailer.get('/Root'))
+        if not isinstance(root, dict):
+            raise PdfHeaderError('document catalog not found')
+        pages = self.resolve(root.get('/Pages'))
+        if not isinstance(pages, dict):
+            raise PdfHeaderError('page tree not found')
+        count = self.resolve(pages.get('/Count'))
+        if not isinstance(count, int):
+            raise PdfHeaderError('wrong page count')
+
+        info = self.resolve(self.trailer.get('/Info'))
+        if not isinstance(info, dict):
+            return count, None
+        return count, {key: decode_text(self.resolve(value))
+                       for key, value in info.items()}
+
+
+def read_pdf_header(file_) -> (int, dict):
+    """
+    Read page count and document info of PDF file
+    :param file_: file name
+    :return: see PdfHeader.read
+    :raise PdfHeaderError: if the file can't be read by fast path
+    """
+    with open(file_, 'rb') as pdf_file:
+        try:
+            data = mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:       # empty file
+            raise PdfHeaderError('empty file')
+        try:
+            return PdfHeader(data).read()
+        except (ValueError, IndexError, KeyError, TypeError,
+                AttributeError, RecursionError, zlib.error) as e:
+            raise PdfHeaderError(str(e))
+        finally:
+            data.close()
@@ -125,22 +125,25 @@ class SelOpt(QDialog):
 
     def get_result(self) -> dict:
         """
-        Returns the options chosen in the dialog
+        Returns the options chosen in the dialog,
+        see utilities.generate_adv_sql
         :result: dict of the following keys:
-            'dir' - list of dir IDs as a str,
+            'dir' - ID of dir to select files from it and its sub-dirs,
             'ext' - list of ext IDs as a str,
-            'tag' - list of tag IDs as a str,
+            'tag' - list of tag IDs as a str and if all tags are required,
             'author' - list of author IDs as a str,
-            'use_date' - date of recent opening the file,
-            'not_older' - number of years before current date,
-            'is_file_date' - if True then used date of file creation,
-                             else the year of book issue
+            'date' - tuple:
+               use date,
+               number of years before current date,
+               if True then used date of file creation,
+                    else the year of book issue
         """
         result = dict()
 
-        result['dir'] = self._get_dir_ids()
+        result['dir'] = self._get_dir_id()
         result['ext'] = self._get_ext_ids()
-        result['file'] = self._get_file_id()
+        result['tag'] = self._get_tag_ids()
+        result['author'] = self._get_author_ids()
 
         result['date'] = (self.ui.chDate.isChecked(),
                           self.ui.eDate.text(),
@@ -162,39 +165,14 @@ class SelOpt(QDialog):
                            self.ui.eDate.text(),
                            self.ui.dateFile.isChecked()))
 
-    def _get_file_id(self) -> str:
+    def _get_dir_id(self):
         """
-        create an intersection of two list of file IDs
-        1 - associated with selected tags
-        2 - associated with selected authors
-        :return: str - list of file IDs as comma separated string
-        """
-        # not exactly what need because list will be
-        # EMPTY in case if any of choices NOT set
-        s = set()
-        if self.ui.chTags.isChecked():
-            s.update(self._get_file_ids_4_tags())
-            if self.ui.chAuthor.isChecked():
-                s.intersection(self._get_file_ids_4_authors())
-        elif self.ui.chAuthor.isChecked():
-            s.update(self._get_file_ids_4_authors())
-
-        return ','.join((str(id_[0]) for id_ in s))
-    
-    def _get_dir_ids(self) -> str:
-        """
-        returns list of selected IDs as string separated by coma
+        returns ID of current dir, None if dirs are not used
         """
         if self.ui.chDirs.isChecked():
-            lvl = 0
             idx = self.ctrl.ui.dirTree.currentIndex()
-            root_id = int(self.ctrl.ui.dirTree.model().data(
-                idx, Qt.UserRole)[0])
-
-            ids = ','.join([str(id_[0])
-                            for id_ in ut.dir_ids_select(root_id, lvl)])
-            return ids
-        return ''
+            return int(self.ctrl.ui.dirTree.model().data(idx, Qt.UserRole)[0])
+        return None
 
     def _get_ext_ids(self) -> str:
         """
@@ -226,29 +204,19 @@ class SelOpt(QDialog):
 
         return idx
 
-    def _get_file_ids_4_tags(self) -> list:
+    def _get_tag_ids(self) -> tuple:
         """
-        Select all file IDs that associated with selected tags
-        taking into account whether all tags or any tags
-        associated with file.
-        :return: list of file IDs as comma separated string
+        :return: selected tag IDs as comma separated string and
+                 whether all tags or any tags should be associated with file
         """
-        tags = get_items_id(self.ctrl.ui.tagsList)
-        if tags:
-            if self.ui.tagAll.isChecked():
-                num = len(tags.split(','))
-                res = ut.select_other2(
-                    'FILE_IDS_ALL_TAG', (tags, num)).fetchall()
-            else:
-                res = ut.select_other2('FILE_IDS_ANY_TAG', (tags,)).fetchall()
-            return res
-
-        return []
-
-    def _get_file_ids_4_authors(self) -> list:
-        auth_ids = get_items_id(self.ctrl.ui.authorsList)
-        file_ids = ut.select_other2('FILE_IDS_AUTHORS', (auth_ids,)).fetchall()
-        return file_ids
+        if self.ui.chTags.isChecked():
+            return get_items_id(self.ctrl.ui.tagsList), self.ui.tagAll.isChecked()
+        return '', False
+
+    def _get_author_ids(self) -> str:
+        if self.ui.chAuthor.isChecked():
+            return get_items_id(self.ctrl.ui.authorsList)
+        return ''
 
 
 if __name__ == "__main__":
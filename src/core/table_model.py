@@ -1,13 +1,18 @@
 # table_model.py
 
+from collections import deque
 from collections.abc import Iterable
+from itertools import islice
 
 # from PyQt5.QtCore import QModelIndex, Qt, QAbstractTableModel, QSortFilterProxyModel
 from PyQt5.QtCore import (QAbstractTableModel, QModelIndex, Qt, QMimeData, QByteArray,
-                          QDataStream, QIODevice, QSortFilterProxyModel)
+                          QDataStream, QIODevice, QSortFilterProxyModel, QTimer)
 
 from .helper import MimeTypes, VIRTUAL_FILE, REAL_FILE
 
+FETCH_PAGE = 500        # rows taken from source at once
+READ_PAGES = 20         # pages read from source in one step of event loop
+
 
 class ProxyModel(QSortFilterProxyModel):
 
@@ -44,16 +49,11 @@ class ProxyModel2(ProxyModel):
     def in_real_folder(self, index):
         return self.sourceModel().data(self.mapToSource(index), role=Qt.UserRole)[-1] == 0
 
-    def lessThan(self, left, right):
-        s_model = self.sourceModel()
-        left_data = s_model.data(left)
-        right_data = s_model.data(right)
-
-        if s_model.headerData(left.column(), Qt.Horizontal) in ('Pages', 'Size'):
-            left_data = int(left_data) or 0
-            right_data = int(right_data) or 0
-
-        return left_data < right_data
+    def sort(self, column, order=Qt.AscendingOrder):
+        """
+        rows are sorted in source model, proxy keeps its order
+        """
+        self.sourceModel().sort(column, order)
 
     def flags(self, index):
         if not index.isValid():
@@ -91,17 +91,59 @@ class ProxyModel2(ProxyModel):
 
 
 class TableModel(QAbstractTableModel):
+    """
+    Data are kept by columns as they are set,
+    cells are converted into str only in data() for shown rows.
+    Rows from source set by set_source are taken by pages when view needs them;
+    source is read to the end in background, so cursor does not keep
+    read transaction open while rows are not shown.
+    Sorted model keeps data in place, only order of rows is changed
+    """
     def __init__(self, parent=None, *args):
         super(TableModel, self).__init__(parent)
         self.header = ()
-        self.__data = []
+        self.__columns = []     # list of cells for each column, None - no cell
         self.__user_data = []
+        self.__source = None    # iterator of not read rows
+        self.__buffer = deque()  # rows read from source, not fetched
+        self.__convert = None
+        self.__order = None     # row -> index in __columns, None - same
+        self.__perms = {}       # column -> indexes of rows in ascending order
         self.column_count = 0
+        self.page = FETCH_PAGE
+
+    @staticmethod
+    def _cells(row) -> tuple:
+        if isinstance(row, str) or not isinstance(row, Iterable):
+            return row,
+        return tuple(row)
+
+    def _widen(self, width):
+        """
+        add columns for row with more cells than in previous rows
+        """
+        for _ in range(len(self.__columns), width):
+            self.__columns.append([None] * len(self.__user_data))
+
+    def _at(self, row) -> int:
+        """
+        index of row in __columns and __user_data
+        """
+        return row if self.__order is None else self.__order[row]
+
+    def _cell(self, row, column):
+        if column < len(self.__columns):
+            value = self.__columns[column][self._at(row)]
+            if value is not None:
+                return str(value)
+        return None
 
     def rowCount(self, parent=QModelIndex()):
         if parent.isValid():
             return 0
-        return len(self.__data)
+        if self.__order is None:
+            return len(self.__user_data)
+        return len(self.__order)
 
     def setColumnCount(self, count):
         self.column_count = count
@@ -112,12 +154,9 @@ class TableModel(QAbstractTableModel):
     def data(self, index, role=Qt.DisplayRole):
         if index.isValid():
             if role == Qt.DisplayRole:
-                # row length > current column
-                if len(self.__data[index.row()]) > index.column():
-                    return self.__data[index.row()][index.column()]
-                return None
+                return self._cell(index.row(), index.column())
             elif role == Qt.UserRole:
-                return self.__user_data[index.row()]
+                return self.__user_data[self._at(index.row())]
             elif role == Qt.TextAlignmentRole:
                 if index.column() == 0:
                     return Qt.AlignLeft
@@ -126,62 +165,190 @@ class TableModel(QAbstractTableModel):
     def update(self, index, data, role=Qt.DisplayRole):
         if index.isValid():
             if role == Qt.DisplayRole:
-                i = index.column()
-                if i + 1 < len(self.__data[index.row()]):
-                    self.__data[index.row()] = self.__data[index.row()][:i] + \
-                        (data,) + self.__data[index.row()][(i+1):]
-                else:
-                    self.__data[index.row()] = self.__data[index.row()
-                                                           ][:-1] + (data,)
+                # column out of row - replace the last cell
+                i = min(index.column(), len(self.__columns) - 1)
+                self.__columns[i][self._at(index.row())] = data
+                self.__perms.clear()
             elif role == Qt.UserRole:
-                self.__user_data[index.row()] = data
+                self.__user_data[self._at(index.row())] = data
 
     def delete_row(self, index):
         if index.isValid():
-            self.beginRemoveRows(QModelIndex(), index.row(), index.row())
-            row = index.row()
-            self.__data.remove(self.__data[row])
-            self.__user_data.remove(self.__user_data[row])
-            self.endRemoveRows()
-
-    def append_row(self, row, user_data=None):
-        self.beginInsertRows(QModelIndex(), self.rowCount(), self.rowCount())
-        if isinstance(row, str) or not isinstance(row, Iterable):
-            row = (str(row),)
+            self.removeRows(index.row())
+
+    def set_rows(self, rows, user_data=None):
+        """
+        Replace all data of model, views are reset once
+        :param rows: list of rows, row - sequence of cells
+        :param user_data: list of user data, one for each row
+        """
+        rows = rows if isinstance(rows, list) else list(rows)
+        self.beginResetModel()
+        self._close_source()
+        self.__order = None
+        self.__perms.clear()
+        width = max(map(len, rows), default=0)
+        if all(len(row) == width for row in rows):
+            self.__columns = [list(col) for col in zip(*rows)]
         else:
-            rr = []
-            for r in row:
-                rr.append(str(r))
-            row = tuple(rr)
-
-        self.__data.append(row)
-        self.__user_data.append(user_data)
+            self.__columns = [[row[i] if i < len(row) else None for row in rows]
+                              for i in range(width)]
+        self.__user_data = (list(user_data) if user_data is not None
+                            else [None] * len(rows))
+        self.endResetModel()
+
+    def set_source(self, rows, convert):
+        """
+        Replace all data of model, rows are fetched by pages
+        :param rows: iterable of source rows, e.g. sqlite3 cursor,
+                     it is read to the end by READ_PAGES pages in event loop
+                     and closed, or closed when model is reset
+        :param convert: function: source row -> (row, user data)
+        """
+        self.set_rows([])
+        self.__source = iter(rows)
+        self.__convert = convert
+        self.fetchMore()
+        if self.__source is not None:
+            QTimer.singleShot(0, self._read_source)
+
+    def _read_source(self):
+        if self.__source is None:
+            return
+        size = self.page * READ_PAGES
+        before = len(self.__buffer)
+        self.__buffer.extend(islice(self.__source, size))
+        if len(self.__buffer) - before < size:
+            self._close_source(keep_buffer=True)
+        else:
+            QTimer.singleShot(0, self._read_source)
+
+    def _close_source(self, keep_buffer=False):
+        source, self.__source = self.__source, None
+        close = getattr(source, 'close', None)
+        if close:
+            close()
+        if not keep_buffer:
+            self.__buffer.clear()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and (self.__source is not None or bool(self.__buffer))
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        buffer = self.__buffer
+        chunk = [buffer.popleft() for _ in range(min(self.page, len(buffer)))]
+        if len(chunk) < self.page and self.__source is not None:
+            chunk.extend(islice(self.__source, self.page - len(chunk)))
+            if len(chunk) < self.page:
+                self._close_source()
+        if not chunk:
+            return
+        rows, user_data = zip(*map(self.__convert, chunk))
+        first = self.rowCount()
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._widen(max(map(len, rows)))
+        if self.__order is not None:
+            size = len(self.__user_data)
+            self.__order.extend(range(size, size + len(rows)))
+        for i, column in enumerate(self.__columns):
+            column.extend(row[i] if i < len(row) else None for row in rows)
+        self.__user_data.extend(user_data)
+        self.__perms.clear()
         self.endInsertRows()
 
+    def fetch_rows(self, count):
+        """
+        fetch rows from source until there are count rows in model
+        """
+        while self.rowCount() < count and self.canFetchMore():
+            self.fetchMore()
+
+    def _sort_perm(self, column) -> list:
+        """
+        :return: indexes of rows in __columns in ascending order of column,
+                 order of equal cells is kept
+        """
+        perm = self.__perms.get(column)
+        if perm is None:
+            rows = range(len(self.__user_data)) if self.__order is None else self.__order
+            keys = (self.__columns[column] if column < len(self.__columns)
+                    else [None] * len(self.__user_data))
+            try:
+                perm = sorted(rows, key=keys.__getitem__)
+            except TypeError:   # None or cells of different types
+                keys = [(2, '') if key is None else
+                        (0, key) if isinstance(key, (int, float)) else
+                        (1, str(key)) for key in keys]
+                perm = sorted(rows, key=keys.__getitem__)
+            self.__perms[column] = perm
+        return perm
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """
+        Sort all rows, not fetched rows are fetched before
+        """
+        self.fetch_rows(float('inf'))
+        if self.rowCount() < 2:
+            return
+        perm = self._sort_perm(column)
+        perm = perm[::-1] if order == Qt.DescendingOrder else perm[:]
+        if perm == (self.__order or list(range(len(perm)))):
+            return
+
+        self.layoutAboutToBeChanged.emit([], QAbstractTableModel.VerticalSortHint)
+        old_indexes = self.persistentIndexList()
+        old_at = [self._at(idx.row()) for idx in old_indexes]
+        self.__order = perm
+        if old_indexes:
+            new_row = dict.fromkeys(old_at)
+            for row, at in enumerate(perm):
+                if at in new_row:
+                    new_row[at] = row
+            self.changePersistentIndexList(
+                old_indexes,
+                [self.index(new_row[at], idx.column())
+                 for at, idx in zip(old_at, old_indexes)])
+        self.layoutChanged.emit([], QAbstractTableModel.VerticalSortHint)
+
+    def append_row(self, row, user_data=None):
+        self.insert_row(QModelIndex(), row, user_data)
+
     def insert_row(self, index, row_data, user_data=None):
-        if index.isValid():
-            row = index.row()
-            self.beginInsertRows(QModelIndex(), row, row)
-            self.__data.insert(row, row_data)
-            self.__user_data.insert(row, user_data)
+        row_data = self._cells(row_data)
+        row = index.row() if index.isValid() else self.rowCount()
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._widen(len(row_data))
+        if self.__order is None:
+            at = row
         else:
-            self.beginInsertRows(
-                QModelIndex(), self.rowCount(), self.rowCount())
-            self.__data.append(row_data)
-            self.__user_data.append(user_data)
+            # new row is added in the end of data
+            at = len(self.__user_data)
+            self.__order.insert(row, at)
+        for i, column in enumerate(self.__columns):
+            column.insert(at, row_data[i] if i < len(row_data) else None)
+        self.__user_data.insert(at, user_data)
+        self.__perms.clear()
         self.endInsertRows()
 
     def appendData(self, value, role=Qt.EditRole):
         in_row = self.rowCount(QModelIndex())
-        self.__data.append(value)
+        self.append_row(value)
         index = self.createIndex(in_row, 0, 0)
         self.dataChanged.emit(index, index)
         return True
 
     def removeRows(self, row, count=1, parent=QModelIndex()):
         self.beginRemoveRows(QModelIndex(), row, row + count - 1)
-        del self.__data[row:row + count]
-        del self.__user_data[row:row + count]
+        if self.__order is None:
+            for column in self.__columns:
+                del column[row:row + count]
+            del self.__user_data[row:row + count]
+        else:
+            # data of removed rows are kept until model is reset
+            del self.__order[row:row + count]
+        self.__perms.clear()
         self.endRemoveRows()
         return True
 
@@ -200,14 +367,17 @@ class TableModel(QAbstractTableModel):
     def setData(self, index, value, role):
         if index.isValid():
             if role == Qt.DisplayRole:
-                self.__data[index.row()][index.column()] = value
+                self.update(index, value)
                 return
             if role == Qt.UserRole:
-                self.__user_data[index.row()][index.column()] = value
+                self.__user_data[self._at(index.row())][index.column()] = value
 
     def get_row(self, row):
-        if row >= 0 & row < self.rowCount():
-            return self.__data[row], self.__user_data[row]
+        if 0 <= row < self.rowCount():
+            cells = [self._cell(row, i) for i in range(len(self.__columns))]
+            while cells and cells[-1] is None:      # no such cells in row
+                cells.pop()
+            return tuple(cells), self.__user_data[self._at(row)]
         return ()
 
 
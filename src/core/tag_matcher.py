@@ -0,0 +1,100 @@
+# tag_matcher.py
+
+import re
+import time
+
+
+def trie_regex(words) -> str:
+    """
+    Regular expression which matches any of words, the longest one first.
+    Words are merged into trie, so the regex does not try words one by one
+    at each position of text as alternation of words does
+    :param words: iterable of not empty strings
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = None     # end of word
+
+    def branch(node) -> str:
+        alts = [re.escape(char) + branch(sub)
+                for char, sub in sorted(node.items()) if char]
+        if not alts:
+            return ''
+        res = alts[0] if len(alts) == 1 else f'(?:{"|".join(alts)})'
+        # word ends here: the longer words are tried first
+        return f'(?:{res})?' if '' in node else res
+
+    return branch(trie)
+
+
+class TagMatcher:
+    """
+    All tags are compiled into one regular expression, each tag is
+    matched as whole word(s), case is ignored.
+    Text of each file is scanned once for all tags
+    """
+
+    def __init__(self, tags):
+        """
+        :param tags: list of (tag, TagID)
+        """
+        self.found = {tag_id: 0 for _, tag_id in tags}   # TagID -> number of files
+        self.rows = 0
+        self.seconds = 0.0
+        named = [(tag.lower(), re.compile(rf'\b{re.escape(tag)}\b', re.IGNORECASE), tag_id)
+                 for tag, tag_id in tags if tag]
+        self.single = [(single, tag_id) for _, single, tag_id in named]
+        keys = {key for key, _, _ in named}
+        # tag in lower case -> regexes of tag itself and all tags which may
+        # be matched at start of it, e.g. 'data' at start of 'data science'
+        self.candidates = {key: [(single, tag_id) for tag, single, tag_id in named
+                                 if key.startswith(tag)]
+                           for key in keys}
+        self.pattern = (re.compile(rf'\b(?:{trie_regex(keys)})\b', re.IGNORECASE)
+                        if keys else None)
+
+    def match(self, text: str) -> set:
+        """
+        :return: IDs of tags found in text
+        """
+        res = set()
+        if self.pattern is None or not text:
+            return res
+        search = self.pattern.search
+        found = search(text)
+        while found:
+            start = found.start()
+            # lower() may differ from case folding of regex
+            singles = self.candidates.get(found.group().lower(), self.single)
+            # word boundary after tag depends on text that follows it
+            res.update(tag_id for single, tag_id in singles if single.match(text, start))
+            # next tag may start inside of found one
+            found = search(text, start + 1)
+        return res
+
+    def scan(self, rows, progress=None) -> list:
+        """
+        :param rows: iterable of (text, FileID)
+        :param progress: callable(count) - called for each row
+        :return: list of (TagID, FileID) for all tags found in texts
+        """
+        start = time.perf_counter()
+        pairs = []
+        for text, file_id in rows:
+            self.rows += 1
+            for tag_id in self.match(text):
+                self.found[tag_id] += 1
+                pairs.append((tag_id, file_id))
+            if progress:
+                progress(1)
+        self.seconds += time.perf_counter() - start
+        return pairs
+
+    def get_speed(self) -> float:
+        """
+        :return: rows scanned per second
+        """
+        return self.rows / self.seconds if self.seconds else 0.0
@@ -1,48 +1,76 @@
 # utilities.py
+from collections import defaultdict
+from contextlib import contextmanager
 from pathlib import Path
+import json
 import sqlite3
 import datetime
+import threading
+import time
 
-from .create_db import create_all_objects
+from .create_db import create_all_objects, update_db, SYNC_SEARCH
+from .tag_matcher import TagMatcher
 
 DB_setting = {
         'Path': 'empty',
         'Conn': None,
         'SameDB': False,   # TODO save/restore setting within DB, then 'SameDB' won't need
+        'Profile': 'tuned',
+        'Pool': None,       # ConnectionPool of opened DB
     }
 
+# PRAGMAs applied to each new connection, selected by DB_setting['Profile']
+PROFILES = {
+    'default': {},   # SQLite defaults: rollback journal, synchronous = FULL
+    'tuned': {
+        'journal_mode': 'WAL',           # readers are not blocked by writer
+        'synchronous': 'NORMAL',         # WAL is consistent without FULL
+        'cache_size': -64000,            # KiB, negative value - in KiB
+        'mmap_size': 256 * 1024 * 1024,  # bytes
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,            # ms
+    },
+}
+
 
 EXT_ID_INCREMENT = 100000
 DETECT_TYPES = sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
 
-Selects = {'TREE':  # (Dir name, DirID, ParentID, Full path of dir)
-               (('WITH x(Path, DirID, ParentID, FolderType, level) AS '
-                 '(SELECT Path, DirID, ParentID, FolderType, 0 as level'),
-                'FROM Dirs WHERE DirID = {}',
-                'FROM Dirs WHERE ParentID = {}',
-                ('UNION ALL SELECT t.Path, t.DirID, t.ParentID, t.FolderType, '
-                 'x.level + 1 as lvl FROM x INNER JOIN Dirs AS t '
-                 'ON t.ParentID = x.DirID'),
-                'and lvl <= {}) SELECT * FROM x order by level desc, Path;',
-                ') SELECT * FROM x order by level desc, Path;',
-                ),
-
+# lists of values are bound as one JSON array parameter, see in_list
+IN_LIST = 'select value from json_each(?)'
+
+_local = threading.local()      # depth of unit_of_work blocks in thread, writer
+
+# statement name -> [number of executions, seconds]
+Stats = defaultdict(lambda: [0, 0.0])
+
+RANK_LIMIT = 20000      # max number of files found by quick_search to be ranked
+
+# dir_id = 0 - common root, its children have level 0
+Selects = {'TREE':  # (Full path of dir, DirID, ParentID, FolderType, level)
+               ('select d.Path, d.DirID, d.ParentID, d.FolderType, c.Depth - :first '
+                'as level from DirClosure as c inner join Dirs as d on '
+                'd.DirID = c.Descendant where c.Ancestor = :dir_id and '
+                'c.Depth >= :first and (:last is null or c.Depth <= :last) '
+                'order by level desc, d.Path;'),
+
+           'DIRS': ('select DirID, ParentID, Path, FolderType from Dirs '
+                    'where Path is not null order by Path;'),
+           'VIRT_LINKS': 'select ParentID, DirID from VirtDirs;',
+           'DIR_COUNT': 'select count(*) from Dirs;',
+           'DIR_CHILDREN': ('select DirID, Path, FolderType from Dirs '
+                            'where ParentID = ? and Path is not null order by Path;'),
+           'VIRT_CHILDREN': ('select d.DirID, d.Path, d.FolderType from VirtDirs v '
+                             'inner join Dirs d on d.DirID = v.DirID '
+                             'where v.ParentID = ? order by v.rowid;'),
+           'HAS_CHILDREN': ('select exists (select * from Dirs where ParentID = :dir_id '
+                            'and Path is not null) or exists (select * from VirtDirs '
+                            'where ParentID = :dir_id);'),
            'VIRT_DIRS': ('select d.Path, d.DirID, v.ParentID, d.FolderType from Dirs d ' 
                                   'inner join VirtDirs v on d.DirID = v.DirID;'),
-           'DIR_IDS':
-               ('WITH x(DirID, ParentID, FolderType, level) AS '
-                '(SELECT DirID, ParentID, FolderType, 0 as level',
-                'FROM Dirs WHERE DirID = {}',
-                'FROM Dirs WHERE ParentID = {}',
-                ('UNION ALL SELECT t.DirID, t.ParentID, t.FolderType, '
-                 'x.level + 1 as lvl FROM x INNER JOIN Dirs AS t '
-                 'ON t.ParentID = x.DirID'),
-                'and lvl <= {}) SELECT DirID FROM x order by DirID;',
-                ') SELECT DirID FROM x order by DirID;'),
-
-           'FILE_IDS_ALL_TAG': ('select FileID from FileTag where TagID in ({}) '
-                                'group by FileID having count(*) = {};'),
-           'FILE_IDS_ANY_TAG': 'select FileID from FileTag where TagID in ({}) order by FileID;',
+           'DIR_IDS': ('select Descendant from DirClosure where Ancestor = :dir_id '
+                       'and Depth >= :first and (:last is null or Depth <= :last) '
+                       'order by Descendant;'),
            'PATH': 'select Path from Dirs where DirID = ?;',
            'EXT': ('select Extension as title, ExtID+{}, GroupID '
                    'as ID from Extensions UNION select GroupName as title, '
@@ -55,34 +83,38 @@ Selects = {'TREE':  # (Dir name, DirID, ParentID, Full path of dir)
            'FILE_INFO': ('select A.FileName || " " || COALESCE(B.BookTitle, "") '
                          '|| " " || COALESCE(B.Comment, ""), A.FileID from '
                          'Files A left join Comments B on B.CommentID = A.CommentID '
-                         'where A.ExtID in ({}) and NOT EXISTS (select * from FileTag '
-                         'where FileID = A.FileID and TagID = {});'),
-           'FILE_IN_DIR': 'select FileID from Files where DirID={} and FileName="{}";',
+                         f'where A.ExtID in ({IN_LIST});'),
+           'FILE_IN_DIR': 'select FileID from Files where DirID = ? and FileName = ?;',
            'TAGS': 'select Tag, TagID from Tags order by Tag COLLATE NOCASE;',
            'FILE_TAGS': ('select Tag, TagID from Tags where TagID in '
                          '(select TagID from FileTag where FileID = ?);'),
            'TAG_FILES': 'select * from FileTag where TagID=:tag_id;',
-           'TAGS_BY_NAME': 'select Tag, TagID from Tags where Tag in ("{}");',
+           'TAGS_BY_NAME': f'select Tag, TagID from Tags where Tag in ({IN_LIST});',
            'TAG_FILE': 'select * from FileTag where FileID = ? and TagID =?;',
            'AUTHORS': 'select Author, AuthorID from Authors order by Author COLLATE NOCASE;',
            'FILE_AUTHORS': ('select Author, AuthorID from Authors where AuthorID in '
                             '(select AuthorID from FileAuthor where FileID = ?);'),
            'AUTHOR_FILES': 'select * from FileAuthor where AuthorID=:author_id;',
-           'AUTHORS_BY_NAME': 'select Author, AuthorID from Authors where Author in ("{}");',
+           'AUTHORS_BY_NAME': (f'select Author, AuthorID from Authors where Author in '
+                               f'({IN_LIST});'),
            'AUTHOR_FILE': 'select * from FileAuthor where FileID = ? and AuthorID =?;',
-           'FILE_IDS_AUTHORS': 'select FileID from FileAuthor where AuthorID in ({});',
            'FILE_COMMENT': 'select Comment, BookTitle from Comments where CommentID = ?;',
-           'ADV_SELECT':
-               (
-                   'DirID in ({})',
-                   'ExtID in ({})',
-                   'FileID in ({})',
-                   'FileDate > {}',
-                   'IssueDate > {}',
-                   ('select FileName, FileDate, Pages, Size, IssueDate, '
-                    'Opened, Commented, FileID, DirID, coalesce(CommentID, 0), '
-                    'ExtID from Files')
-               ),
+           'ADV_SELECT':     # predicate -> condition on Files
+               {
+                   'dir': 'DirID in (select Descendant from DirClosure where Ancestor = ?)',
+                   'ext': f'ExtID in ({IN_LIST})',
+                   'tag_any': f'FileID in (select FileID from FileTag where TagID in ({IN_LIST}))',
+                   'tag_all': (f'FileID in (select FileID from FileTag where TagID in '
+                               f'({IN_LIST}) group by FileID having count(*) = '
+                               '(select count(*) from json_each(?)))'),
+                   'author': (f'FileID in (select FileID from FileAuthor where AuthorID in '
+                              f'({IN_LIST}))'),
+                   'file_date': 'FileDate > ?',
+                   'issue_date': 'IssueDate > ?',
+               },
+           'ADV_FILES': ('select FileName, FileDate, Pages, Size, IssueDate, '
+                         'Opened, Commented, FileID, DirID, coalesce(CommentID, 0), '
+                         'ExtID from Files'),
            'FILES_CURR_DIR': ('select FileName, FileDate, Pages, Size, IssueDate, '
                               'Opened, Commented, FileID, DirID, coalesce(CommentID, 0), '
                               'ExtID from Files where DirId = ?;'),
@@ -90,6 +122,29 @@ Selects = {'TREE':  # (Dir name, DirID, ParentID, Full path of dir)
                           'Commented, FileID, DirID, coalesce(CommentID, 0), ExtID '
                           'from Files where FileID in (select FileID from VirtFiles where '
                           'DirID = ?);'),
+           'FILES_CURR_DIR_COUNT': 'select count(*) from Files where DirId = ?;',
+           'FILES_VIRT_COUNT': ('select count(*) from Files where FileID in '
+                                '(select FileID from VirtFiles where DirID = ?);'),
+           'SEARCH_FILES': ('select f.FileName, f.FileDate, f.Pages, f.Size, f.IssueDate, '
+                            'f.Opened, f.Commented, f.FileID, f.DirID, '
+                            'coalesce(f.CommentID, 0), f.ExtID from FileSearch join Files as f '
+                            'on f.FileID = FileSearch.rowid where FileSearch match ?'),
+           'SEARCH_COUNT': ('select count(*) from (select rowid from FileSearch '
+                            'where FileSearch match ? limit ?);'),
+           'SEARCH_TAG': ('select f.FileName || " " || COALESCE(c.BookTitle, "") '
+                          '|| " " || COALESCE(c.Comment, ""), f.FileID from FileSearch '
+                          'join Files as f on f.FileID = FileSearch.rowid left join '
+                          'Comments as c on c.CommentID = f.CommentID where FileSearch '
+                          f'match ? and f.ExtID in ({IN_LIST});'),
+           'SEARCH_LIKE': ('select f.FileName, f.FileDate, f.Pages, f.Size, f.IssueDate, '
+                           'f.Opened, f.Commented, f.FileID, f.DirID, '
+                           'coalesce(f.CommentID, 0), f.ExtID from Files as f left join '
+                           'Comments as c on c.CommentID = f.CommentID where not exists '
+                           '(select * from json_each(?) as w where f.FileName || " " || '
+                           'coalesce(c.BookTitle, "") || " " || coalesce(c.Comment, "") '
+                           "not like '%' || w.value || '%' escape '!');"),
+           'SEARCH_QUEUE': 'select count(*) from SearchQueue;',
+           'HAS_SEARCH': "select count(*) from sqlite_master where name = 'FileSearch';",
            'ISSUE_DATE': 'select IssueDate from Files where FileID = ?;',
            'EXIST_IN_VIRT_DIRS': 'select * from VirtDirs where DirID = ? and ParentID = ?;'
            }
@@ -102,16 +157,17 @@ Insert = {'VIRTUAL_FILE': 'insert into VirtFiles (DirID, FileID) values (?, ?);'
           'AUTHOR_FILE': 'insert into FileAuthor (AuthorID, FileID) values (:author_id, :file_id);',
           'TAGS': 'insert into Tags (Tag) values (:tag);',
           'TAG_FILE': 'insert into FileTag (TagID, FileID) values (:tag_id, :file_id);',
+          'TAG_FILE_IGNORE': 'insert or ignore into FileTag (TagID, FileID) values (?, ?);',
           'COPY_TAGS': ('insert into FileTag (TagID, FileID) select TagID, '
-                        '{} from FileTag where FileID = {};'),
+                        '? from FileTag where FileID = ?;'),
           'COPY_AUTHORS': ('insert into FileAuthor (AuthorID, FileID) select AuthorID, '
-                           '{} from FileAuthor where FileID = {};'),
+                           '? from FileAuthor where FileID = ?;'),
           'COPY_FILE': ('insert into Files (DirID, ExtID, '
                         'FileName, CommentID, FileDate, Pages, Size, '
-                        'IssueDate, Opened, Commented) SELECT {}, {}, '
+                        'IssueDate, Opened, Commented) SELECT ?, '
                         'ExtID, FileName, CommentID, FileDate, Pages, '
                         'Size, IssueDate, Opened, Commented FROM Files '
-                        'where FileID = {};'),
+                        'where FileID = ?;'),
           'DIR': 'insert into Dirs (Path, ParentID, FolderType) values (?, ?, ?);',
           'VIRTUAL_DIR': 'insert into VirtDirs (ParentID, DirID) values (?, ?);',
           }
@@ -145,8 +201,8 @@ Delete = {'EXT': 'delete from Extensions where ExtID = ?;',
                          'from Files where ExtID = Extensions.ExtID);'),
           'FILE_VIRT': 'delete from VirtFiles where DirID = ? and FileID = ?;',
           'VIRT_ALL': 'delete from VirtFiles where FileID = ?;',
-          'COMMENT': ('delete from Comments where CommentID = {} and '
-                      'not exists (select * from Files where CommentID = {});'),
+          'COMMENT': ('delete from Comments where CommentID = :comment_id and '
+                      'not exists (select * from Files where CommentID = :comment_id);'),
           'FILE': 'delete from Files where FileID = ?;',
           'AUTHOR_FILE': 'delete from FileAuthor where AuthorID=:author_id and FileID=:file_id;',
           'AUTHOR': 'delete from Authors where AuthorID=:author_id;',
@@ -154,7 +210,7 @@ Delete = {'EXT': 'delete from Extensions where ExtID = ?;',
           'TAG_FILE': 'delete from FileTag where TagID=:tag_id and FileID=:file_id;',
           'TAG_FILE_BY_FILE': 'delete from FileTag where FileID = ?;',
           'TAG': 'delete from Tags where TagID=:tag_id;',
-          'EMPTY_DIRS': ('delete from Dirs where FolderType = 0 and NOT EXISTS ',
+          'EMPTY_DIRS': ('delete from Dirs where FolderType = 0 and NOT EXISTS '
                          '(select * from Files where DirID = Dirs.DirID);'),
           'VIRT_FROM_DIRS': 'delete from Dirs where DirID = ? and FolderType > 0;',
           'FROM_VIRT_DIRS': 'delete from VirtDirs where ParentID = ? and DirID = ?;',
@@ -162,62 +218,195 @@ Delete = {'EXT': 'delete from Extensions where ExtID = ?;',
           }
 
 
-def generate_adv_sql(param: dict) -> str:
+def in_list(items) -> str:
     """
-    Generate SQL from tuple "Selects['ADV_SELECT']" of length 6
-    according to choices made on "SelOpt" dialog
-    @param param: dictionary with keys:
-    'dir', 'ext', 'file' and 'date'
-    The first three contain lists of IDs for Dirs, Extensions, Files tables
-    as comma separated string
-    The last is tuple of 3 items:
-    @return:
+    List of values as parameter for IN_LIST
+    :param items: iterable of values or IDs as comma separated string
+    :return: JSON array
     """
+    if isinstance(items, str):
+        items = [int(id_) for id_ in items.split(',') if id_]
+    return json.dumps(list(items))
 
+
+def generate_adv_sql(param: dict) -> (str, list):
+    """
+    Compile choices made on "SelOpt" dialog into one SQL statement,
+    conditions from "Selects['ADV_SELECT']" are joined with 'and'
+    @param param: dictionary with keys:
+    'dir' - DirID, files from the dir and all its sub-dirs, None - any dir
+    'ext', 'author' - lists of IDs as comma separated string
+    'tag' - tuple of 2 items: list of tag IDs as comma separated string,
+            True if file should have all tags / False - any of them
+    'date' - tuple of 3 items: use date, number of years before current date,
+             True - date of file / False - the year of book issue
+    missing or empty value - no condition
+    @return: SQL and its parameters
+    """
+    preds = Selects['ADV_SELECT']
     tmp = []
+    params = []
+
+    if param.get('dir') is not None:
+        tmp.append(preds['dir'])
+        params.append(param['dir'])
+
+    if param.get('ext'):
+        tmp.append(preds['ext'])
+        params.append(in_list(param['ext']))
+
+    tags, all_tags = param.get('tag') or ('', False)
+    if tags:
+        ids = in_list(tags)
+        if all_tags:
+            tmp.append(preds['tag_all'])
+            params.extend((ids, ids))
+        else:
+            tmp.append(preds['tag_any'])
+            params.append(ids)
 
-    keys_ = {'dir': 0, 'ext': 1, 'file': 2}
-    for kk in keys_:
-        if param[kk]:
-            tmp.append(Selects['ADV_SELECT'][keys_[kk]].format(param[kk]))
+    if param.get('author'):
+        tmp.append(preds['author'])
+        params.append(in_list(param['author']))
 
-    if param['date'][0]:
+    date = param.get('date')
+    if date and date[0]:
         tt = datetime.date.today()
-        tt = tt.replace(year=tt.year - int(param['date'][1]))
-        if param['date'][2]:
-            tmp.append(Selects['ADV_SELECT'][3].format(tt))
-        else:
-            tmp.append(Selects['ADV_SELECT'][4].format(tt))
+        tt = tt.replace(year=tt.year - int(date[1]))
+        tmp.append(preds['file_date'] if date[2] else preds['issue_date'])
+        params.append(str(tt))
 
-    tt = ' and '.join(tmp)
-    sql = ' where '.join((Selects['ADV_SELECT'][5], tt))
+    sql = Selects['ADV_FILES']
+    if tmp:
+        sql = ' where '.join((sql, ' and '.join(tmp)))
 
-    return sql
+    return sql, params
 
 
 def advanced_selection(param):
-    if not DB_setting['Conn']:
+    """
+    :return: cursor of files selected by conditions, see generate_adv_sql
+    """
+    if not get_connection():
         return ()
 
-    sql = generate_adv_sql(param)
+    sql, params = generate_adv_sql(param)
 
-    if sql:
-        return DB_setting['Conn'].execute(sql)
-    return ()
+    return _execute('ADV_SELECT', sql, params, read=True)
 
 
-def generate_sql(dir_id, level, sql='TREE'):
-    tree_sql = Selects[sql]
-    tmp = (tree_sql[0], tree_sql[1].format(dir_id),
-           tree_sql[2].format(dir_id), tree_sql[3],
-           tree_sql[4].format(level), tree_sql[5])
-    cc = [(0, 2, 3, 5),
-          (0, 1, 3, 5),
-          (0, 2, 3, 4),
-          (0, 1, 3, 4)]
-    i = (level > 0) * 2 + (dir_id > 0)  # 00 = 0, 01 = 1, 10 = 2, 11 = 3
-    sql = ' '.join([tmp[j] for j in cc[i]])
-    return sql
+def search_phrase(text: str, prefix=False) -> str:
+    """
+    Text as FTS5 phrase: double quotes are doubled, no query syntax inside
+    :param prefix: True - last word of phrase may be prefix of word
+    """
+    return ''.join(('"', text.replace('"', '""'), '"*' if prefix else '"'))
+
+
+def search_query(text: str) -> str:
+    """
+    Query for "FileSearch" from text typed by user:
+    files with all words, each word may be prefix
+    """
+    return ' '.join(search_phrase(word, prefix=True) for word in text.split())
+
+
+def quick_search(text: str):
+    """
+    :return: cursor of files found by words of text in file name, title,
+             comment, tags and authors, best matches first if there are
+             not more than RANK_LIMIT of them - ranking needs all matches.
+             Only files already in full-text index are found, the index is
+             updated by sync_search in background job.
+             Without full-text index files with all words in file name,
+             title or comment are found by LIKE
+    """
+    query = search_query(text)
+    if not (query and get_connection()):
+        return ()
+
+    if not has_search():
+        words = [word.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+                 for word in text.split()]
+        return select_other('SEARCH_LIKE', (in_list(words),))
+
+    sql = Selects['SEARCH_FILES']
+    if select_other('SEARCH_COUNT', (query, RANK_LIMIT + 1)).fetchone()[0] <= RANK_LIMIT:
+        sql += ' order by rank'
+    return _execute('SEARCH_FILES', sql, (query,), read=True)
+
+
+def has_search() -> bool:
+    """
+    :return: True if DB has full-text index "FileSearch",
+             it is not created if SQLite is built without FTS5
+    """
+    return bool(select_other('HAS_SEARCH').fetchone()[0])
+
+
+def sync_search() -> int:
+    """
+    Update full-text index with files changed since previous call
+    :return: number of changed files
+    """
+    if not has_search():
+        return 0
+    count = select_other('SEARCH_QUEUE').fetchone()[0]
+    if count:
+        with unit_of_work(writer=True):
+            for sql in SYNC_SEARCH:
+                _execute('SYNC_SEARCH', sql)
+    return count
+
+
+def scan_tags(tags, ext_ids, progress=None) -> (dict, float):
+    """
+    Assign tags to files which have tag in file name, title or comment,
+    found by TagMatcher. If DB has full-text index, only files found by
+    index are matched: the tokenizer ignores punctuation and diacritics,
+    so index finds more files than TagMatcher
+    :param tags: list of (tag, tag ID)
+    :param ext_ids: IDs of extensions of files to scan
+    :param progress: callable(count) - called for each scanned tag by index
+                     or for each file by TagMatcher, may raise to stop scan
+    :return: {tag ID: number of files found}, rows matched per second
+    """
+    exts = in_list(ext_ids)
+    if not has_search():
+        matcher = TagMatcher(tags)
+        pairs = list(matcher.scan(select_other('FILE_INFO', (exts,)), progress))
+        with unit_of_work(writer=True):
+            insert_many('TAG_FILE_IGNORE', pairs)
+        return matcher.found, matcher.get_speed()
+
+    found = {}
+    pairs = []
+    rows_seconds = [0, 0.0]
+    sync_search()
+    for tag, tag_id in tags:
+        if any(char.isalnum() for char in tag):
+            query = '{FileName BookTitle Comment} : ' + search_phrase(tag)
+            rows = select_other('SEARCH_TAG', (query, exts))
+        else:
+            # no words of tag in index
+            rows = select_other('FILE_INFO', (exts,))
+        matcher = TagMatcher([(tag, tag_id)])
+        pairs.extend(matcher.scan(rows))
+        found[tag_id] = matcher.found[tag_id]
+        rows_seconds[0] += matcher.rows
+        rows_seconds[1] += matcher.seconds
+        if progress:
+            progress(1)
+    with unit_of_work(writer=True):
+        insert_many('TAG_FILE_IGNORE', pairs)
+    rows, seconds = rows_seconds
+    return found, rows / seconds if seconds else 0.0
+
+
+def generate_sql(dir_id, level, sql='TREE') -> (str, dict):
+    first = int(dir_id == 0)    # common root itself is not selected
+    last = level + first if level > 0 else None
+    return Selects[sql], {'dir_id': dir_id, 'first': first, 'last': last}
 
 
 def dir_tree_select(dir_id, level):
@@ -227,9 +416,9 @@ def dir_tree_select(dir_id, level):
     :param level: - max level of tree, 0 - all levels
     :return: cursor of directories
     """
-    sql = generate_sql(dir_id, level)
+    sql, params = generate_sql(dir_id, level)
 
-    return DB_setting['Conn'].cursor().execute(sql)
+    return _execute('TREE', sql, params, read=True)
 
 
 def dir_ids_select(dir_id, level):
@@ -239,48 +428,123 @@ def dir_ids_select(dir_id, level):
     :param level: - max level of tree, 0 - all levels
     :return: list of directories ids
     """
-    sql = generate_sql(dir_id, level, sql='DIR_IDS')
+    sql, params = generate_sql(dir_id, level, sql='DIR_IDS')
+
+    return _execute('DIR_IDS', sql, params, read=True)
 
-    return DB_setting['Conn'].cursor().execute(sql)
+
+def _execute(name: str, sql: str, params=(), read: bool = False) -> sqlite3.Cursor:
+    """
+    Execute statement on connection of current thread, collect Stats:
+    number of executions and time of execute call;
+    time of fetching rows from cursor is not included
+    :param name: statement name in Stats
+    :param read: True - select, it is run on reader connection, see get_reader
+    """
+    start = time.perf_counter()
+    try:
+        conn = get_reader() if read else get_connection()
+        return conn.cursor().execute(sql, params)
+    finally:
+        stat = Stats[name]
+        stat[0] += 1
+        stat[1] += time.perf_counter() - start
+
+
+def get_stats() -> dict:
+    """
+    :return: {statement name: (number of executions, seconds)}
+             in descending order of time
+    """
+    return dict(sorted(((name, tuple(stat)) for name, stat in Stats.items()),
+                       key=lambda x: x[1][1], reverse=True))
 
 
 def select_other(sql, params=()):
-    return DB_setting['Conn'].cursor().execute(Selects[sql], params)
+    return _execute('select.' + sql, Selects[sql], params, read=True)
 
 
-def select_other2(sql, params=()):
-    return DB_setting['Conn'].cursor().execute(Selects[sql].format(*params))
+@contextmanager
+def unit_of_work(writer: bool = False):
+    """
+    Statements of insert/update/delete helpers executed within the block
+    make one transaction: it is committed when the outermost block exits,
+    or rolled back on error. Blocks can be nested.
+    Each thread has its own connection, so blocks are counted by threads
+    :param writer: True - block of background job, it runs on the single
+                   writer connection of DB_setting['Pool'] holding write lock
+    """
+    if writer and DB_setting['Pool'] and not _depth():
+        conn, lock = DB_setting['Pool'].writer()
+        with lock:
+            _local.writer = conn
+            try:
+                with unit_of_work():
+                    yield conn
+            finally:
+                _local.writer = None
+        return
+
+    _depth(1)
+    try:
+        yield get_connection()
+    except BaseException:
+        if not _depth(-1):
+            get_connection().rollback()
+        raise
+    if not _depth(-1):
+        get_connection().commit()
+
+
+def _depth(change: int = 0) -> int:
+    """
+    Change depth of unit_of_work blocks of current thread
+    :return: new depth
+    """
+    _local.depth = getattr(_local, 'depth', 0) + change
+    return _local.depth
+
+
+def _commit():
+    """
+    Commit, if not within unit_of_work
+    """
+    if not _depth():
+        get_connection().commit()
 
 
 def insert_other(sql, data):
-    ss = DB_setting['Conn'].cursor().execute(Insert[sql], data)
-    DB_setting['Conn'].commit()
+    ss = _execute('insert.' + sql, Insert[sql], data)
+    _commit()
     return ss.lastrowid
 
 
-def insert_other2(sql, data):
-    ss = DB_setting['Conn'].cursor().execute(Insert[sql].format(*data))
-    DB_setting['Conn'].commit()
-    return ss.lastrowid
+def insert_many(sql, data):
+    """
+    insert rows of data by one executemany call
+    """
+    start = time.perf_counter()
+    try:
+        get_connection().executemany(Insert[sql], data)
+    finally:
+        stat = Stats['insert.' + sql]
+        stat[0] += 1
+        stat[1] += time.perf_counter() - start
+    _commit()
 
 
 def update_other(sql, data):
-    DB_setting['Conn'].cursor().execute(Update[sql], data)
-    DB_setting['Conn'].commit()
+    _execute('update.' + sql, Update[sql], data)
+    _commit()
 
 
 def delete_other(sql, data):
     try:
-        DB_setting['Conn'].cursor().execute(Delete[sql], data)
+        _execute('delete.' + sql, Delete[sql], data)
     except sqlite3.IntegrityError:
         print('utilities.delete_other: sqlite3.IntegrityError')
     else:
-        DB_setting['Conn'].commit()
-
-
-def delete_other2(sql, data):
-    DB_setting['Conn'].cursor().execute(Delete[sql].format(*data))
-    DB_setting['Conn'].commit()
+        _commit()
 
 
 def open_create_db(create, file_name, same_db) -> bool:
@@ -291,21 +555,141 @@ def open_create_db(create, file_name, same_db) -> bool:
     else:
         if Path(file_name).is_file():
             conn = create_connection(file_name)
+            update_db(conn)
         else:
             return False
 
     return True
 
 
-def create_connection(name: str = None) -> sqlite3.Connection:
+class ConnectionPool:
+    """
+    Connections to one DB file, all with the same profile:
+    - one read-write connection per thread, reused by next jobs of thread
+    - one read-only connection per thread for readers
+    - single writer connection shared by background jobs,
+      they are serialized by write_lock
+    """
+
+    def __init__(self, name: str, profile: str = None):
+        self.name = name
+        self.profile = profile
+        self.write_lock = threading.RLock()
+        self._writer = None
+        self._local = threading.local()
+        self._all = []
+        self._all_lock = threading.Lock()
+
+    def _open(self, read_only: bool = False) -> sqlite3.Connection:
+        conn = open_connection(self.name, self.profile, read_only=read_only)
+        with self._all_lock:
+            self._all.append(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        :return: read-write connection of current thread
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        """
+        :return: read-only connection of current thread
+        """
+        conn = getattr(self._local, 'reader', None)
+        if conn is None:
+            conn = self._local.reader = self._open(read_only=True)
+        return conn
+
+    def writer(self) -> (sqlite3.Connection, threading.RLock):
+        """
+        :return: writer connection for background job and lock
+                 the job must hold while it uses connection
+        """
+        with self.write_lock:
+            if self._writer is None:
+                self._writer = self._open()
+        return self._writer, self.write_lock
+
+    def close(self):
+        with self._all_lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+        self._writer = None
+        self._local = threading.local()
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    :return: connection of current thread from DB_setting['Pool'],
+             DB_setting['Conn'] if DB is not opened via pool;
+             within unit_of_work(writer=True) - writer connection of pool
+    """
+    if getattr(_local, 'writer', None):
+        return _local.writer
+    if DB_setting['Pool']:
+        return DB_setting['Pool'].connection()
+    return DB_setting['Conn']
+
+
+def get_reader() -> sqlite3.Connection:
+    """
+    :return: read-only connection of current thread from DB_setting['Pool'],
+             so select does not wait for writer; within unit_of_work -
+             connection of current thread, it sees rows not committed yet
+    """
+    if DB_setting['Pool'] and not _depth():
+        return DB_setting['Pool'].reader()
+    return get_connection()
+
+
+def create_connection(name: str = None, profile: str = None) -> sqlite3.Connection:
+    """
+    Open DB: create pool of connections, previous pool is closed
+    :param name: DB file name, if None - return connection of current thread
+    :param profile: key in PROFILES, DB_setting['Profile'] if None
+    :return: connection of current thread
+    """
     if name is None:
-        return DB_setting['Conn']
+        return get_connection()
 
-    conn = sqlite3.connect(name, check_same_thread=False,
-                           detect_types=DETECT_TYPES)
-    conn.cursor().execute('PRAGMA foreign_keys = ON;')
+    if DB_setting['Pool']:
+        DB_setting['Pool'].close()
+    DB_setting['Pool'] = ConnectionPool(name, profile)
+    conn = DB_setting['Pool'].connection()
 
     DB_setting['Path'] = name
     DB_setting['Conn'] = conn
 
     return conn
+
+
+def open_connection(name: str = None, profile: str = None,
+                    read_only: bool = False, **pragmas) -> sqlite3.Connection:
+    """
+    Open connection with settings of profile, not included in pool
+    :param name: DB file name, DB_setting['Path'] if None
+    :param profile: key in PROFILES, DB_setting['Profile'] if None
+    :param read_only: open in read-only mode
+    :param pragmas: PRAGMAs to override profile ones, e.g. cache_size=-2000
+    """
+    name = name or DB_setting['Path']
+    if read_only:
+        conn = sqlite3.connect(f'{Path(name).absolute().as_uri()}?mode=ro', uri=True,
+                               check_same_thread=False, detect_types=DETECT_TYPES)
+    else:
+        conn = sqlite3.connect(name, check_same_thread=False,
+                               detect_types=DETECT_TYPES)
+    conn.cursor().execute('PRAGMA foreign_keys = ON;')
+    settings = dict(PROFILES[profile or DB_setting['Profile']], **pragmas)
+    if read_only:
+        # journal mode is kept in DB file, can't be changed by reader
+        settings.pop('journal_mode', None)
+    for pragma, value in settings.items():
+        conn.execute(f'PRAGMA {pragma} = {value};')
+
+    return conn
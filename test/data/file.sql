@@ -63,4 +63,119 @@ DirID INTEGER not null,
 FileID INTEGER not null,
 FOREIGN KEY(DirID) REFERENCES Dirs(DirID) ON DELETE CASCADE
 )
+CREATE TABLE DirSnapshot (
+Path TEXT NOT NULL PRIMARY KEY,
+MTime INTEGER,
+Entries INTEGER,
+Ext TEXT
+)
+CREATE TABLE InfoCache (
+Size INTEGER NOT NULL,
+MTime INTEGER NOT NULL,
+Hash TEXT NOT NULL,
+Info TEXT,
+Used INTEGER,
+primary key(Size, MTime, Hash)
+)
 CREATE INDEX Dirs_ParentID ON Dirs(ParentID)
+CREATE INDEX Dirs_Path ON Dirs(Path)
+CREATE INDEX Files_DirID_FileName ON Files(DirID, FileName)
+CREATE INDEX Files_ExtID ON Files(ExtID)
+CREATE INDEX Extensions_Extension ON Extensions(Extension, ExtID)
+CREATE INDEX Authors_Author ON Authors(Author, AuthorID)
+CREATE INDEX Tags_Tag ON Tags(Tag, TagID)
+CREATE INDEX FileTag_TagID ON FileTag(TagID, FileID)
+CREATE INDEX FileAuthor_AuthorID ON FileAuthor(AuthorID, FileID)
+CREATE INDEX VirtFiles_DirID ON VirtFiles(DirID, FileID)
+CREATE INDEX VirtDirs_ParentID ON VirtDirs(ParentID, DirID)
+CREATE TABLE DirClosure (
+Ancestor INTEGER NOT NULL,
+Descendant INTEGER NOT NULL,
+Depth INTEGER NOT NULL,
+primary key(Ancestor, Descendant)
+) WITHOUT ROWID
+CREATE INDEX DirClosure_Descendant ON DirClosure(Descendant, Depth)
+CREATE TRIGGER Dirs_Closure_Insert AFTER INSERT ON Dirs
+BEGIN
+insert or ignore into DirClosure (Ancestor, Descendant, Depth)
+select a.Ancestor, d.Descendant, a.Depth + d.Depth from
+(select NEW.DirID as Ancestor, 0 as Depth union all
+ select Ancestor, Depth + 1 from DirClosure where Descendant = NEW.ParentID) as a,
+(select NEW.DirID as Descendant, 0 as Depth union all
+ select c.Descendant, c.Depth + 1 from Dirs as s join DirClosure as c
+ on c.Ancestor = s.DirID where s.ParentID = NEW.DirID and s.DirID != NEW.DirID) as d;
+END
+CREATE TRIGGER Dirs_Closure_Move AFTER UPDATE OF ParentID ON Dirs
+WHEN OLD.ParentID is not NEW.ParentID
+BEGIN
+delete from DirClosure
+where Descendant in (select Descendant from DirClosure where Ancestor = NEW.DirID)
+and Ancestor not in (select Descendant from DirClosure where Ancestor = NEW.DirID);
+insert or ignore into DirClosure (Ancestor, Descendant, Depth)
+select a.Ancestor, d.Descendant, a.Depth + d.Depth + 1
+from DirClosure as a, DirClosure as d
+where a.Descendant = NEW.ParentID and d.Ancestor = NEW.DirID;
+END
+CREATE TRIGGER Dirs_Closure_Delete AFTER DELETE ON Dirs
+BEGIN
+delete from DirClosure
+where Descendant in (select Descendant from DirClosure where Ancestor = OLD.DirID)
+and Ancestor in (select Ancestor from DirClosure where Descendant = OLD.DirID);
+END
+CREATE VIRTUAL TABLE FileSearch USING fts5(
+FileName, BookTitle, Comment, Tags, Authors,
+tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+)
+CREATE TABLE 'FileSearch_data'(id INTEGER PRIMARY KEY, block BLOB)
+CREATE TABLE 'FileSearch_idx'(segid, term, pgno, PRIMARY KEY(segid, term)) WITHOUT ROWID
+CREATE TABLE 'FileSearch_content'(id INTEGER PRIMARY KEY, c0, c1, c2, c3, c4)
+CREATE TABLE 'FileSearch_docsize'(id INTEGER PRIMARY KEY, sz BLOB)
+CREATE TABLE 'FileSearch_config'(k PRIMARY KEY, v) WITHOUT ROWID
+CREATE TABLE SearchQueue (
+FileID INTEGER NOT NULL PRIMARY KEY
+)
+CREATE INDEX Files_CommentID ON Files(CommentID)
+CREATE TRIGGER Files_Search_Insert AFTER INSERT ON Files
+BEGIN
+insert or ignore into SearchQueue values (NEW.FileID);
+END
+CREATE TRIGGER Files_Search_Update AFTER UPDATE OF FileName, CommentID ON Files
+BEGIN
+insert or ignore into SearchQueue values (NEW.FileID);
+END
+CREATE TRIGGER Files_Search_Delete AFTER DELETE ON Files
+BEGIN
+insert or ignore into SearchQueue values (OLD.FileID);
+END
+CREATE TRIGGER Comments_Search_Update AFTER UPDATE OF Comment, BookTitle ON Comments
+BEGIN
+insert or ignore into SearchQueue select FileID from Files where CommentID = NEW.CommentID;
+END
+CREATE TRIGGER Comments_Search_Delete AFTER DELETE ON Comments
+BEGIN
+insert or ignore into SearchQueue select FileID from Files where CommentID = OLD.CommentID;
+END
+CREATE TRIGGER FileTag_Search_Insert AFTER INSERT ON FileTag
+BEGIN
+insert or ignore into SearchQueue values (NEW.FileID);
+END
+CREATE TRIGGER FileTag_Search_Delete AFTER DELETE ON FileTag
+BEGIN
+insert or ignore into SearchQueue values (OLD.FileID);
+END
+CREATE TRIGGER Tags_Search_Update AFTER UPDATE OF Tag ON Tags
+BEGIN
+insert or ignore into SearchQueue select FileID from FileTag where TagID = NEW.TagID;
+END
+CREATE TRIGGER FileAuthor_Search_Insert AFTER INSERT ON FileAuthor
+BEGIN
+insert or ignore into SearchQueue values (NEW.FileID);
+END
+CREATE TRIGGER FileAuthor_Search_Delete AFTER DELETE ON FileAuthor
+BEGIN
+insert or ignore into SearchQueue values (OLD.FileID);
+END
+CREATE TRIGGER Authors_Search_Update AFTER UPDATE OF Author ON Authors
+BEGIN
+insert or ignore into SearchQueue select FileID from FileAuthor where AuthorID = NEW.AuthorID;
+END
\ No newline at end of file
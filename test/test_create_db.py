@@ -154,3 +154,89 @@ def test_load_data(init_db, expected):
                 if None not in row:  # skip common root record in Dirs table
                     assert tuple(map(str, row)) == it[i]
                     i += 1
+
+
+def test_migrate_db(start_db):
+    """
+    DB created before versioning (user_version = 0) is upgraded in place
+    """
+    con = start_db
+    for obj in db.OBJ_DEFS:
+        con.execute(obj)
+    con.execute("insert into Authors (Author) values ('a'), ('a');")
+    assert con.execute("PRAGMA user_version;").fetchone()[0] == 0
+
+    db.update_db(con)
+    assert con.execute("PRAGMA user_version;").fetchone()[0] == db.SCHEMA_VERSION
+    indexes = {row[0] for row in con.execute(
+        "select name from sqlite_master where type = 'index' and sql != '';")}
+    assert indexes == {"Dirs_ParentID"} | {
+        sql.split()[5] for step in db.MIGRATIONS.values() for sql in step
+        if sql.startswith("CREATE INDEX")}
+    plan = con.execute("explain query plan select AuthorID from Authors "
+                       "where Author = 'a';").fetchone()
+    assert "COVERING INDEX Authors_Author" in plan[-1]
+    assert db.migrate_db(con) == db.SCHEMA_VERSION
+
+
+def closure(con) -> set:
+    """
+    (ancestor, descendant, depth) computed from Dirs.ParentID
+    """
+    parent = dict(con.execute("select DirID, ParentID from Dirs;"))
+    res = set()
+    for dir_id in parent:
+        anc, depth = dir_id, 0
+        while anc in parent and (depth == 0 or anc != dir_id):
+            res.add((anc, dir_id, depth))
+            anc, depth = parent[anc], depth + 1
+    return res
+
+
+def test_dir_closure(start_db):
+    con = start_db
+    db.create_all_objects(con)
+    # children are inserted before their parents too
+    con.executemany("insert into Dirs (DirID, ParentID, Path) values (?, ?, ?);",
+                    [(1, 0, "a"), (3, 2, "a/b/c"), (4, 3, "a/b/c/d"),
+                     (2, 1, "a/b"), (5, 0, "e"), (6, 5, "e/f")])
+    assert set(con.execute("select * from DirClosure;")) == closure(con)
+
+    con.execute("update Dirs set ParentID = 6 where DirID = 3;")
+    assert set(con.execute("select * from DirClosure;")) == closure(con)
+    assert (5, 4, 3) in closure(con)
+
+    con.execute("delete from Dirs where DirID in (2, 6);")
+    assert set(con.execute("select * from DirClosure;")) == closure(con)
+
+
+def test_migrate_dir_closure(start_db):
+    con = start_db
+    for obj in db.OBJ_DEFS:
+        con.execute(obj)
+    con.executemany("insert into Dirs (DirID, ParentID, Path) values (?, ?, ?);",
+                    [(0, None, None), (1, 0, "a"), (2, 1, "a/b"), (3, 2, "a/b/c"),
+                     (4, 0, "d"), (5, 5, "loop")])
+    db.update_db(con)
+    assert set(con.execute("select * from DirClosure;")) == closure(con)
+
+
+def test_migrate_search(start_db):
+    con = start_db
+    for obj in db.OBJ_DEFS:
+        con.execute(obj)
+    con.execute("insert into Comments (CommentID, BookTitle) values (1, 'Deep Learning');")
+    con.executemany("insert into Files (FileID, DirID, FileName, CommentID) values (?, 0, ?, ?);",
+                    [(1, "a.pdf", 1), (2, "b.pdf", None)])
+    con.execute("insert into Authors (AuthorID, Author) values (1, 'Knuth');")
+    con.execute("insert into FileAuthor (FileID, AuthorID) values (2, 1);")
+    db.update_db(con)
+    assert con.execute("select count(*) from FileSearch;").fetchone()[0] == 0
+
+    for sql in db.SYNC_SEARCH:
+        con.execute(sql)
+    assert con.execute("select rowid, FileName, BookTitle, Authors from FileSearch;"
+                       ).fetchall() == [(1, "a.pdf", "Deep Learning", None),
+                                        (2, "b.pdf", None, "Knuth")]
+    assert con.execute("select rowid from FileSearch where FileSearch match 'knu*';"
+                       ).fetchall() == [(2,)]
@@ -0,0 +1,156 @@
+import pytest
+
+import core
+import core.edit_tree_model as etm
+
+# DirID, ParentID, Path, FolderType
+DIRS = (
+    (1, 0, "/a", 0),
+    (2, 1, "/a/b", 0),
+    (3, 2, "/a/b/c", 0),
+    (4, 1, "/a/d", 0),
+    (5, 0, "virt", 1),
+)
+# ParentID, DirID
+VIRT_DIRS = ((5, 2), (2, 5))
+
+
+def tree(item) -> list:
+    return [(it.userData.dir_id, it.userData.parent_id,
+             it.userData.is_virtual, tree(it)) for it in item.children]
+
+
+def test_set_model_data():
+    model = etm.EditTreeModel()
+    model.set_model_data(DIRS, VIRT_DIRS)
+    assert tree(model.rootItem) == [
+        (1, 0, 0, [
+            (2, 1, 0, [
+                (3, 2, 0, []),
+                (5, 2, 2, [])]),            # link to ancestor is not expanded
+            (4, 1, 0, [])]),
+        (5, 0, 1, [
+            (2, 5, 0, [])]),                # subtree of copy is loaded on expand
+    ]
+    assert [len(etm.ALL_ITEMS[i]) for i in range(1, 6)] == [1, 2, 1, 1, 2]
+    orig, link = sorted(etm.ALL_ITEMS[2], key=lambda it: it.parent_id)
+    assert link.path is orig.path and link.itemData == orig.itemData == ("b",)
+    assert not link.fetched and link.has_children
+    for items in etm.ALL_ITEMS.values():
+        for item in items:
+            assert item in item.parent().children
+    assert model.data(model.index(0, 0), etm.Qt.DisplayRole) == "a"
+
+
+def test_set_model_data_unknown_dirs():
+    model = etm.EditTreeModel()
+    model.set_model_data(((1, 7, "/x", 0), (2, 0, "/y", 0)), ((0, 9),))
+    assert tree(model.rootItem) == [(2, 0, 0, [])]
+
+
+@pytest.fixture()
+def dirs_db(init_load_obj, monkeypatch):
+    _, conn = init_load_obj
+    conn.executemany("insert into Dirs (DirID, ParentID, Path, FolderType) "
+                     "values (?, ?, ?, ?);", DIRS)
+    conn.executemany("insert into VirtDirs (ParentID, DirID) values (?, ?);", VIRT_DIRS)
+    monkeypatch.setitem(etm.ut.DB_setting, "Conn", conn)
+    monkeypatch.setitem(etm.ut.DB_setting, "Pool", None)
+    return conn
+
+
+def fetch_all(model, parent=etm.QModelIndex()):
+    if model.canFetchMore(parent):
+        model.fetchMore(parent)
+    for row in range(model.rowCount(parent)):
+        fetch_all(model, model.index(row, 0, parent))
+
+
+def test_lazy_model(dirs_db):
+    model = etm.EditTreeModel(lazy=True)
+    assert [it.userData.dir_id for it in model.rootItem.children] == [1, 5]
+    assert len(etm.ALL_ITEMS) == 2
+    idx = model.index(0, 0)
+    assert model.rowCount(idx) == 0
+    assert model.hasChildren(idx)
+    assert model.canFetchMore(idx)
+    fetch_all(model)
+    assert not model.hasChildren(model.index(1, 0, idx))   # /a/d
+
+    eager = etm.EditTreeModel()
+    eager.set_model_data(DIRS, VIRT_DIRS)
+    fetch_all(eager)
+    assert tree(model.rootItem) == tree(eager.rootItem)
+
+
+def test_lazy_append_child(dirs_db):
+    model = etm.EditTreeModel(lazy=True)
+    dirs_db.execute("insert into Dirs (DirID, ParentID, Path, FolderType) "
+                    "values (6, 1, '/a/e', 0);")
+    idx = model.index(0, 0)
+    model.append_child(etm.EditTreeItem(("e",), (6, 1, 0, "/a/e")), idx)
+    assert [it.userData.dir_id for it in model.rootItem.children[0].children] == [2, 4, 6]
+
+
+def test_move_copy_folder(dirs_db):
+    model = etm.EditTreeModel()
+    model.set_model_data(DIRS, VIRT_DIRS)
+    a_idx = model.index(0, 0)
+    d_idx = model.index(1, 0, a_idx)                        # /a/d
+    model._copy_folder(d_idx, model.index(1, 0))            # to virt
+    virt = model.rootItem.children[1]
+    assert [it.dir_id for it in virt.children] == [2, 4]
+    assert virt.children[1].path is d_idx.internalPointer().path
+    assert len(etm.ALL_ITEMS[4]) == 2
+    assert dirs_db.execute("select count(*) from VirtDirs where "
+                           "ParentID = 5 and DirID = 4;").fetchone()[0] == 1
+
+    b_idx = model.index(0, 0, a_idx)
+    c_item = model.index(0, 0, b_idx).internalPointer()
+    model._move_folder(model.index(0, 0, b_idx), model.index(1, 0, a_idx))
+    assert [it.dir_id for it in model.rootItem.children[0].children[1].children] == [3]
+    assert c_item.parent_id == 4
+    assert etm.ALL_ITEMS[3] == [c_item]
+    assert dirs_db.execute("select ParentID from Dirs where DirID = 3;").fetchone()[0] == 4
+
+    model._move_folder(a_idx, model.index(0, 0, a_idx))     # into own subtree
+    assert [it.dir_id for it in model.rootItem.children] == [1, 5]
+    check_rows(model.rootItem)
+
+
+def check_rows(item):
+    for row, child in enumerate(item.children):
+        assert child.row() == child.childNumber() == row
+        check_rows(child)
+
+
+def test_row_positions(dirs_db):
+    model = etm.EditTreeModel()
+    model.set_model_data(DIRS, VIRT_DIRS)
+    check_rows(model.rootItem)
+
+    root = model.rootItem
+    for i in range(6, 11):
+        root.appendChild(etm.EditTreeItem((str(i),), (i, 0, 0, str(i))))
+    root.removeChildren(1, 2)
+    assert [it.userData.dir_id for it in root.children] == [1, 7, 8, 9, 10]
+    check_rows(root)
+
+    idx = model.index(0, 0)
+    registered = sum(len(items) for items in etm.ALL_ITEMS.values())
+    model.create_new_parent(idx, (11, "group", 0, 3), [etm.QPersistentModelIndex(
+        model.index(row, 0)) for row in (1, 3)])
+    assert [it.userData.dir_id for it in root.children] == [1, 8, 10, 11]
+    # moved items are registered once, new parent is added
+    assert sum(len(items) for items in etm.ALL_ITEMS.values()) == registered + 1
+    assert [len(etm.ALL_ITEMS[i]) for i in (7, 9, 11)] == [1, 1, 1]
+    assert [it.parent_id for it in root.children[3].children] == [11, 11]
+    check_rows(root)
+    for row in range(model.rowCount()):
+        idx = model.index(row, 0)
+        for child_row in range(model.rowCount(idx)):
+            assert model.parent(model.index(child_row, 0, idx)) == idx
+
+    lazy = etm.EditTreeModel(lazy=True)
+    fetch_all(lazy)
+    check_rows(lazy.rootItem)
@@ -1,7 +1,10 @@
+from collections import namedtuple
 import pytest
 from pathlib import Path
 import sqlite3
 
+import PyPDF2
+
 import core
 import core.file_info as lf  # lf ~ fiLe_inFo
 
@@ -91,9 +94,118 @@ def test_insert_author(init_load_obj, files, authors_dict):
                 "select Author from Authors where AuthorID = ?", (str(a_id),)
             ).fetchone()
             assert aa[0] == author
-            fi.link_file_author(f_id, a_id)
-            fa = curs.execute(lf.FILE_AUTHOR_LINKED, (str(f_id), str(a_id))).fetchone()
-            assert fa == (f_id, a_id)
+        fi.insert_authors(f_id, authors)
+        fi.flush_authors()
+        linked = curs.execute("select Author from Authors join FileAuthor using (AuthorID) "
+                              "where FileID = ?;", (f_id,)).fetchall()
+        assert sorted(row[0] for row in linked) == sorted(authors)
+
+
+def test_save_authors_batch(init_load_obj):
+    ld, conn = init_load_obj
+    f_ids = load_files(conn, ("dir1/file1.pdf", "dir1/file2.pdf"))
+    conn.execute("insert into Authors (Author) values ('author1');")
+    file_ = namedtuple("f", "file_id full_name comment_id issue_date pages")
+    files = [file_(f_ids["file1"], "", None, None, 0),
+             file_(f_ids["file2"], "", None, None, 0)]
+    infos = [([10, "2019-01-01", 1, "author1, Author2 and author1", "2019-01-01", "T1"], ()),
+             ([20, "2019-01-01", 2, "Author2; author3", "2019-01-01", "T2"], ())]
+    fi = lf.FileInfo(set(), conn, batch_size=1)
+    fi.save_files(files, infos)
+
+    authors = dict(conn.execute("select Author, AuthorID from Authors;"))
+    assert sorted(authors) == ["Author2", "author1", "author3"]
+    links = set(conn.execute("select FileID, AuthorID from FileAuthor;"))
+    assert links == {(f_ids["file1"], authors["author1"]),
+                     (f_ids["file1"], authors["Author2"]),
+                     (f_ids["file2"], authors["Author2"]),
+                     (f_ids["file2"], authors["author3"])}
+    assert fi.file_authors == []
+
+
+def test_save_files_no_transaction_while_extract(init_load_obj):
+    ld, conn = init_load_obj
+    f_ids = load_files(conn, ("dir1/file1.pdf", "dir1/file2.pdf", "dir1/file3.pdf"))
+    file_ = namedtuple("f", "file_id full_name comment_id issue_date pages")
+    files = [file_(f_ids[name], "", None, None, 0) for name in ("file1", "file2", "file3")]
+    conn.commit()
+    in_transaction = []
+
+    def infos():
+        for i, _ in enumerate(files):
+            # info of next file is waited for
+            in_transaction.append(conn.in_transaction)
+            yield [i, "2019-01-01", 1, "author", "2019-01-01", "T"], ()
+
+    fi = lf.FileInfo(set(), conn, batch_size=2)
+    fi.save_files(files, infos())
+    assert in_transaction == [False] * 3
+    assert not conn.in_transaction
+    assert conn.execute("select count(*) from FileAuthor;").fetchone()[0] == 3
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_update_files(init_load_obj, tmp_path, workers):
+    ld, conn = init_load_obj
+    names = ("a.txt", "b.py", "c.doc")
+    for name in names:
+        (tmp_path / name).write_text(name * 10)
+    dir_id, _ = ld.insert_dir(tmp_path)
+    for name in names:
+        ld.insert_file(dir_id, tmp_path / name)
+
+    fi = lf.FileInfo({str(dir_id)}, conn, workers=workers, batch_size=2)
+    fi.update_files()
+    for name, size, date, comment_id in conn.execute(
+        "select FileName, Size, FileDate, CommentID from Files;"
+    ):
+        info, _ = lf.extract_info(tmp_path / name)
+        assert (size, str(date)) == (len(name) * 10, info[1])
+        assert comment_id is None
+
+
+def test_info_cache(init_load_obj, tmp_path):
+    ld, conn = init_load_obj
+    writer = PyPDF2.PdfFileWriter()
+    writer.addBlankPage(100, 100)
+    writer.addMetadata({"/Title": "cached", "/CreationDate": "D:20190217"})
+    with open(tmp_path / "a.pdf", "wb") as fl:
+        writer.write(fl)
+    dir_id, _ = ld.insert_dir(tmp_path)
+    ld.insert_file(dir_id, tmp_path / "a.pdf")
+
+    fi = lf.FileInfo({str(dir_id)}, conn, workers=1)
+    fi.update_files()
+    assert fi.cache.get_stats() == (0, 1)
+
+    conn.execute("update Files set Pages = 0, CommentID = null;")
+    fi = lf.FileInfo({str(dir_id)}, conn, workers=1)
+    fi.update_files()
+    assert fi.cache.get_stats() == (1, 0)
+    pages, title = conn.execute(
+        "select Pages, BookTitle from Files join Comments on "
+        "Files.CommentID = Comments.CommentID;").fetchone()
+    assert (pages, title) == (1, "cached")
+
+    cache = lf.InfoCache(conn, limit=0)
+    cache.flush()
+    assert conn.execute("select count(*) from InfoCache;").fetchone()[0] == 0
+
+
+def test_info_cache_not_read(init_load_obj, tmp_path, monkeypatch):
+    ld, conn = init_load_obj
+    monkeypatch.setattr(lf, "pypdf2_info", lambda file_: list(lf.NO_PDF_INFO))
+    (tmp_path / "bad.pdf").write_bytes(b"not a pdf")
+    dir_id, _ = ld.insert_dir(tmp_path)
+    ld.insert_file(dir_id, tmp_path / "bad.pdf")
+
+    for _ in range(2):
+        fi = lf.FileInfo({str(dir_id)}, conn, workers=1)
+        fi.update_files()
+        # failed extraction is not cached, file is read again
+        assert fi.cache.get_stats() == (0, 1)
+    assert conn.execute("select count(*) from InfoCache;").fetchone()[0] == 0
+
 
 """ 
 def test_get_file_info():
@@ -0,0 +1,203 @@
+import threading
+
+import pytest
+from PyQt5.QtCore import QCoreApplication
+
+import src.core.utilities
+from core import jobs
+from core.file_info import LoadFiles
+
+
+class CountJob(jobs.Job):
+    def __init__(self, kind=jobs.CLEANUP, items=10, stop_at=None, log=None):
+        super().__init__(kind)
+        self.total = items
+        self.stop_at = stop_at
+        self.log = log
+
+    def work(self):
+        if self.log is not None:
+            self.log.append(self.kind)
+        for i in range(self.total):
+            if i == self.stop_at:
+                self.cancel()
+            self.step()
+
+
+class BlockJob(jobs.Job):
+    def __init__(self):
+        super().__init__(jobs.TAG_SCAN, priority=10)
+        self.release = threading.Event()
+
+    def work(self):
+        self.release.wait(10)
+
+
+class CoverJob(BlockJob):
+    def __init__(self):
+        super().__init__()
+        self.running = threading.Event()
+
+    def work(self):
+        self.running.set()
+        super().work()
+
+    def covers(self, job):
+        return isinstance(job, CoverJob)
+
+
+@pytest.fixture()
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+@pytest.fixture()
+def main_conn(init_load_obj, monkeypatch):
+    _, conn = init_load_obj
+    monkeypatch.setitem(jobs.ut.DB_setting, "Conn", conn)
+    monkeypatch.setitem(jobs.ut.DB_setting, "Pool", None)
+    return conn
+
+
+@pytest.fixture()
+def pool_conn(tmp_path, monkeypatch):
+    # DB opened the way gov_files opens it
+    ut = src.core.utilities
+    monkeypatch.setitem(ut.DB_setting, "Conn", None)
+    monkeypatch.setitem(ut.DB_setting, "Pool", None)
+    conn = ut.create_connection(str(tmp_path / "file.db"))
+    ut.create_all_objects(conn)
+    yield conn
+    ut.DB_setting["Pool"].close()
+
+
+def finish(app, scheduler):
+    assert scheduler.wait(10000)
+    app.processEvents()
+
+
+def test_job_progress():
+    job = CountJob()
+    done = []
+    job.job_signal.done.connect(done.append)
+    job.run()
+    assert done == [job]
+    assert (job.state, job.count) == (jobs.DONE, 10)
+    assert job.rate() > 0
+    assert job.eta() == 0
+    assert job.message().startswith("cleanup: 10 of 10 files")
+
+
+def test_job_cancel():
+    job = CountJob(stop_at=5)
+    job.run()
+    assert (job.state, job.count) == (jobs.CANCELLED, 6)
+
+    job = CountJob()
+    job.cancel()
+    job.run()
+    assert (job.state, job.count) == (jobs.CANCELLED, 0)
+
+
+def test_job_failed():
+    job = CountJob(items=None)
+    job.run()
+    assert job.state == jobs.FAILED
+    assert isinstance(job.error, TypeError)
+
+
+def test_priority(app):
+    scheduler = jobs.JobScheduler()
+    blocker = scheduler.submit(BlockJob())
+    log = []
+    for kind in (jobs.CLEANUP, jobs.EXTRACT, jobs.TAG_SCAN, jobs.SCAN):
+        scheduler.submit(CountJob(kind, log=log))
+    blocker.release.set()
+    finish(app, scheduler)
+    assert log == [jobs.TAG_SCAN, jobs.SCAN, jobs.EXTRACT, jobs.CLEANUP]
+    assert scheduler.jobs == []
+
+
+def test_coalesce_scans(app, main_conn, tmp_path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "a" / "b" / "x.pdf").write_text("x")
+    (tmp_path / "c.pdf").write_text("c")
+
+    def scan(path_, ext_="pdf"):
+        return LoadFiles(str(path_), ext_, main_conn, rescan=True)
+
+    scheduler = jobs.JobScheduler()
+    blocker = scheduler.submit(BlockJob())
+    sub = scan(tmp_path / "a")
+    assert scheduler.submit(sub) is sub
+    # sub-dir of pending scan
+    sub_sub = scan(tmp_path / "a" / "b")
+    assert scheduler.submit(sub_sub) is sub
+    assert sub_sub.state == jobs.COALESCED
+    other_ext = scheduler.submit(scan(tmp_path / "a", "txt"))
+    # parent dir: pending scan of sub-dir is taken from queue
+    root = scheduler.submit(scan(tmp_path))
+    assert sub.state == jobs.COALESCED
+    assert scheduler.jobs == [blocker, other_ext, root]
+
+    scheduler.cancel(other_ext)
+    assert other_ext.state == jobs.CANCELLED
+    diffs = []
+    root.signal.rescanned.connect(diffs.append)
+    blocker.release.set()
+    finish(app, scheduler)
+    assert root.state == jobs.DONE
+    assert root.count > 0
+    assert root.load_stats[0] == 5      # 3 dirs and 2 files
+    assert len(diffs) == 1 and len(diffs[0].added) == 2
+    assert scheduler.jobs == []
+
+
+def test_no_coalesce_into_running(app):
+    scheduler = jobs.JobScheduler(threads=1)
+    running = scheduler.submit(CoverJob())
+    assert running.running.wait(10)
+    # running job may have done the work already
+    pending = CoverJob()
+    assert scheduler.submit(pending) is pending
+    covered = CoverJob()
+    assert scheduler.submit(covered) is pending
+    assert covered.state == jobs.COALESCED
+    running.release.set()
+    pending.release.set()
+    finish(app, scheduler)
+    assert (running.state, pending.state) == (jobs.DONE, jobs.DONE)
+
+
+def test_tag_scan_job(main_conn):
+    conn = main_conn
+    conn.execute("insert into Extensions (ExtID, Extension) values (1, 'pdf');")
+    conn.executemany("insert into Files (FileID, DirID, ExtID, FileName) values (?, 0, 1, ?);",
+                     [(1, "python book.pdf"), (2, "x.pdf")])
+    conn.execute("insert into Tags (TagID, Tag) values (1, 'Python');")
+    job = jobs.TagScanJob([("Python", 1)], [1])
+    job.run()
+    assert job.state == jobs.DONE
+    assert job.found == {1: 1}
+    # new tag of file changes its index row
+    assert conn.execute("select FileID from SearchQueue;").fetchall() == [(1,)]
+
+    conn.execute("update Files set FileName = 'other.pdf' where FileID = 1;")
+    job = jobs.CleanupJob()
+    assert job.covers(jobs.CleanupJob())
+    job.run()
+    assert (job.state, job.count) == (jobs.DONE, 1)
+    assert [row[7] for row in jobs.ut.quick_search("other")] == [1]
+
+
+def test_job_uses_opened_db(pool_conn):
+    assert jobs.ut is src.core.utilities
+    pool_conn.execute("insert into Extensions (ExtID, Extension) values (1, 'pdf');")
+    pool_conn.execute("insert into Files (FileID, DirID, ExtID, FileName) "
+                      "values (1, 0, 1, 'python book.pdf');")
+    pool_conn.execute("insert into Tags (TagID, Tag) values (1, 'Python');")
+    pool_conn.commit()
+    job = jobs.TagScanJob([("Python", 1)], [1])
+    job.run()
+    assert job.state == jobs.DONE, job.error
+    assert job.found == {1: 1}
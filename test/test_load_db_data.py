@@ -1,3 +1,6 @@
+import os
+import shutil
+
 import pytest
 from pathlib import Path
 import sqlite3
@@ -81,6 +84,22 @@ def test_yield_files(expected_files, root_data_path):
     assert count > 0
 
 
+@pytest.mark.parametrize("workers", [1, 4])
+def test_scan_files(expected_files, root_data_path, workers):
+    ext = expected_files[1]
+    entries = list(ld.scan_files(root_data_path, ext, workers, queue_size=2))
+    assert sorted(entry.name for entry in entries) == sorted(expected_files[0])
+    for entry in entries:
+        st = Path(entry.dir, entry.name).stat()
+        assert (entry.size, entry.mtime) == (st.st_size, st.st_mtime)
+
+
+def test_scan_files_stop_early(root_data_path):
+    files = ld.scan_files(root_data_path, "*", queue_size=1)
+    assert next(files).name
+    files.close()
+
+
 # @pytest.mark.skip(reason="the test directory doesn't exist")
 @pytest.mark.parametrize("child, ext, expect",
     [
@@ -223,6 +242,23 @@ def test_search_closest_parent(db_with_loaded_data):
         assert parent == Path(dirs[1]), f"parent {parent} is found; expected {dirs[1]}"
 
 
+def test_search_closest_parent_index(db_with_loaded_data):
+    """
+    in-memory dir index must give the same result as SQL queries
+    """
+    load_d, dirs = db_with_loaded_data
+    expected = load_d.search_closest_parent(Path(dirs[0]))
+    load_d.load_dir_index()
+    assert load_d.search_closest_parent(Path(dirs[0])) == expected
+
+
+def test_dir_index_updated_by_insert_dir(init_load_obj):
+    load_d, conn_d = init_load_obj
+    load_d.load_dir_index()
+    dir_id, _ = load_d.insert_dir(Path("dir1/dir2"))
+    assert load_d.search_closest_parent(Path("dir1/dir2/dir3")) == (dir_id, Path("dir1/dir2"))
+
+
 insert_file_data = [
     (
         (  # dirs
@@ -317,7 +353,7 @@ child_parent = [  # 'insert_to_db, search_for_parent'
             ("dir2/dir22", ""),
             ("dir2/dir21/dir212", "dir2/dir21"),
         ),
-        (  # 2) (parameter of find_old_parent_id method, expected found child, if assertion should fail)
+        (  # 2) new dirs inserted between dirs of 1): (dir, child, _)
             ("dir1", None, False),  # search for 'dir1', expected parent '' - root
             ("dir2/dir21/dir211", None, False),
             ("dir2", "dir2/dir21", False),
@@ -335,16 +371,6 @@ def child_parent_fixture(init_load_obj, request):
     return loads, conn, dir_ids, request.param[1]
 
 
-def test_find_old_parent_id(child_parent_fixture):
-    o_load, conn, dir_ids, dir_parent = child_parent_fixture
-    for dir_ in dir_parent:
-        res = o_load.find_old_parent_id(Path(dir_[0]))
-        if dir_[2]:
-            assert not res == dir_ids[dir_[1]][1], f"{dir_[0]} must not be parent for {res}"
-        else:
-            assert res == dir_ids[dir_[1]][1], f"{dir_[0]} must be parent for {res}"
-
-
 def insert_dir_in_test(o_load: ld.LoadDBData, conn: sqlite3.Connection, path: Path):
     idx, parent_path = o_load.search_closest_parent(path)
     if parent_path == path:
@@ -370,3 +396,170 @@ def test_change_parent(child_parent_fixture):
             for cc in curs:
                 assert str(cc[1]).startswith(dir_[0]), f"child path must start with {dir_[0]}"
                 assert cc[0] != cc[3], "child can't be parent to itself"
+
+
+def test_change_parent_not_sibling(init_load_obj):
+    """
+    dir "a/bc" is not a child of new dir "a/b", "_" is not wildcard
+    """
+    load_d, conn_d = init_load_obj
+    a_id, _ = load_d.insert_dir(Path("a"))
+    for path_ in ("a/bc", "a/b/c", "a/xyz", "a/x_y/z"):
+        load_d.insert_dir(Path(path_))
+    for path_, child in (("a/b", "a/b/c"), ("a/x_y", "a/x_y/z")):
+        new_id, _ = load_d.insert_dir(Path(path_))
+        children = conn_d.execute("select Path from Dirs where ParentID = ?;", (new_id,))
+        assert [row[0] for row in children] == [str(Path(child))]
+    parents = dict(conn_d.execute("select Path, ParentID from Dirs;"))
+    assert parents[str(Path("a/bc"))] == parents[str(Path("a/xyz"))] == a_id
+
+
+@pytest.mark.parametrize("batch_size", [1, 5, 1000])
+def test_bulk_load_same_as_load_data(init_load_obj, root_data_path, batch_size):
+    """
+    bulk loading must save the same files as LoadDBData.load_data
+    """
+    load_d, conn_d = init_load_obj
+    load_d.load_data(root_data_path, "*")
+    expected = set(conn_d.execute(
+        "select d.Path, f.FileName from Files f, Dirs d where f.DirID = d.DirID;"
+    ))
+
+    conn_b = sqlite3.connect(":memory:")
+    db.create_all_objects(conn_b)
+    bulk = ld.BulkLoadDBData(conn_b, batch_size)
+    bulk.load_data(root_data_path, "*")
+    loaded = set(conn_b.execute(
+        "select d.Path, f.FileName from Files f, Dirs d where f.DirID = d.DirID;"
+    ))
+    assert loaded == expected
+    assert bulk.get_updated_dirs() == load_d.get_updated_dirs()
+
+
+def test_bulk_load_commits(init_load_obj, root_data_path):
+    """
+    one commit per batch, files are not inserted twice on reload
+    """
+    load_d, conn_d = init_load_obj
+    bulk = ld.BulkLoadDBData(conn_d, batch_size=5)
+    bulk.load_data(root_data_path, "*")
+    rows, commits = bulk.get_load_stats()
+    files = conn_d.execute("select count(*) from Files;").fetchone()[0]
+    assert files == len(FILE_LIST)
+    assert commits == files // 5 + 1
+    assert rows > files   # dirs and extensions are counted too
+
+    again = ld.BulkLoadDBData(conn_d, batch_size=5)
+    again.load_data(root_data_path, "*")
+    assert again.get_load_stats() == (0, 1)
+    assert conn_d.execute("select count(*) from Files;").fetchone()[0] == files
+
+
+def test_no_transaction_while_scan(init_load_obj, tmp_path):
+    """
+    new dirs and extensions are written with the batch,
+    write transaction is not open while files are scanned
+    """
+    load_d, conn_d = init_load_obj
+    for name in ("a/f1.pdf", "a/b/f2.pdf", "c/f3.txt"):
+        file = tmp_path / name
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text(name)
+    for loader in (ld.BulkLoadDBData(conn_d, workers=1), ld.RescanDBData(conn_d)):
+        in_transaction = []
+        loader.progress = lambda _: in_transaction.append(conn_d.in_transaction)
+        if isinstance(loader, ld.RescanDBData):
+            (tmp_path / "a/f4.pdf").write_text("new")
+            os.utime(tmp_path / "a", (2e9, 2e9))
+            assert len(loader.rescan(tmp_path, ("pdf",)).added) == 1
+        else:
+            loader.load_data(tmp_path, "pdf")
+        assert in_transaction and not any(in_transaction)
+        assert not conn_d.in_transaction
+    assert conn_d.execute("select count(*) from Files;").fetchone()[0] == 3
+
+
+def test_rescan(init_load_obj, tmp_path):
+    """
+    only changed directories are compared with DB on rescan
+    """
+    load_d, conn_d = init_load_obj
+    for name in ("a/f1.pdf", "a/f2.pdf", "b/f3.pdf", "b/c/f4.txt"):
+        file = tmp_path / name
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text(name)
+
+    diff = ld.RescanDBData(conn_d).rescan(tmp_path, ("pdf",))
+    assert len(diff.added) == 3
+    assert not diff.removed and not diff.modified
+
+    diff = ld.RescanDBData(conn_d).rescan(tmp_path, ("pdf",))
+    assert diff == (set(), set(), set())
+
+    ids = dict(conn_d.execute("select FileName, FileID from Files;"))
+    (tmp_path / "a/f1.pdf").unlink()
+    (tmp_path / "a/f2.pdf").write_text("longer content")
+    (tmp_path / "b/f5.pdf").write_text("new")
+    os.utime(tmp_path / "a/f2.pdf", (1e9, 1e9))
+    os.utime(tmp_path / "a", (2e9, 2e9))
+    rescan = ld.RescanDBData(conn_d)
+    diff = rescan.rescan(tmp_path, ("pdf",))
+    assert diff.removed == {ids["f1.pdf"]}
+    assert diff.modified == {ids["f2.pdf"]}
+    assert len(diff.added) == 1
+    assert rescan.get_updated_dirs()
+
+    shutil.rmtree(tmp_path / "b")
+    diff = ld.RescanDBData(conn_d).rescan(tmp_path, ("pdf",))
+    assert ids["f3.pdf"] in diff.removed
+    assert len(diff.removed) == 2
+
+
+def test_rescan_not_readable_dir(init_load_obj, tmp_path, monkeypatch):
+    """
+    files of directory which can't be read now are not reported as removed
+    """
+    load_d, conn_d = init_load_obj
+    for name in ("a/f1.pdf", "a/b/f2.pdf", "ab/f3.pdf"):
+        file = tmp_path / name
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text(name)
+    diff = ld.RescanDBData(conn_d).rescan(tmp_path, ("pdf",))
+    assert len(diff.added) == 3
+
+    scandir = os.scandir
+
+    def not_readable(path_):
+        if os.fspath(path_) == str(tmp_path / "a"):
+            raise PermissionError(path_)
+        return scandir(path_)
+
+    monkeypatch.setattr(ld.os, "scandir", not_readable)
+    (tmp_path / "ab/f3.pdf").unlink()
+    os.utime(tmp_path / "ab", (2e9, 2e9))
+    diff = ld.RescanDBData(conn_d).rescan(tmp_path, ("pdf",))
+    assert len(diff.removed) == 1
+
+    monkeypatch.setattr(ld.os, "scandir", scandir)
+    (tmp_path / "a/f1.pdf").unlink()
+    os.utime(tmp_path / "a", (2e9, 2e9))
+    diff = ld.RescanDBData(conn_d).rescan(tmp_path, ("pdf",))
+    assert len(diff.removed) == 1
+
+
+def test_rescan_only_own_snapshots(init_load_obj, tmp_path):
+    """
+    snapshots of dirs out of rescanned one are not taken, "_" is not wildcard
+    """
+    load_d, conn_d = init_load_obj
+    for name in ("a_b/f1.pdf", "aXb/c/f2.pdf", "A_B/c/f3.pdf"):
+        file = tmp_path / name
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text(name)
+    diff = ld.RescanDBData(conn_d).rescan(tmp_path, ("pdf",))
+    assert len(diff.added) == 3
+
+    rescan = ld.RescanDBData(conn_d)
+    diff = rescan.rescan(tmp_path / "a_b", ("pdf",))
+    assert diff == (set(), set(), set())
+    assert set(rescan.snapshots) == {str(tmp_path / "a_b")}
@@ -0,0 +1,105 @@
+import pytest
+import zlib
+
+import PyPDF2
+
+import core
+import core.pdf_header as ph
+import core.file_info as lf
+
+
+METADATA = {
+    "/Author": "author1, Author Two",
+    "/Title": "Title é€",
+    "/CreationDate": "D:20190217070243-00'00'",
+}
+
+
+def write_pdf(file, pages, metadata=None, password=None):
+    writer = PyPDF2.PdfFileWriter()
+    for _ in range(pages):
+        writer.addBlankPage(100, 100)
+    if metadata:
+        writer.addMetadata(metadata)
+    if password is not None:
+        writer.encrypt(password)
+    with open(file, "wb") as fl:
+        writer.write(fl)
+
+
+def xref_stream_pdf() -> bytes:
+    """
+    PDF 1.5 style file: cross-reference stream with PNG predictor,
+    catalog and document info inside object stream
+    """
+    head = b"%PDF-1.5\n"
+    pages = b"2 0 obj\n<< /Type /Pages /Kids [] /Count 7 >>\nendobj\n"
+    objects = b"<< /Type /Catalog /Pages 2 0 R >> <</Title (Str\\(ea\\)m) /Author <FEFF0041>>>"
+    first = b"1 0 3 34 "
+    objstm_data = first + objects
+    objstm_body = zlib.compress(objstm_data)
+    objstm = (b"4 0 obj\n<< /Type /ObjStm /N 2 /First %d /Length %d "
+              b"/Filter /FlateDecode >>\nstream\n" % (len(first), len(objstm_body))
+              + objstm_body + b"\nendstream\nendobj\n")
+    pages_off = len(head)
+    objstm_off = pages_off + len(pages)
+    xref_off = objstm_off + len(objstm)
+    rows = [(0, 0, 0), (2, 4, 0), (1, pages_off, 0), (2, 4, 1),
+            (1, objstm_off, 0), (1, xref_off, 0)]
+    raw, prev = b"", bytes(4)
+    for row in rows:
+        cur = bytes((row[0],)) + row[1].to_bytes(2, "big") + bytes((row[2],))
+        raw += b"\x02" + bytes((c - p) & 0xff for c, p in zip(cur, prev))
+        prev = cur
+    body = zlib.compress(raw)
+    xref = (b"5 0 obj\n<< /Type /XRef /Size 6 /W [1 2 1] /Root 1 0 R /Info 3 0 R "
+            b"/Filter /FlateDecode /DecodeParms << /Columns 4 /Predictor 12 >> "
+            b"/Length %d >>\nstream\n" % len(body) + body + b"\nendstream\nendobj\n")
+    return head + pages + objstm + xref + b"startxref\n%d\n%%%%EOF\n" % xref_off
+
+
+def test_read_pdf_header(tmp_path):
+    file = tmp_path / "book.pdf"
+    write_pdf(file, 3, METADATA)
+    pages, info = ph.read_pdf_header(file)
+    assert pages == 3
+    for key, value in METADATA.items():
+        assert info[key] == value
+    assert lf.pypdf2_info(file) == [pages] + lf.pdf_info_list(info)
+
+
+def test_read_pdf_header_no_info(tmp_path):
+    file = tmp_path / "book.pdf"
+    write_pdf(file, 2)
+    pages, info = ph.read_pdf_header(file)
+    assert pages == 2
+    assert lf.pypdf2_info(file) == [pages] + lf.pdf_info_list(info)
+
+
+def test_read_xref_stream(tmp_path):
+    file = tmp_path / "book.pdf"
+    file.write_bytes(xref_stream_pdf())
+    pages, info = ph.read_pdf_header(file)
+    assert pages == 7
+    assert info == {"/Title": "Str(ea)m", "/Author": "A"}
+
+
+@pytest.mark.parametrize("content", [b"", b"not a pdf", b"%PDF-1.4\nstartxref\n5\n%%EOF"])
+def test_read_pdf_header_error(tmp_path, content):
+    file = tmp_path / "broken.pdf"
+    file.write_bytes(content)
+    with pytest.raises(ph.PdfHeaderError):
+        ph.read_pdf_header(file)
+
+
+def test_reader_stats(tmp_path, init_load_obj):
+    _, conn = init_load_obj
+    write_pdf(tmp_path / "fast.pdf", 1, METADATA)
+    write_pdf(tmp_path / "encrypted.pdf", 1, METADATA, password="")
+    fi = lf.FileInfo(set(), conn)
+    fi.get_file_info(tmp_path / "fast.pdf")
+    assert fi.file_info[2:] == [1, METADATA["/Author"], "2019-02-17", METADATA["/Title"]]
+    fi.get_file_info(tmp_path / "encrypted.pdf")
+    stats = fi.get_reader_stats()
+    assert stats[lf.FAST_READER][0] == 1
+    assert stats[lf.PYPDF2_READER][0] == 1
@@ -0,0 +1,144 @@
+from collections import namedtuple
+import pytest
+import sqlite3
+
+from PyQt5.QtCore import QPersistentModelIndex, QCoreApplication
+
+import core
+import core.table_model as tm
+
+# as gov_files.FileData
+FileData = namedtuple("FileData", "file_id dir_id comment_id ext_id source")
+
+ROWS = [["a.pdf", 10, "2019-01-01"], ["b.txt", 2, None]]
+
+
+@pytest.fixture()
+def model():
+    model = tm.TableModel()
+    model.setHeaderData(0, tm.Qt.Horizontal, ("File", "Pages", "Date"))
+    model.set_rows(ROWS, [FileData(i, 1, None, 2, 0) for i in (1, 2)])
+    return model
+
+
+def cells(model) -> list:
+    return [[model.data(model.index(row, col)) for col in range(model.columnCount())]
+            for row in range(model.rowCount())]
+
+
+def test_set_rows(model):
+    assert cells(model) == [["a.pdf", "10", "2019-01-01"], ["b.txt", "2", None]]
+    assert model.data(model.index(1, 0), tm.Qt.UserRole).file_id == 2
+    assert model.get_row(0) == (("a.pdf", "10", "2019-01-01"), FileData(1, 1, None, 2, 0))
+
+    resets = []
+    model.modelReset.connect(lambda: resets.append(1))
+    model.set_rows(iter([("c.py", 1)]))
+    assert resets == [1]
+    assert cells(model) == [["c.py", "1", None]]
+    assert model.data(model.index(0, 0), tm.Qt.UserRole) is None
+
+
+def test_edit_rows(model):
+    model.append_row("c.doc", "user")
+    model.insert_row(model.index(0, 0), ("d.py", 1, "2020-01-01", "extra"))
+    assert cells(model)[0] == ["d.py", "1", "2020-01-01"]
+    assert model.get_row(3) == (("c.doc",), "user")
+
+    model.update(model.index(3, 1), 7)
+    model.update(model.index(1, 2), "2021-01-01")
+    model.delete_row(model.index(0, 0))
+    assert cells(model) == [["a.pdf", "10", "2021-01-01"],
+                            ["b.txt", "2", None],
+                            ["c.doc", "7", None]]
+    model.removeRows(0, 2)
+    assert model.rowCount() == 1
+
+
+def test_set_source():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("create table t (name text, num integer);")
+    conn.executemany("insert into t values (?, ?);", ((f"f{i}", i) for i in range(1200)))
+    model = tm.TableModel()
+    model.set_source(conn.execute("select name, num from t order by num;"),
+                     lambda row: (row, row[1]))
+    assert model.rowCount() == tm.FETCH_PAGE
+    assert model.canFetchMore()
+    model.fetchMore()
+    assert model.rowCount() == 2 * tm.FETCH_PAGE
+    model.fetch_rows(1100)
+    assert model.rowCount() == 1200
+    assert not model.canFetchMore()
+    assert model.get_row(1199) == (("f1199", "1199"), 1199)
+
+    model.set_rows([("a",)])
+    assert not model.canFetchMore()
+
+
+def test_set_source_read_in_background():
+    app = QCoreApplication.instance() or QCoreApplication([])
+    conn = sqlite3.connect(":memory:")
+    conn.execute("create table t (name text, num integer);")
+    conn.executemany("insert into t values (?, ?);", ((f"f{i}", i) for i in range(2500)))
+    model = tm.TableModel()
+    model.page = 100
+    curs = conn.execute("select name, num from t order by num;")
+    model.set_source(curs, lambda row: (row, row[1]))
+    for _ in range(5):
+        app.processEvents()
+    # cursor is read to the end and closed, rows are still fetched by pages
+    with pytest.raises(sqlite3.ProgrammingError):
+        curs.fetchone()
+    assert model.rowCount() == 100
+    model.fetch_rows(2500)
+    assert model.rowCount() == 2500
+    assert not model.canFetchMore()
+    assert model.get_row(2499) == (("f2499", "2499"), 2499)
+
+    # reset closes cursor not read yet
+    curs = conn.execute("select name, num from t order by num;")
+    model.set_source(curs, lambda row: (row, row[1]))
+    model.set_rows([])
+    with pytest.raises(sqlite3.ProgrammingError):
+        curs.fetchone()
+
+
+def test_sort(model):
+    model.append_row(("c.doc", 5, "2018-01-01"))
+    proxy = tm.ProxyModel2()
+    proxy.setSourceModel(model)
+    b_idx = QPersistentModelIndex(model.index(1, 0))
+
+    proxy.sort(1, tm.Qt.AscendingOrder)         # Pages
+    assert [row[0] for row in cells(model)] == ["b.txt", "c.doc", "a.pdf"]
+    assert b_idx.row() == 0
+    assert proxy.data(proxy.index(2, 0)) == "a.pdf"
+    proxy.sort(2, tm.Qt.DescendingOrder)        # Date, None is the last
+    assert [row[0] for row in cells(model)] == ["b.txt", "a.pdf", "c.doc"]
+    assert model.data(model.index(1, 0), tm.Qt.UserRole).file_id == 1
+    proxy.sort(1, tm.Qt.DescendingOrder)
+    assert [row[0] for row in cells(model)] == ["a.pdf", "c.doc", "b.txt"]
+    assert sorted(model._TableModel__perms) == [1, 2]     # reused on re-sort
+    assert b_idx.row() == 2
+
+    model.update(model.index(0, 1), 1)
+    proxy.sort(1, tm.Qt.AscendingOrder)
+    assert [row[0] for row in cells(model)] == ["a.pdf", "b.txt", "c.doc"]
+
+    model.delete_row(model.index(1, 0))
+    model.insert_row(model.index(1, 0), ("d.py", 3))
+    assert [row[0] for row in cells(model)] == ["a.pdf", "d.py", "c.doc"]
+    proxy.sort(1, tm.Qt.DescendingOrder)
+    assert [row[:2] for row in cells(model)] == [["c.doc", "5"], ["d.py", "3"],
+                                                 ["a.pdf", "1"]]
+
+
+def test_sort_fetch_all():
+    model = tm.TableModel()
+    model.setColumnCount(2)
+    model.page = 2
+    model.set_source(((i % 3, i) for i in range(5)), lambda row: (row, row[1]))
+    assert model.rowCount() == 2
+    model.sort(0)
+    assert [model.data(model.index(i, 0), tm.Qt.UserRole) for i in range(5)] == \
+        [0, 3, 1, 4, 2]
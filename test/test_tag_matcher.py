@@ -0,0 +1,36 @@
+import re
+
+from core.tag_matcher import TagMatcher, trie_regex
+
+
+def test_match():
+    matcher = TagMatcher([("Science", 1), ("data science", 2), ("data", 3),
+                          ("C++", 4), ("node.js", 5), ("science fiction", 6)])
+    assert matcher.match("Data Science for all") == {1, 2, 3}
+    assert matcher.match("big data, science fiction") == {1, 3, 6}
+    assert matcher.match("sciences and database") == set()
+    assert matcher.match("C++ primer") == set()      # no word boundary after '+'
+    assert matcher.match("C++x, data_science") == {4}
+    assert matcher.match("nodexjs, node.js") == {5}
+    assert matcher.match("") == matcher.match(None) == set()
+
+
+def test_scan():
+    matcher = TagMatcher([("python", 1), ("snake", 2), ("zoo", 3)])
+    rows = [("Python snake", 10), ("python.pdf", 11), ("", 12), ("Pythons", 13)]
+    assert sorted(matcher.scan(rows)) == [(1, 10), (1, 11), (2, 10)]
+    assert matcher.found == {1: 2, 2: 1, 3: 0}
+    assert matcher.rows == 4
+    assert matcher.get_speed() > 0
+
+
+def test_no_tags():
+    matcher = TagMatcher([])
+    assert matcher.scan([("any text", 1)]) == []
+    assert matcher.found == {}
+
+
+def test_trie_regex():
+    pattern = re.compile(rf"\b(?:{trie_regex(['data', 'data science', 'dat', 'c++'])})\b")
+    assert [m.group() for m in pattern.finditer("data science, dat, datum, c++x")] == [
+        "data science", "dat", "c++"]
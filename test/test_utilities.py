@@ -0,0 +1,335 @@
+import pytest
+import sqlite3
+import threading
+
+import core
+from core import utilities as ut
+
+
+@pytest.fixture()
+def db_file(tmp_path, monkeypatch):
+    monkeypatch.setitem(ut.DB_setting, "Path", str(tmp_path / "file.db"))
+    monkeypatch.setitem(ut.DB_setting, "Conn", None)
+    monkeypatch.setitem(ut.DB_setting, "Pool", None)
+    yield ut.DB_setting["Path"]
+    if ut.DB_setting["Pool"]:
+        ut.DB_setting["Pool"].close()
+
+
+def pragma(conn, name):
+    return conn.execute(f"PRAGMA {name};").fetchone()[0]
+
+
+def test_open_connection_profile(db_file):
+    conn = ut.open_connection()
+    assert ut.DB_setting["Conn"] is None
+    assert pragma(conn, "journal_mode") == "wal"
+    assert pragma(conn, "synchronous") == 1       # NORMAL
+    assert pragma(conn, "temp_store") == 2        # MEMORY
+    assert pragma(conn, "foreign_keys") == 1
+    for name in ("cache_size", "mmap_size", "busy_timeout"):
+        assert pragma(conn, name) == ut.PROFILES["tuned"][name]
+
+    conn = ut.open_connection(profile="default", cache_size=-1000)
+    assert pragma(conn, "synchronous") == 2       # FULL
+    assert pragma(conn, "cache_size") == -1000
+
+
+def test_create_connection(db_file):
+    conn = ut.create_connection(db_file)
+    assert ut.DB_setting["Conn"] is conn
+    assert ut.create_connection() is conn
+    assert pragma(conn, "journal_mode") == "wal"
+
+
+def test_connection_pool(db_file):
+    conn = ut.create_connection(db_file)
+    ut.create_all_objects(conn)
+    pool = ut.DB_setting["Pool"]
+    reader = pool.reader()
+    assert pool.reader() is reader
+    with pytest.raises(sqlite3.OperationalError):
+        reader.execute("insert into Tags (Tag) values ('a');")
+
+    res = {}
+
+    def job():
+        res["conn"] = ut.get_connection()
+        res["writer"] = pool.writer()
+
+    thread = threading.Thread(target=job)
+    thread.start()
+    thread.join()
+    assert res["conn"] is not conn
+    assert res["writer"] == pool.writer()
+    writer, lock = pool.writer()
+    with lock:
+        writer.execute("insert into Tags (Tag) values ('a');")
+        writer.commit()
+    assert ut.select_other("TAGS").fetchall() == [("a", 1)]
+    assert reader.execute("select Tag from Tags;").fetchall() == [("a",)]
+
+    # select does not see rows of not committed write
+    writer.execute("insert into Tags (Tag) values ('b');")
+    assert ut.select_other("TAGS").connection is reader
+    assert ut.select_other("TAGS").fetchall() == [("a", 1)]
+    writer.rollback()
+    with ut.unit_of_work():
+        ut.insert_many("TAGS", [("c",)])
+        # unit of work sees its own rows
+        assert ut.select_other("TAGS").connection is conn
+        assert len(ut.select_other("TAGS").fetchall()) == 2
+
+    ut.create_connection(db_file)
+    assert ut.DB_setting["Pool"] is not pool
+    with pytest.raises(sqlite3.ProgrammingError):
+        reader.execute("select 1;")
+
+
+@pytest.fixture()
+def main_conn(init_load_obj, monkeypatch):
+    _, conn = init_load_obj
+    monkeypatch.setitem(ut.DB_setting, "Conn", conn)
+    monkeypatch.setitem(ut.DB_setting, "Pool", None)
+    return conn
+
+
+def tags(conn):
+    return [row[0] for row in conn.execute("select Tag from Tags order by TagID;")]
+
+
+def test_unit_of_work_commit(main_conn):
+    with ut.unit_of_work():
+        ut.insert_other("TAGS", ("a",))
+        with ut.unit_of_work():
+            ut.insert_other("TAGS", ("b",))
+        assert main_conn.in_transaction
+    assert not main_conn.in_transaction
+    assert ut._depth() == 0
+    assert tags(main_conn) == ["a", "b"]
+
+
+def test_unit_of_work_rollback(main_conn):
+    ut.insert_other("TAGS", ("a",))
+    assert not main_conn.in_transaction
+    with pytest.raises(ValueError):
+        with ut.unit_of_work():
+            ut.insert_other("TAGS", ("b",))
+            raise ValueError
+    assert ut._depth() == 0
+    assert tags(main_conn) == ["a"]
+
+
+def test_no_formatted_sql():
+    for queries in (ut.Selects, ut.Insert, ut.Update, ut.Delete):
+        for sql in queries.values():
+            for part in (sql if isinstance(sql, tuple) else (sql,)):
+                assert "{" not in part
+
+
+def test_select_by_names(main_conn):
+    names = ['say "hi"', "it's", "plain"]
+    for name in names:
+        ut.insert_other("TAGS", (name,))
+    res = ut.select_other("TAGS_BY_NAME", (ut.in_list(names[:2]),)).fetchall()
+    assert sorted(tag for tag, _ in res) == sorted(names[:2])
+
+
+def test_copy_file(main_conn):
+    conn = main_conn
+    conn.execute("insert into Dirs (DirID, Path) values (5, 'b');")
+    conn.execute("insert into Files (DirID, FileName, Pages) values (0, 'a.pdf', 7);")
+    conn.execute("insert into FileTag (TagID, FileID) values (3, 1), (4, 1);")
+    new_id = ut.insert_other("COPY_FILE", (5, 1))
+    ut.insert_other("COPY_TAGS", (new_id, 1))
+    assert conn.execute("select DirID, FileName, Pages from Files where FileID = ?;",
+                        (new_id,)).fetchone() == (5, "a.pdf", 7)
+    assert [row[7] for row in ut.advanced_selection({"tag": ("3,4", True)})] == [
+        1, new_id]
+
+
+def test_stats(main_conn):
+    ut.Stats.clear()
+    for _ in range(3):
+        ut.select_other("TAGS").fetchall()
+    ut.dir_ids_select(0, 0).fetchall()
+    stats = ut.get_stats()
+    assert stats["select.TAGS"][0] == 3
+    assert stats["DIR_IDS"][0] == 1
+    assert all(sec >= 0 for _, sec in stats.values())
+
+
+def test_advanced_selection(main_conn):
+    conn = main_conn
+    conn.execute("insert into Dirs (DirID, Path, ParentID) values "
+                 "(1, 'a', 0), (2, 'b', 0), (3, 'a/c', 1);")
+    conn.execute("insert into Extensions (ExtID, Extension) values (1, 'a'), (2, 'b');")
+    conn.executemany("insert into Files (FileID, DirID, ExtID, FileName) values (?, ?, ?, ?);",
+                     [(1, 1, 1, "a"), (2, 1, 2, "b"), (3, 2, 1, "c"), (4, 3, 1, "d")])
+    conn.executemany("insert into FileTag (FileID, TagID) values (?, ?);",
+                     [(1, 1), (1, 2), (3, 1), (4, 2)])
+    conn.executemany("insert into FileAuthor (FileID, AuthorID) values (?, ?);",
+                     [(1, 1), (4, 1), (3, 2)])
+
+    def names(**param):
+        return sorted(row[0] for row in ut.advanced_selection(param))
+
+    assert names() == ["a", "b", "c", "d"]
+    assert names(dir=1, ext="1,3", date=(False, 0, False)) == ["a", "d"]
+    assert names(tag=("1,2", False)) == ["a", "c", "d"]
+    assert names(tag=("1,2", True)) == ["a"]
+    # tags and authors are both applied
+    assert names(tag=("1", False), author="1") == ["a"]
+    assert names(dir=1, tag=("2", False), author="1,2") == ["a", "d"]
+    assert names(date=(True, 1, True)) == []
+
+
+def test_dir_subtree(main_conn):
+    main_conn.execute("insert into Dirs (DirID, Path, ParentID) values "
+                      "(1, 'a', 0), (2, 'a/b', 1), (3, 'a/b/c', 2), (4, 'd', 0);")
+    assert [row[0] for row in ut.dir_ids_select(1, 0)] == [1, 2, 3]
+    assert [row[0] for row in ut.dir_ids_select(1, 1)] == [1, 2]
+    assert [row[0] for row in ut.dir_ids_select(0, 0)] == [1, 2, 3, 4]
+    assert [row[0] for row in ut.dir_ids_select(0, 1)] == [1, 2, 4]
+    assert [(row[1], row[-1]) for row in ut.dir_tree_select(0, 0)] == [
+        (3, 2), (2, 1), (1, 0), (4, 0)]
+
+
+def test_quick_search(main_conn):
+    conn = main_conn
+    conn.execute("insert into Comments (CommentID, Comment, BookTitle) values "
+                 "(1, 'about python', 'Learning Python'), (2, 'snakes', 'Zoo');")
+    conn.executemany("insert into Files (FileID, DirID, FileName, CommentID) "
+                     "values (?, 0, ?, ?);",
+                     [(1, "python_book.pdf", 1), (2, "Café.txt", 2), (3, "c.pdf", None)])
+    conn.execute("insert into Tags (TagID, Tag) values (1, 'programming');")
+    conn.execute("insert into FileTag (FileID, TagID) values (3, 1);")
+
+    def found(text):
+        return [row[7] for row in ut.quick_search(text)]
+
+    # index is not updated by search
+    assert found("pyth") == []
+    assert ut.sync_search() == 3
+
+    # file name is ranked higher than comment
+    conn.execute("update Comments set Comment = 'python' where CommentID = 2;")
+    assert found("pyth") == [1]
+    assert ut.sync_search() == 1
+    assert found("pyth") == [1, 2]
+    assert found("pyth learn") == [1]
+    assert found("cafe") == [2]
+    assert found("progr") == [3]
+    assert found('"') == found("") == []
+
+    conn.execute("update Tags set Tag = 'misc' where TagID = 1;")
+    conn.execute("delete from Files where FileID = 1;")
+    ut.sync_search()
+    assert found("progr") == found("python_book") == []
+    assert found("misc") == [3]
+    assert conn.execute("select count(*) from SearchQueue;").fetchone()[0] == 0
+
+
+def test_scan_tags(main_conn):
+    conn = main_conn
+    conn.execute("insert into Extensions (ExtID, Extension) values (1, 'pdf'), (2, 'txt');")
+    conn.execute("insert into Comments (CommentID, Comment) values (1, 'Data science');")
+    conn.executemany("insert into Files (FileID, DirID, ExtID, FileName, CommentID) "
+                     "values (?, 0, ?, ?, ?);",
+                     [(1, 1, "science.pdf", None), (2, 1, "x.pdf", 1),
+                      (3, 2, "science.txt", None), (4, 1, "sciences.pdf", None)])
+    conn.execute("insert into Tags (TagID, Tag) values (1, 'Science'), (2, 'data science');")
+    conn.execute("insert into FileTag (FileID, TagID) values (1, 1);")
+
+    assert ut.has_search()
+    found, speed = ut.scan_tags([("Science", 1), ("data science", 2)], [1])
+    assert found == {1: 2, 2: 1}
+    assert speed > 0
+    assert sorted(conn.execute("select TagID, FileID from FileTag;")) == [
+        (1, 1), (1, 2), (2, 2)]
+
+
+def test_scan_tags_by_writer(db_file):
+    conn = ut.create_connection(db_file)
+    ut.create_all_objects(conn)
+    conn.execute("insert into Extensions (ExtID, Extension) values (1, 'pdf');")
+    conn.execute("insert into Files (FileID, DirID, ExtID, FileName) values (1, 0, 1, 'science.pdf');")
+    conn.execute("insert into Tags (TagID, Tag) values (1, 'Science');")
+    conn.commit()
+    writer, lock = ut.DB_setting["Pool"].writer()
+    res = {}
+
+    def job():
+        res["found"], _ = ut.scan_tags([("Science", 1)], [1])
+
+    with lock:
+        thread = threading.Thread(target=job)
+        thread.start()
+        thread.join(0.5)
+        # background writes wait for write lock
+        assert thread.is_alive()
+    thread.join()
+    assert res["found"] == {1: 1}
+    assert writer.total_changes > 0 and not writer.in_transaction
+    assert conn.execute("select TagID, FileID from FileTag;").fetchall() == [(1, 1)]
+
+
+def test_scan_tags_without_search(main_conn):
+    conn = main_conn
+    conn.execute("drop table FileSearch;")
+    conn.execute("insert into Extensions (ExtID, Extension) values (1, 'pdf');")
+    conn.execute("insert into Comments (CommentID, Comment) values (1, 'Data science');")
+    conn.executemany("insert into Files (FileID, DirID, ExtID, FileName, CommentID) "
+                     "values (?, 0, 1, ?, ?);",
+                     [(1, "science.pdf", None), (2, "x.pdf", 1), (3, "sciences.pdf", None)])
+    conn.execute("insert into Tags (TagID, Tag) values (1, 'Science'), (2, 'data science');")
+    conn.execute("insert into FileTag (FileID, TagID) values (1, 1);")
+
+    assert not ut.has_search()
+    found, speed = ut.scan_tags([("Science", 1), ("data science", 2)], [1])
+    assert found == {1: 2, 2: 1}
+    assert speed > 0
+    assert sorted(conn.execute("select TagID, FileID from FileTag;")) == [
+        (1, 1), (1, 2), (2, 2)]
+
+
+def test_quick_search_without_search(main_conn):
+    conn = main_conn
+    conn.execute("drop table FileSearch;")
+    conn.execute("insert into Comments (CommentID, Comment, BookTitle) values "
+                 "(1, 'about python', 'Learning Python');")
+    conn.executemany("insert into Files (FileID, DirID, FileName, CommentID) "
+                     "values (?, 0, ?, ?);",
+                     [(1, "python_book.pdf", 1), (2, "100%.txt", None), (3, "c.pdf", None)])
+
+    def found(text):
+        return [row[7] for row in ut.quick_search(text)]
+
+    assert not ut.has_search()
+    assert ut.sync_search() == 0
+    assert found("PYTH learn") == [1]
+    assert found("_book") == [1]
+    assert found("0%") == [2]
+    assert found("%") == [2]
+    assert found("") == []
+
+
+def test_scan_tags_as_without_search(main_conn):
+    conn = main_conn
+    conn.execute("insert into Extensions (ExtID, Extension) values (1, 'pdf');")
+    conn.executemany("insert into Files (FileID, DirID, ExtID, FileName) values (?, 0, 1, ?);",
+                     enumerate(("c.pdf", "C++x.pdf", "C#.pdf", "cafe.pdf",
+                                "Café.pdf", "a++b.pdf", "data-science.pdf"), 1))
+    tags = [("C++", 1), ("C#", 2), ("café", 3), ("++", 4), ("data science", 5)]
+
+    def scan():
+        found, _ = ut.scan_tags(tags, [1])
+        tagged = sorted(conn.execute("select TagID, FileID from FileTag;"))
+        conn.execute("delete from FileTag;")
+        return found, tagged
+
+    assert ut.has_search()
+    by_index = scan()
+    conn.execute("drop table FileSearch;")
+    assert by_index == scan()
+    assert by_index[1] == [(1, 2), (3, 5), (4, 2), (4, 6)]